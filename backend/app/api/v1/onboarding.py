@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import OnboardRequest, OnboardResponse, ChatRequest, ChatResponse, Provenance
-from app.services import ingestion, llm_service
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.models.schemas import (
+    OnboardRequest, OnboardResponse, OnboardJobStatus, OnboardBatchRequest, OnboardBatchStatus,
+    ChatRequest, ChatResponse, Provenance, ChunkText, SourceChunk,
+)
+from app.services import llm_service, planner, telemetry
 from app.services.vector_store import vector_store_manager
-import os
-import shutil
+from app.services.jobs import job_manager
+from app.services.answer_cache import answer_cache
+from app.services.plan_store import plan_store
+from app.services.chunk_store import chunk_store
+from app.services.prompt_builder import pack_context
+from app.core.config import settings
+from typing import List
+import asyncio
+import hashlib
+import json
 import logging
 
 # Configure logging
@@ -12,105 +25,348 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def get_repo_structure(path: str, limit: int = 50) -> str:
-    """ Creates a string representation of the repo's file structure. """
-    structure = []
-    count = 0
-    for root, _, files in os.walk(path):
-        if '.git' in root:
-            continue
-        level = root.replace(path, '').count(os.sep)
-        indent = ' ' * 4 * level
-        structure.append(f'{indent}{os.path.basename(root)}/')
-        sub_indent = ' ' * 4 * (level + 1)
-        for f in files:
-            if count >= limit:
-                structure.append(f'{sub_indent}...')
-                return "\n".join(structure)
-            structure.append(f'{sub_indent}{f}')
-            count += 1
-    return "\n".join(structure)
-
-def generate_collection_name(repo_url: str) -> str:
-    """ Generates a ChromaDB-compatible collection name from a repo URL. """
-    return repo_url.replace("https://", "").replace("/", "_").replace(".", "_")
-
-
-@router.post("/onboard", response_model=OnboardResponse)
+# How often the SSE stream checks a job for new progress
+JOB_EVENTS_POLL_INTERVAL = 0.5
+
+# A chunk ID hashes the chunk's file and text, so the text served for it never changes
+CHUNK_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the codebase to answer your question."
+
+
+def _job_status(job_id: str) -> dict:
+    snapshot = job_manager.get(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Onboarding job '{job_id}' not found.")
+    return snapshot
+
+
+@router.post("/onboard", response_model=OnboardJobStatus, status_code=202)
 async def onboard_repository(request: OnboardRequest):
     """
-    Onboards a new repository: clones it, processes files, creates embeddings,
-    and generates an initial learning plan.
+    Starts onboarding a repository in the background: cloning it, processing files,
+    creating embeddings, and generating an initial learning plan. Returns the job,
+    whose progress can be polled or streamed.
     """
-    repo_path = None
-    try:
-        # 1. Clone the repository
-        repo_path = ingestion.clone_repo(request.repo_url)
-
-        # 2. Generate a unique collection name for this repo
-        collection_name = generate_collection_name(request.repo_url)
-        collection = vector_store_manager.get_or_create_collection(collection_name)
-
-        # 3. Load, split, and embed documents
-        documents, metadatas, ids = ingestion.load_and_split_documents(repo_path)
-        if not documents:
-            raise HTTPException(status_code=400, detail="No supported files found in the repository.")
-        
-        vector_store_manager.add_documents_to_collection(collection, documents, metadatas, ids)
-
-        # 4. Generate onboarding plan with LLM
-        repo_structure = get_repo_structure(repo_path)
-        plan_data = llm_service.generate_onboarding_plan(repo_structure)
-        
-        return OnboardResponse(
-            learning_path=plan_data['learning_path'],
-            starter_tasks=plan_data['starter_tasks'],
-            message=f"Successfully onboarded {request.repo_url}. You can now start asking questions."
+    job = job_manager.submit(request.repo_url, request.incremental, request.tenant)
+    return OnboardJobStatus(**_job_status(job.job_id))
+
+
+def _batch_status(batch_id: str) -> dict:
+    snapshot = job_manager.get_batch(batch_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Onboarding batch '{batch_id}' not found.")
+    return snapshot
+
+
+async def _progress_events(get_snapshot, model):
+    """ Yields a `progress` SSE event whenever the snapshot's version changes, until it has finished. """
+    last_version = None
+    while True:
+        snapshot = get_snapshot()
+        if snapshot is None:
+            break
+        if snapshot['version'] != last_version:
+            last_version = snapshot['version']
+            yield f"event: progress\ndata: {model(**snapshot).model_dump_json()}\n\n"
+        if snapshot['status'] in ("completed", "failed"):
+            break
+        await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+
+# Declared before /onboard/{job_id}/events so a batch can't be mistaken for a job
+@router.post("/onboard/batches", response_model=OnboardBatchStatus, status_code=202)
+async def onboard_repositories(request: OnboardBatchRequest):
+    """
+    Starts onboarding many repositories in the background, e.g. a whole organization.
+    Their clone, split, embed and plan stages share the worker's stage pools with
+    every other job, and tenants take turns, so large batches and large repos
+    don't starve anyone. Returns the batch, whose progress can be polled or streamed.
+    """
+    if len(set(request.repo_urls)) > settings.ONBOARD_BATCH_MAX_REPOS:
+        raise HTTPException(status_code=400, detail=f"A batch can have at most {settings.ONBOARD_BATCH_MAX_REPOS} repositories.")
+    batch = job_manager.submit_batch(request.repo_urls, request.incremental, request.tenant)
+    return OnboardBatchStatus(**_batch_status(batch.batch_id))
+
+
+@router.get("/onboard/batches/{batch_id}", response_model=OnboardBatchStatus)
+async def get_onboarding_batch(batch_id: str):
+    """ Returns a batch's aggregate progress and the stage and progress of each of its repositories. """
+    return OnboardBatchStatus(**_batch_status(batch_id))
+
+
+@router.get("/onboard/batches/{batch_id}/events")
+async def stream_onboarding_batch(batch_id: str):
+    """ Streams batch progress as Server-Sent Events until every job of the batch has finished. """
+    _batch_status(batch_id)
+    return StreamingResponse(
+        _progress_events(lambda: job_manager.get_batch(batch_id), OnboardBatchStatus),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
+
+# Declared before /onboard/{job_id}/events so a session can't be mistaken for a job
+@router.get("/onboard/sessions/{session_id}", response_model=OnboardResponse)
+async def get_onboarding_session(session_id: str, if_none_match: str = Header(None)):
+    """
+    Returns the stored onboarding plan of a previously onboarded repository without
+    redoing any work or contacting its remote. The ETag is the commit and prompt
+    version the plan was built from, so unchanged plans revalidate with a 304.
+    """
+    stored = await run_in_threadpool(plan_store.latest, session_id, planner.PLAN_PROMPT_VERSION)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No stored onboarding plan for session '{session_id}'.")
+
+    etag = f'"{stored["commit_sha"]}-{stored["prompt_version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=OnboardResponse(**stored['plan']).model_dump(), headers=headers)
+
+
+@router.post("/onboard/sessions/{session_id}/refresh", response_model=OnboardJobStatus, status_code=202)
+async def refresh_onboarding_session(session_id: str):
+    """
+    Starts a job that brings a stored plan up to date with the repository's remote.
+    The job checks the remote HEAD itself: if it hasn't moved, the job finishes with
+    the stored plan; otherwise it onboards the new commit incrementally.
+    """
+    stored = await run_in_threadpool(plan_store.latest, session_id, planner.PLAN_PROMPT_VERSION)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No stored onboarding plan for session '{session_id}'.")
+    job = job_manager.submit(stored['repo_url'])
+    return OnboardJobStatus(**_job_status(job.job_id))
+
+
+@router.get("/onboard/sessions/{session_id}/chunks/{chunk_id}", response_model=ChunkText)
+async def get_chunk(session_id: str, chunk_id: str, if_none_match: str = Header(None)):
+    """
+    Returns the text of a chunk cited in a chat answer's provenance. The text of a
+    chunk ID never changes, so clients may cache it indefinitely.
+    """
+    found = await run_in_threadpool(chunk_store.get_many, session_id, [chunk_id])
+    if chunk_id not in found:
+        raise HTTPException(status_code=404, detail=f"Chunk '{chunk_id}' not found in session '{session_id}'.")
+    etag = f'"{chunk_id}"'
+    headers = {"ETag": etag, "Cache-Control": CHUNK_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    text, metadata = found[chunk_id]
+    chunk = ChunkText(chunk_id=chunk_id, file_path=metadata['file_path'], text=text)
+    return JSONResponse(content=chunk.model_dump(), headers=headers)
+
+
+@router.get("/onboard/sessions/{session_id}/chunks", response_model=List[SourceChunk])
+async def get_source_chunks(session_id: str, file_path: str, start_line: int = None, end_line: int = None,
+                            if_none_match: str = Header(None)):
+    """
+    Returns the indexed chunks of a file that overlap lines `start_line`..`end_line`
+    (the whole file if neither is given), in file order, e.g. to show the code around
+    a cited chunk. Line ranges change when the repo is re-ingested, so responses are
+    revalidated by ETag.
+    """
+    rows = await run_in_threadpool(chunk_store.find, session_id, file_path, start_line, end_line)
+    chunks = [
+        SourceChunk(
+            chunk_id=chunk_id,
+            file_path=metadata['file_path'],
+            start_line=metadata.get('start_line'),
+            end_line=metadata.get('end_line'),
+            text=text,
         )
+        for chunk_id, text, metadata in rows
+    ]
+    # IDs determine the texts, so IDs and line ranges determine the response
+    key = json.dumps([(chunk.chunk_id, chunk.start_line, chunk.end_line) for chunk in chunks])
+    etag = f'"{hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=[chunk.model_dump() for chunk in chunks], headers=headers)
 
-    except Exception as e:
-        logger.error(f"Onboarding failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # 5. Clean up the cloned repo
-        if repo_path and os.path.exists(repo_path):
-            shutil.rmtree(repo_path)
-            logger.info(f"Cleaned up temporary directory: {repo_path}")
+
+@router.get("/onboard/{job_id}", response_model=OnboardJobStatus)
+async def get_onboarding_job(job_id: str):
+    """ Returns the current stage, progress and (once finished) result of an onboarding job. """
+    return OnboardJobStatus(**_job_status(job_id))
+
+
+@router.get("/onboard/{job_id}/events")
+async def stream_onboarding_job(job_id: str):
+    """ Streams onboarding job progress as Server-Sent Events until the job finishes. """
+    _job_status(job_id)
+    return StreamingResponse(
+        _progress_events(lambda: job_manager.get(job_id), OnboardJobStatus),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _retrieve_context(collection_name: str, query: str):
+    """
+    Returns the context most relevant to the query, packed into the chat token
+    budget (None if the query failed), and the query's embedding if retrieval
+    computed one.
+    """
+    collection = vector_store_manager.get_or_create_collection(collection_name)
+    query_results = vector_store_manager.query_collection(collection, query, n_results=settings.CHAT_RETRIEVAL_K)
+    if not query_results or not query_results.get('documents'):
+        return None, None
+    with telemetry.span("prompt_build"):
+        context = pack_context(query_results['documents'][0], query_results['metadatas'][0], settings.CHAT_CONTEXT_TOKEN_BUDGET)
+    logger.info(
+        f"Packed {len(context.sources)} chunks into {len(context.documents)} passages "
+        f"(~{context.tokens} tokens, {context.dropped} chunks over budget)."
+    )
+    return context, query_results['query_embedding']
+
+
+def _provenance(context) -> list:
+    return [
+        Provenance(
+            file_path=meta['file_path'],
+            chunk_id=meta.get('chunk_id'),
+            start_line=meta.get('start_line'),
+            end_line=meta.get('end_line'),
+        )
+        for _, meta in context.sources
+    ]
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _lookup_answer(collection_name: str, query: str):
+    if not answer_cache:
+        return None
+    with telemetry.span("answer_cache_lookup") as lookup_span:
+        lookup = answer_cache.lookup(collection_name, query)
+        lookup_span.set(hit=lookup is not None and lookup.answer is not None)
+    return lookup
+
+
+def _lookup_similar_answer(lookup, query_embedding) -> bool:
+    """ Matches a missed question by the embedding retrieval computed; True on a hit. """
+    if not lookup or query_embedding is None:
+        return False
+    with telemetry.span("answer_cache_similar") as lookup_span:
+        hit = answer_cache.lookup_similar(lookup, query_embedding) is not None
+        lookup_span.set(hit=hit)
+    return hit
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat_with_repo(request: ChatRequest):
+def chat_with_repo(request: ChatRequest):
     """
     Handles a user's chat query about a previously onboarded repository.
+    Declared sync so FastAPI runs the blocking vector search and LLM call on its threadpool.
+    Repeated and near-duplicate questions are answered from the answer cache.
     """
     try:
         collection_name = request.session_id # The collection name is the session ID
-        collection = vector_store_manager.get_or_create_collection(collection_name)
+        lookup = _lookup_answer(collection_name, request.query)
+        if lookup and lookup.answer is not None:
+            return ChatResponse(**lookup.answer)
 
-        # 1. Query vector store for relevant context
-        query_results = vector_store_manager.query_collection(
-            collection,
-            request.query,
-            n_results=5
-        )
-
-        if not query_results or not query_results.get('documents'):
-            return ChatResponse(answer="I couldn't find any relevant information in the codebase to answer your question.", provenance=[])
-        
-        context_docs = query_results['documents'][0]
-        context_metadatas = query_results['metadatas'][0]
+        # 1. Query vector store for relevant context; a question similar to a cached
+        # one is answered from the cache using the query embedding retrieval computed
+        context, query_embedding = _retrieve_context(collection_name, request.query)
+        if _lookup_similar_answer(lookup, query_embedding):
+            return ChatResponse(**lookup.answer)
+        if context is None:
+            return ChatResponse(answer=NO_CONTEXT_ANSWER, provenance=[])
 
         # 2. Generate response with LLM using the context
-        answer = llm_service.generate_chat_response(request.query, context_docs, context_metadatas)
+        answer = llm_service.generate_chat_response(request.query, context.documents, context.metadatas)
 
         # 3. Format provenance
-        provenance = [
-            Provenance(file_path=meta['file_path'], content_chunk=doc)
-            for doc, meta in zip(context_docs, context_metadatas)
-        ]
-
-        return ChatResponse(answer=answer, provenance=provenance)
+        response = ChatResponse(answer=answer, provenance=_provenance(context))
+        if lookup:
+            answer_cache.store(lookup, response.model_dump())
+        return response
 
     except Exception as e:
         logger.error(f"Chat failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/chat/stream")
+async def stream_chat_with_repo(request: ChatRequest, http_request: Request):
+    """
+    Streams the answer to a chat query as Server-Sent Events: a `provenance` event as
+    soon as retrieval finishes, `token` events as the model produces text, then `done`
+    (or `error`). Generation is cancelled if the client disconnects.
+    """
+    collection_name = request.session_id
+    # Headers go out before the answer is generated, so a requested trace comes with `done`
+    trace = telemetry.current_trace() if telemetry.debug_requested(http_request.headers) else None
+
+    def done(cached: bool) -> str:
+        data = {"cached": cached}
+        if trace is not None:
+            data["trace"] = trace.to_list()
+        return _sse("done", data)
+
+    def from_cache(answer: dict) -> str:
+        # Through the model, so answers cached with chunk texts are sent as references
+        cached_response = ChatResponse(**answer)
+        return (
+            _sse("provenance", [p.model_dump() for p in cached_response.provenance])
+            + _sse("token", {"text": cached_response.answer})
+            + done(True)
+        )
+
+    async def event_stream():
+        try:
+            lookup = await run_in_threadpool(_lookup_answer, collection_name, request.query)
+            if lookup and lookup.answer is not None:
+                yield from_cache(lookup.answer)
+                return
+
+            context, query_embedding = await run_in_threadpool(_retrieve_context, collection_name, request.query)
+            if await run_in_threadpool(_lookup_similar_answer, lookup, query_embedding):
+                yield from_cache(lookup.answer)
+                return
+            if context is None:
+                yield _sse("provenance", [])
+                yield _sse("token", {"text": NO_CONTEXT_ANSWER})
+                yield done(False)
+                return
+            provenance = _provenance(context)
+            yield _sse("provenance", [p.model_dump() for p in provenance])
+
+            parts = []
+            tokens = llm_service.stream_chat_response(request.query, context.documents, context.metadatas)
+            try:
+                async for text in tokens:
+                    if await http_request.is_disconnected():
+                        logger.info("Chat client disconnected; cancelling generation.")
+                        return
+                    parts.append(text)
+                    yield _sse("token", {"text": text})
+            finally:
+                await tokens.aclose()
+
+            if lookup:
+                response = ChatResponse(answer="".join(parts), provenance=provenance)
+                await run_in_threadpool(answer_cache.store, lookup, response.model_dump())
+            yield done(False)
+        except Exception as e:
+            logger.error(f"Streaming chat failed: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    # X-Accel-Buffering stops reverse proxies from holding tokens back
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -13,7 +13,117 @@ class Settings:
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY")
     SERPAPI_API_KEY: str = os.getenv("SERPAPI_API_KEY")
 
+    # Web search for the model's google_search tool and plan resource links:
+    # "serpapi", "fixture" (offline stub answering from SEARCH_FIXTURE_PATH) or "none"
+    SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "serpapi")
+    SEARCH_FIXTURE_PATH: str = os.getenv(
+        "SEARCH_FIXTURE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "tools", "fixtures", "search_results.json")
+    )
+    SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "5"))
+    SEARCH_MAX_CONCURRENCY: int = int(os.getenv("SEARCH_MAX_CONCURRENCY", "8"))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+    SEARCH_CACHE_TTL_SECONDS: float = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(24 * 3600)))
+    # Look up a link for each external resource suggested in a learning plan
+    PLAN_RESOURCE_LINKS: bool = os.getenv("PLAN_RESOURCE_LINKS", "true").lower() == "true"
+
     ASTRA_DB_API_ENDPOINT: str = os.getenv("ASTRA_DB_API_ENDPOINT")
     ASTRA_DB_APPLICATION_TOKEN: str = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
 
+    # Local state (ingestion manifests, caches) lives under this directory
+    DATA_DIR: str = os.getenv("DATA_DIR", "data")
+
+    # Vector store: "astra" (Astra DB) or "local" (in-process memory-mapped index with IVF)
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "astra")
+    LOCAL_VECTOR_STORE_DIR: str = os.getenv("LOCAL_VECTOR_STORE_DIR", os.path.join(DATA_DIR, "vectors"))
+    LOCAL_IVF_MIN_ROWS: int = int(os.getenv("LOCAL_IVF_MIN_ROWS", "20000"))
+    LOCAL_IVF_NPROBE: int = int(os.getenv("LOCAL_IVF_NPROBE", "8"))
+
+    # Chunk texts and metadata, compressed and stored once per distinct text (zstd if
+    # zstandard is installed, else zlib). Local collections and keyword indexes then keep
+    # only IDs, vectors and index terms. Astra DB collections still store each chunk's text
+    # as well: langchain_astradb can only write a vector together with its text.
+    CHUNK_STORE_PATH: str = os.getenv("CHUNK_STORE_PATH", os.path.join(DATA_DIR, "chunks.sqlite"))
+
+    # Pooled collection handles, and how many recently used collections to pre-build at startup
+    COLLECTION_POOL_SIZE: int = int(os.getenv("COLLECTION_POOL_SIZE", "64"))
+    COLLECTION_POOL_TTL_SECONDS: float = float(os.getenv("COLLECTION_POOL_TTL_SECONDS", "3600"))
+    COLLECTION_WARMUP_COUNT: int = int(os.getenv("COLLECTION_WARMUP_COUNT", "10"))
+
+    # Repository clones: shallow/blobless, sparse to supported files, mirrored on disk.
+    # Set REPO_CACHE_MAX_BYTES=0 to disable the mirror cache.
+    REPO_CACHE_DIR: str = os.getenv("REPO_CACHE_DIR", os.path.join(DATA_DIR, "repos"))
+    REPO_CACHE_MAX_BYTES: int = int(os.getenv("REPO_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+    CLONE_DEPTH: int = int(os.getenv("CLONE_DEPTH", "1"))
+    CLONE_FILTER: str = os.getenv("CLONE_FILTER", "blob:none")
+    CLONE_SPARSE: bool = os.getenv("CLONE_SPARSE", "true").lower() == "true"
+
+    # File loading and chunking
+    MAX_FILE_BYTES: int = int(os.getenv("MAX_FILE_BYTES", str(1024 * 1024)))
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+
+    # Background onboarding jobs: at most ONBOARD_MAX_CONCURRENCY run at once, taken
+    # from the queue fairly by tenant. Running jobs mostly wait for their stages'
+    # slots, granted fairly by tenant and then by job: CLONE_CONCURRENCY remote checks
+    # and clones, one split group per split process, EMBED_CONCURRENCY embedding
+    # batches and PLAN_CONCURRENCY plans at a time.
+    ONBOARD_MAX_CONCURRENCY: int = int(os.getenv("ONBOARD_MAX_CONCURRENCY", "16"))
+    ONBOARD_JOB_HISTORY: int = int(os.getenv("ONBOARD_JOB_HISTORY", "200"))
+    ONBOARD_BATCH_MAX_REPOS: int = int(os.getenv("ONBOARD_BATCH_MAX_REPOS", "500"))
+    CLONE_CONCURRENCY: int = int(os.getenv("CLONE_CONCURRENCY", "4"))
+    PLAN_CONCURRENCY: int = int(os.getenv("PLAN_CONCURRENCY", "2"))
+
+    # Embedding writes: batch size, parallel batches (shared by all jobs), rate limit
+    # (0 = unlimited) and retries
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+    EMBED_CONCURRENCY: int = int(os.getenv("EMBED_CONCURRENCY", "8"))
+    EMBED_CHUNKS_PER_MINUTE: int = int(os.getenv("EMBED_CHUNKS_PER_MINUTE", "0"))
+    EMBED_MAX_RETRIES: int = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+    EMBED_BACKOFF_SECONDS: float = float(os.getenv("EMBED_BACKOFF_SECONDS", "1.0"))
+
+    # Content-addressed embedding cache shared by all repos (0 bytes disables it)
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite"))
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+    # Chat retrieval: "hybrid" (BM25 keyword index fused with vector search) or "vector"
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")
+    LEXICAL_INDEX_DIR: str = os.getenv("LEXICAL_INDEX_DIR", os.path.join(DATA_DIR, "lexical"))
+    RETRIEVAL_CANDIDATES: int = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+    RETRIEVAL_MAX_CHUNKS_PER_FILE: int = int(os.getenv("RETRIEVAL_MAX_CHUNKS_PER_FILE", "2"))
+    RETRIEVAL_RERANK: bool = os.getenv("RETRIEVAL_RERANK", "true").lower() == "true"
+
+    # Semantic cache of chat answers per collection (0 entries disables it)
+    ANSWER_CACHE_PATH: str = os.getenv("ANSWER_CACHE_PATH", os.path.join(DATA_DIR, "answer_cache.sqlite"))
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # Prompt assembly: retrieved chunks are merged and packed into a token budget, and
+    # the repo structure in the onboarding prompt is summarized to fit its own budget
+    CHAT_RETRIEVAL_K: int = int(os.getenv("CHAT_RETRIEVAL_K", "8"))
+    CHAT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "4000"))
+    PLAN_STRUCTURE_TOKEN_BUDGET: int = int(os.getenv("PLAN_STRUCTURE_TOKEN_BUDGET", "3000"))
+
+    # Generated plans, resumable while the remote HEAD hasn't moved (checked at most
+    # once per REMOTE_HEAD_CACHE_SECONDS per repo)
+    PLAN_STORE_PATH: str = os.getenv("PLAN_STORE_PATH", os.path.join(DATA_DIR, "plans.sqlite"))
+    PLAN_STORE_HISTORY: int = int(os.getenv("PLAN_STORE_HISTORY", "5"))
+    REMOTE_HEAD_CACHE_SECONDS: float = float(os.getenv("REMOTE_HEAD_CACHE_SECONDS", "60"))
+
+    # Map-reduce onboarding plans: repos with more files than PLAN_MAP_MIN_FILES are
+    # summarized per module (at most PLAN_MAX_MODULES, PLAN_MAP_CONCURRENCY LLM calls at once)
+    PLAN_MAP_MIN_FILES: int = int(os.getenv("PLAN_MAP_MIN_FILES", "40"))
+    PLAN_MAX_MODULES: int = int(os.getenv("PLAN_MAX_MODULES", "12"))
+    PLAN_MAP_CONCURRENCY: int = int(os.getenv("PLAN_MAP_CONCURRENCY", "4"))
+    PLAN_EVIDENCE_TOKEN_BUDGET: int = int(os.getenv("PLAN_EVIDENCE_TOKEN_BUDGET", "3000"))
+    PLAN_MODULE_STRUCTURE_TOKEN_BUDGET: int = int(os.getenv("PLAN_MODULE_STRUCTURE_TOKEN_BUDGET", "800"))
+
+    # Observability: with TRACE_DEBUG_HEADER=true, requests sending `X-Debug-Trace: 1`
+    # get their spans back in response headers. Those expose internal timings and stage
+    # details to any client, so it is off by default; enable it for local development
+    # or benchmarking only. Spans are also exported over OTLP when an endpoint is set
+    # and the OpenTelemetry SDK is installed.
+    TRACE_DEBUG_HEADER: bool = os.getenv("TRACE_DEBUG_HEADER", "false").lower() == "true"
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+    OTEL_SERVICE_NAME: str = os.getenv("OTEL_SERVICE_NAME", "ccoa-backend")
+
 settings = Settings()
\ No newline at end of file
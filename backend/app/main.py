@@ -1,12 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.api.v1 import onboarding
 from app.core.config import settings
+from app.services.jobs import job_manager
+from app.services.vector_store import vector_store_manager
+from app.services import telemetry, warmup
+from app.tools.google_search import search_service
+import threading
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts serving at once and builds this worker's clients, caches and recently
+    used collection handles in the background (see /ready). Runs in each worker,
+    after the fork when the gunicorn master preloads. On exit, stops accepting
+    queued onboarding jobs and closes web search.
+    """
+    threading.Thread(target=warmup.warm_up, name="warm-up", daemon=True).start()
+    yield
+    job_manager.shutdown()
+    search_service.close()
+
 
 app = FastAPI(
     title="Contextual Codebase Onboarding Assistant (CCOA)",
     description="API for the CCOA project",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ~ Define the specific origins that are allowed to make requests.
@@ -22,12 +45,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],           # Allows all methods (GET, POST, etc.)
     allow_headers=["*"],           # Allows all headers
+    expose_headers=["ETag", "Server-Timing", "X-Trace"], # Read by the frontend when resuming a session, and when debugging
 )
 
+# Outermost, so request latency includes the other middleware
+app.add_middleware(telemetry.TraceMiddleware)
+
 @app.get("/", tags=["Root"])
 async def read_root():
-    """ A simple health check endpoint. """
+    """ A simple health check endpoint: the worker is up, though it may still be warming up. """
     return {"message": "CCOA Backend is running!"}
 
+@app.get("/ready", tags=["Root"])
+async def read_readiness():
+    """
+    Readiness check: 200 once this worker's services are warm, 503 while they are
+    still warming up or if one failed to initialize (e.g. a missing API key), with
+    the state of each.
+    """
+    status = warmup.readiness.status()
+    return JSONResponse(content=status, status_code=200 if status["status"] == warmup.WARM else 503)
+
+@app.get("/stats", tags=["Root"])
+async def read_stats():
+    """ Cache statistics and onboarding queue and stage pool occupancy for this worker. """
+    return {
+        "collection_handles": vector_store_manager.handle_stats(),
+        "search": search_service.stats(),
+        "onboarding": job_manager.stats(),
+    }
+
+@app.get("/metrics", tags=["Root"], response_class=PlainTextResponse)
+async def read_metrics():
+    """ Stage latency histograms and chunk, byte and token counters of this worker, in the Prometheus text format. """
+    return PlainTextResponse(telemetry.registry.render(), media_type="text/plain; version=0.0.4")
+
 # Include the API router
 app.include_router(onboarding.router, prefix=settings.API_V1_STR, tags=["Onboarding"])
\ No newline at end of file
@@ -1,13 +1,27 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class OnboardRequest(BaseModel):
     """ Request model for onboarding a new repository. """
     repo_url: str = Field(..., example="https://github.com/tiangolo/fastapi")
+    # Only re-embed files whose git blob changed since the last onboarding
+    incremental: bool = Field(True, example=True)
+    # Jobs share workers fairly between tenants; defaults to the repo's owner
+    tenant: Optional[str] = Field(None, example="acme")
+
+class OnboardBatchRequest(BaseModel):
+    """ Request model for onboarding many repositories at once, e.g. a whole organization. """
+    repo_urls: List[str] = Field(..., min_length=1, example=["https://github.com/tiangolo/fastapi", "https://github.com/tiangolo/typer"])
+    incremental: bool = Field(True, example=True)
+    # Every repo of the batch is queued as this tenant; by default each repo's owner
+    tenant: Optional[str] = Field(None, example="acme")
 
 class ExternalResource(BaseModel):
     type: str = Field(..., example="YouTube")
     suggestion: str = Field(..., example="Search for 'FastAPI dependency injection tutorial'")
+    # Top web result for the suggestion, when search is configured
+    link: Optional[str] = Field(None, example="https://fastapi.tiangolo.com/tutorial/dependencies/")
+    title: Optional[str] = None
 
 class LearningStep(BaseModel):
     step: int
@@ -28,6 +42,57 @@ class OnboardResponse(BaseModel):
     learning_path: List[LearningStep]
     starter_tasks: List[StarterTask]
     message: str
+    commit_sha: Optional[str] = None # The commit the plan was generated from
+
+class OnboardJobStatus(BaseModel):
+    """ State and progress of a background onboarding job. """
+    job_id: str
+    repo_url: str
+    tenant: Optional[str] = Field(None, example="github.com/tiangolo")
+    status: str = Field(..., example="running")  # queued | running | completed | failed
+    stage: str = Field(..., example="embedding")  # queued | cloning | splitting | embedding | planning | completed | failed
+    current: int = 0
+    total: int = 0
+    result: Optional[OnboardResponse] = None
+    error: Optional[str] = None
+    metrics: Dict[str, float] = Field(default_factory=dict, example={"chunks_per_second": 42.0, "retries": 1})
+    # Seconds spent per traced stage so far, summed over repeats (e.g. every embedded batch)
+    stage_seconds: Dict[str, float] = Field(default_factory=dict, example={"clone": 2.1, "split": 3.4, "embed": 40.3})
+    created_at: float
+    updated_at: float
+
+class OnboardBatchJob(BaseModel):
+    """ Progress of one repository of a batch; its plan is at /onboard/{job_id} once completed. """
+    job_id: str
+    repo_url: str
+    tenant: Optional[str] = None
+    status: str
+    stage: str
+    current: int = 0
+    total: int = 0
+    error: Optional[str] = None
+    stage_seconds: Dict[str, float] = Field(default_factory=dict)
+    created_at: float
+    updated_at: float
+
+class OnboardBatchStatus(BaseModel):
+    """ Aggregate and per-repository progress of a batch of onboarding jobs. """
+    batch_id: str
+    tenant: Optional[str] = None
+    status: str = Field(..., example="running")  # running | completed (every job finished, some may have failed)
+    repos: int
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    progress: float = Field(..., example=0.25)  # Fraction of repositories finished
+    chunks_written: int = 0
+    # Seconds per traced stage summed over all repositories, including time queued for a stage (queue_*)
+    stage_seconds: Dict[str, float] = Field(default_factory=dict, example={"clone": 20.5, "queue_embed": 12.0, "embed": 310.2})
+    elapsed_seconds: float
+    created_at: float
+    updated_at: float
+    jobs: List[OnboardBatchJob]
 
 class ChatRequest(BaseModel):
     """ Request model for a chat query. """
@@ -35,9 +100,25 @@ class ChatRequest(BaseModel):
     query: str
 
 class Provenance(BaseModel):
-    """ Source document information for citation. """
+    """ Source document information for citation; the text is fetched by chunk ID on demand. """
+    file_path: str
+    chunk_id: Optional[str] = None # None in answers cached before chunks were cited by ID
+    start_line: Optional[int] = None # 1-based, inclusive
+    end_line: Optional[int] = None
+
+class ChunkText(BaseModel):
+    """ The text of a chunk cited in provenance. Never changes for a given chunk ID. """
+    chunk_id: str
+    file_path: str
+    text: str
+
+class SourceChunk(BaseModel):
+    """ A chunk of a file with its current line range. """
+    chunk_id: str
     file_path: str
-    content_chunk: str
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
+    text: str
 
 class ChatResponse(BaseModel):
     """ Response model for a chat query, including provenance. """
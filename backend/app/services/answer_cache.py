@@ -0,0 +1,198 @@
+from app.core.config import settings
+from app.services.lazy import Lazy
+from array import array
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Case, whitespace and trailing punctuation don't change a question
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(' ', query).strip().rstrip('?!.').strip().lower()
+
+
+class AnswerLookup:
+    """
+    Result of `AnswerCache.lookup`: the cached answer if there was a hit, plus what
+    `store` needs to cache a freshly generated one.
+    """
+    def __init__(self, collection: str, query: str, generation: int, answer: dict = None, vector=None):
+        self.collection = collection
+        self.query = query
+        self.generation = generation
+        self.answer = answer
+        self.vector = vector
+
+
+class AnswerCache:
+    """
+    Per-collection cache of chat answers (with their provenance) in a local SQLite
+    file shared by all workers. A question hits if it matches a cached one exactly
+    after normalization, or if their query embeddings have cosine similarity of at
+    least `threshold`. Each collection keeps at most `max_entries` answers, evicting
+    the least recently used.
+
+    Re-ingesting a collection bumps its generation, which retires every answer
+    cached before it, including ones still being generated from the old index.
+    """
+    def __init__(self, path: str, max_entries: int, threshold: float, ttl_seconds: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # collection -> (generation, version, row ids, unit vectors); reloaded when another worker writes
+        self._matrices = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            " name TEXT PRIMARY KEY, generation INTEGER NOT NULL, version INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY, collection TEXT NOT NULL, generation INTEGER NOT NULL,"
+            " query TEXT NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_query ON answers (collection, query)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (collection, last_used)")
+
+    def _state(self, collection: str) -> tuple:
+        row = self._conn.execute("SELECT generation, version FROM collections WHERE name = ?", (collection,)).fetchone()
+        return row if row else (0, 0)
+
+    def _bump(self, collection: str, generation_increment: int = 0):
+        # Caller holds the lock and an open transaction
+        self._conn.execute(
+            "INSERT INTO collections (name, generation, version) VALUES (?, ?, 1)"
+            " ON CONFLICT(name) DO UPDATE SET generation = generation + ?, version = version + 1",
+            (collection, generation_increment, generation_increment),
+        )
+
+    def _matrix(self, collection: str, generation: int, version: int) -> tuple:
+        # Caller holds the lock
+        cached = self._matrices.get(collection)
+        if cached and cached[0] == generation and cached[1] == version:
+            return cached[2], cached[3]
+        rows = self._conn.execute(
+            "SELECT id, vector FROM answers WHERE collection = ? AND generation = ? AND created_at > ?"
+            " AND length(vector) > 0",
+            (collection, generation, time.time() - self.ttl_seconds),
+        ).fetchall()
+        ids = [row_id for row_id, _ in rows]
+        vectors = np.array([array('f', blob) for _, blob in rows], dtype=np.float32) if rows else None
+        self._matrices[collection] = (generation, version, ids, vectors)
+        return ids, vectors
+
+    def _hit(self, row_id: int) -> dict:
+        # Caller holds the lock. Returns None if another worker evicted the row meanwhile.
+        self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), row_id))
+        row = self._conn.execute("SELECT answer FROM answers WHERE id = ?", (row_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lookup(self, collection: str, query: str) -> AnswerLookup:
+        """
+        Looks a question up by exact match after normalization; no embedding call.
+        On a miss, retrieval embeds the query anyway, and `lookup_similar` can then
+        match it against the cached questions.
+        """
+        normalized = normalize_query(query)
+        with self._lock:
+            generation, _ = self._state(collection)
+            row = self._conn.execute(
+                "SELECT id FROM answers WHERE collection = ? AND query = ? AND generation = ? AND created_at > ?",
+                (collection, normalized, generation, time.time() - self.ttl_seconds),
+            ).fetchone()
+            answer = self._hit(row[0]) if row else None
+        return AnswerLookup(collection, normalized, generation, answer=answer)
+
+    def lookup_similar(self, lookup: AnswerLookup, vector) -> dict:
+        """
+        Nearest neighbour of a missed question's embedding among the collection's
+        cached question embeddings. Returns the cached answer if it is similar
+        enough, else None; either way the embedding is kept for `store`.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        lookup.vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            generation, version = self._state(lookup.collection)
+            if generation != lookup.generation:
+                return None
+            ids, vectors = self._matrix(lookup.collection, generation, version)
+            if vectors is None:
+                return None
+            scores = vectors @ lookup.vector
+            best = int(np.argmax(scores))
+            answer = self._hit(ids[best]) if scores[best] >= self.threshold else None
+        if answer is not None:
+            logger.info(f"Answer cache hit for '{lookup.collection}' at similarity {scores[best]:.3f}.")
+            lookup.answer = answer
+        return answer
+
+    def store(self, lookup: AnswerLookup, answer: dict):
+        """ Caches an answer for a missed lookup, unless the collection was re-ingested meanwhile. """
+        now = time.time()
+        # Questions answered without an embedding (keyword fast path) only match exactly
+        vector = lookup.vector.astype(np.float32).tobytes() if lookup.vector is not None else b""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                generation, _ = self._state(lookup.collection)
+                if generation != lookup.generation:
+                    self._conn.execute("COMMIT")
+                    return
+                self._conn.execute(
+                    "INSERT INTO answers (collection, generation, query, vector, answer, created_at, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (lookup.collection, generation, lookup.query, vector,
+                     json.dumps(answer), now, now),
+                )
+                # LRU: keep the most recently used max_entries answers of this collection
+                self._conn.execute(
+                    "DELETE FROM answers WHERE collection = ? AND id NOT IN ("
+                    " SELECT id FROM answers WHERE collection = ? ORDER BY last_used DESC LIMIT ?)",
+                    (lookup.collection, lookup.collection, self.max_entries),
+                )
+                self._bump(lookup.collection)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def invalidate(self, collection: str):
+        """ Drops every cached answer of a collection; call after it is re-ingested. """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._bump(collection, generation_increment=1)
+                self._conn.execute("DELETE FROM answers WHERE collection = ?", (collection,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._matrices.pop(collection, None)
+        logger.info(f"Invalidated cached answers for '{collection}'.")
+
+
+# Opened on first use, so each worker gets its own connection
+answer_cache = Lazy("answer cache", lambda: AnswerCache(
+    settings.ANSWER_CACHE_PATH,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    threshold=settings.ANSWER_CACHE_SIMILARITY,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+)) if settings.ANSWER_CACHE_MAX_ENTRIES else None
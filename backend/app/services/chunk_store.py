@@ -0,0 +1,316 @@
+from app.core.config import settings
+from app.services.lazy import Lazy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How chunk IDs are derived; collections indexed under an older scheme are re-ingested
+CHUNK_ID_VERSION = "content-hash-1"
+
+# Codecs a blob can be stored with. zstd needs the zstandard package; a store written
+# with it can't be read without it.
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+# Chunks are a few KB each, too small for zstd to learn much from one alone. Once the
+# store holds this many blobs a shared dictionary is trained on a sample of them, and
+# later blobs are compressed with it.
+DICTIONARY_TRAIN_BLOBS = 2000
+DICTIONARY_BYTES = 64 * 1024
+
+# Metadata kept in their own (indexed) columns; any other keys are stored as JSON
+INDEXED_FIELDS = ('file_path', 'start_line', 'end_line')
+
+# Stay under SQLite's default bound-parameter limit
+SQL_BATCH = 500
+
+
+def content_hash(text: str) -> bytes:
+    """ Key of a chunk text's blob. """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def chunk_id(file_path: str, text: str, occurrence: int = 0) -> str:
+    """
+    Stable ID of a chunk: a hash of its file and text, so it survives edits elsewhere
+    in the file and a given ID always names the same text. `occurrence` tells apart
+    identical chunks within one file.
+    """
+    key = f"{file_path}\0{occurrence}\0{text}".encode('utf-8')
+    return hashlib.blake2b(key, digest_size=16).hexdigest()
+
+
+class ChunkStore:
+    """
+    Local store of chunk texts and metadata shared by all collections, in a SQLite
+    file. Texts are content-addressed: each distinct text is compressed (zstd with a
+    trained dictionary if zstandard is installed, else zlib) and stored once, however
+    many chunks, files or collections share it. Chunks are indexed by collection and
+    ID, and by file path and line range.
+
+    Vector stores can then hold only IDs and vectors, and answers can cite chunks by
+    ID, with the text fetched on demand.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        self._lock = threading.Lock()
+        # collection name -> key; dictionary ID -> zstandard.ZstdCompressionDict
+        self._collections = {}
+        self._dictionaries = {}
+        self._dictionary_id = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several gunicorn workers share the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Chunks refer to their collection and text by integer keys, which keeps their rows
+        # and indexes small
+        self._conn.execute("CREATE TABLE IF NOT EXISTS collections (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " id INTEGER PRIMARY KEY, hash BLOB UNIQUE NOT NULL, codec INTEGER NOT NULL,"
+            " dictionary INTEGER, size INTEGER NOT NULL, data BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS dictionaries (id INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " collection INTEGER NOT NULL, id TEXT NOT NULL, file_path TEXT NOT NULL,"
+            " start_line INTEGER, end_line INTEGER, metadata TEXT NOT NULL, blob INTEGER NOT NULL,"
+            " PRIMARY KEY (collection, id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_lines ON chunks (collection, file_path, start_line)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_blob ON chunks (blob)")
+
+    # --- compression ---------------------------------------------------------
+
+    def _dictionary(self, dictionary_id: int):
+        # Caller holds the lock. Dictionaries never change once written, so they are cached.
+        if dictionary_id not in self._dictionaries:
+            row = self._conn.execute("SELECT data FROM dictionaries WHERE id = ?", (dictionary_id,)).fetchone()
+            self._dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(row[0])
+        return self._dictionaries[dictionary_id]
+
+    def _current_dictionary(self) -> tuple:
+        """ The dictionary new blobs are compressed with, as (id, dictionary), or (None, None). Caller holds the lock. """
+        if self.codec != CODEC_ZSTD:
+            return None, None
+        if self._dictionary_id is None:
+            # Possibly trained by another worker since we last looked
+            row = self._conn.execute("SELECT MIN(id) FROM dictionaries").fetchone()
+            self._dictionary_id = row[0]
+        if self._dictionary_id is None:
+            return None, None
+        return self._dictionary_id, self._dictionary(self._dictionary_id)
+
+    def _compress(self, texts: list, dictionary) -> list:
+        if self.codec == CODEC_ZLIB:
+            return [zlib.compress(text.encode('utf-8'), ZLIB_LEVEL) for text in texts]
+        # Compressors aren't thread-safe; one per call is cheap next to the work
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+        return [compressor.compress(text.encode('utf-8')) for text in texts]
+
+    def _decompress(self, codec: int, dictionary_id: int, data: bytes) -> str:
+        # Caller holds the lock
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data).decode('utf-8')
+        if zstandard is None:
+            raise RuntimeError("The chunk store holds zstd blobs; install zstandard to read them.")
+        dictionary = self._dictionary(dictionary_id) if dictionary_id is not None else None
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data).decode('utf-8')
+
+    def _maybe_train_dictionary(self):
+        # Caller holds the lock
+        if self.codec != CODEC_ZSTD or self._current_dictionary()[0] is not None:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        if count < DICTIONARY_TRAIN_BLOBS:
+            return
+        rows = self._conn.execute(
+            "SELECT codec, dictionary, data FROM blobs ORDER BY RANDOM() LIMIT ?", (DICTIONARY_TRAIN_BLOBS,)
+        ).fetchall()
+        samples = [self._decompress(codec, dictionary_id, data).encode('utf-8') for codec, dictionary_id, data in rows]
+        try:
+            dictionary = zstandard.train_dictionary(DICTIONARY_BYTES, samples)
+        except zstandard.ZstdError as e:
+            logger.warning(f"Could not train a chunk compression dictionary: {e}")
+            return
+        recompressed = 0
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have trained one meanwhile; the first one wins
+            if self._conn.execute("SELECT COUNT(*) FROM dictionaries").fetchone()[0] == 0:
+                dictionary_id = self._conn.execute(
+                    "INSERT INTO dictionaries (data) VALUES (?)", (dictionary.as_bytes(),)
+                ).lastrowid
+                # Recompress what was stored before there was a dictionary
+                rows = self._conn.execute(
+                    "SELECT id, data FROM blobs WHERE codec = ? AND dictionary IS NULL", (CODEC_ZSTD,)
+                ).fetchall()
+                texts = [self._decompress(CODEC_ZSTD, None, data) for _, data in rows]
+                self._conn.executemany(
+                    "UPDATE blobs SET dictionary = ?, data = ? WHERE id = ?",
+                    [(dictionary_id, data, blob) for (blob, _), data in zip(rows, self._compress(texts, dictionary))],
+                )
+                recompressed = len(rows)
+                logger.info(f"Trained a chunk compression dictionary on {len(samples)} chunks; recompressed {recompressed}.")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._dictionary_id = None
+        if recompressed:
+            # The shrunk blobs left their pages part empty; the store is still small, so repack it
+            try:
+                self._conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not vacuum the chunk store: {e}")
+
+    # --- chunks ----------------------------------------------------------------
+
+    def _collection_key(self, collection: str, create: bool = False) -> int:
+        # Caller holds the lock. Returns None for an unknown collection unless `create`.
+        if collection not in self._collections:
+            if create:
+                self._conn.execute("INSERT OR IGNORE INTO collections (name) VALUES (?)", (collection,))
+            row = self._conn.execute("SELECT id FROM collections WHERE name = ?", (collection,)).fetchone()
+            if row is None:
+                return None
+            self._collections[collection] = row[0]
+        return self._collections[collection]
+
+    def put(self, collection: str, ids: list, texts: list, metadatas: list):
+        """ Stores chunks, replacing any already stored under the same IDs. """
+        hashes = [content_hash(text) for text in texts]
+        with self._lock:
+            collection_key = self._collection_key(collection, create=True)
+            dictionary_id, dictionary = self._current_dictionary()
+            # Looked up inside the transaction so a text can't be collected before its new chunks land
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                blobs = {}
+                for start in range(0, len(hashes), SQL_BATCH):
+                    batch = hashes[start:start + SQL_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    blobs.update(
+                        (bytes(key), blob)
+                        for blob, key in self._conn.execute(f"SELECT id, hash FROM blobs WHERE hash IN ({placeholders})", batch)
+                    )
+                # Only texts the store doesn't have yet are compressed
+                new = {key: text for key, text in zip(hashes, texts) if key not in blobs}
+                for (key, text), data in zip(new.items(), self._compress(list(new.values()), dictionary)):
+                    blobs[key] = self._conn.execute(
+                        "INSERT INTO blobs (hash, codec, dictionary, size, data) VALUES (?, ?, ?, ?, ?)",
+                        (key, self.codec, dictionary_id, len(text), data),
+                    ).lastrowid
+                chunks = []
+                for chunk, key, metadata in zip(ids, hashes, metadatas):
+                    extra = {name: value for name, value in metadata.items() if name not in INDEXED_FIELDS}
+                    chunks.append((
+                        collection_key, chunk, metadata.get('file_path', ''), metadata.get('start_line'),
+                        metadata.get('end_line'), json.dumps(extra), blobs[key],
+                    ))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (collection, id, file_path, start_line, end_line, metadata, blob)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    chunks,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if new:
+                self._maybe_train_dictionary()
+
+    def _read(self, where: str, params: list, order_by: str = "") -> list:
+        # Caller holds the lock
+        rows = self._conn.execute(
+            "SELECT c.id, c.file_path, c.start_line, c.end_line, c.metadata, b.codec, b.dictionary, b.data"
+            f" FROM chunks c JOIN blobs b ON b.id = c.blob WHERE {where} {order_by}",
+            params,
+        ).fetchall()
+        results = []
+        for chunk, file_path, start_line, end_line, metadata, codec, dictionary_id, data in rows:
+            metadata = {'file_path': file_path, **json.loads(metadata)}
+            if start_line is not None:
+                metadata['start_line'], metadata['end_line'] = start_line, end_line
+            results.append((chunk, self._decompress(codec, dictionary_id, data), metadata))
+        return results
+
+    def get_many(self, collection: str, ids: list) -> dict:
+        """ Returns {id: (text, metadata)} for the IDs that are stored. """
+        found = {}
+        with self._lock:
+            collection_key = self._collection_key(collection)
+            if collection_key is None:
+                return found
+            for start in range(0, len(ids), SQL_BATCH):
+                batch = ids[start:start + SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._read(f"c.collection = ? AND c.id IN ({placeholders})", [collection_key, *batch])
+                found.update((chunk, (text, metadata)) for chunk, text, metadata in rows)
+        return found
+
+    def find(self, collection: str, file_path: str, start_line: int = None, end_line: int = None) -> list:
+        """
+        Returns the (id, text, metadata) of a file's chunks that overlap lines
+        `start_line`..`end_line` (either may be left open), in file order.
+        """
+        with self._lock:
+            collection_key = self._collection_key(collection)
+            if collection_key is None:
+                return []
+            where, params = "c.collection = ? AND c.file_path = ?", [collection_key, file_path]
+            if end_line is not None:
+                where += " AND c.start_line <= ?"
+                params.append(end_line)
+            if start_line is not None:
+                where += " AND c.end_line >= ?"
+                params.append(start_line)
+            return self._read(where, params, order_by="ORDER BY c.start_line, c.id")
+
+    def delete(self, collection: str, ids: list):
+        """ Removes chunks, and the texts no other chunk shares. """
+        with self._lock:
+            collection_key = self._collection_key(collection)
+            if collection_key is None:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for start in range(0, len(ids), SQL_BATCH):
+                    batch = ids[start:start + SQL_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    params = [collection_key, *batch]
+                    blobs = {
+                        blob for (blob,) in self._conn.execute(
+                            f"SELECT blob FROM chunks WHERE collection = ? AND id IN ({placeholders})", params
+                        )
+                    }
+                    self._conn.execute(f"DELETE FROM chunks WHERE collection = ? AND id IN ({placeholders})", params)
+                    self._conn.executemany(
+                        "DELETE FROM blobs WHERE id = ? AND NOT EXISTS (SELECT 1 FROM chunks WHERE blob = ?)",
+                        [(blob, blob) for blob in blobs],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+# Opened on first use, so each worker gets its own connection
+chunk_store = Lazy("chunk store", lambda: ChunkStore(settings.CHUNK_STORE_PATH))
@@ -0,0 +1,271 @@
+import ast
+import os
+import re
+import threading
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Largest chunk, in characters. Definitions are packed into chunks up to this size.
+CHUNK_SIZE = 2000
+# Only the generic fallback splitter overlaps chunks; syntax-aware chunks end on
+# definition boundaries, so repeating text across them buys nothing
+CHUNK_OVERLAP = 200
+
+# Bump when chunk boundaries change, so existing collections are re-chunked
+CHUNKER_VERSION = "2"
+
+# Lines that belong to the declaration below them (comments, decorators, attributes)
+LEADING_LINE = re.compile(r"^\s*(//|/\*|\*|#|@|--)")
+
+_JS_DECLARATIONS = [
+    re.compile(r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)"),
+    re.compile(r"^(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)"),
+    re.compile(r"^(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?="),
+    re.compile(r"^(?:export\s+)?(?:declare\s+)?(?:interface|type|enum|namespace)\s+([A-Za-z_$][\w$]*)"),
+]
+_JAVA_DECLARATIONS = [
+    re.compile(r"^\s{0,4}(?:(?:public|protected|private|static|final|abstract|sealed)\s+)*(?:class|interface|enum|record)\s+(\w+)"),
+    re.compile(r"^\s{0,4}(?:(?:public|protected|private|static|final|abstract|synchronized|native|default)\s+)*(?:<[^>]+>\s+)?[\w<>\[\],.? ]+\s+(\w+)\s*\([^;]*$"),
+]
+_C_DECLARATIONS = [
+    re.compile(r"^(?:template\s*<[^>]*>\s*)?(?:class|struct|union|enum|namespace)\s+(\w+)[^;]*$"),
+    re.compile(r"^(?!(?:if|for|while|switch|return|else)\b)[A-Za-z_][\w\s\*&:<>,]*?\b(~?\w+)\s*\([^;]*$"),
+]
+
+# Per-extension patterns for lines that start a top-level declaration; the first
+# group is the symbol name. Extensions not listed here use the fallback splitter.
+DECLARATION_PATTERNS = {
+    '.js': _JS_DECLARATIONS,
+    '.jsx': _JS_DECLARATIONS,
+    '.ts': _JS_DECLARATIONS,
+    '.tsx': _JS_DECLARATIONS,
+    '.java': _JAVA_DECLARATIONS,
+    '.go': [
+        re.compile(r"^func\s+(?:\([^)]*\)\s*)?(\w+)"),
+        re.compile(r"^type\s+(\w+)"),
+    ],
+    '.rs': [
+        re.compile(r"^\s{0,4}(?:pub(?:\([^)]*\))?\s+)?(?:(?:async|const|unsafe|extern\s+\"C\")\s+)*fn\s+(\w+)"),
+        re.compile(r"^(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|union|mod|type)\s+(\w+)"),
+        re.compile(r"^(?:unsafe\s+)?impl(?:<[^>]*>)?\s+(?:[\w:<>, ]+\s+for\s+)?([\w:]+)"),
+    ],
+    '.c': _C_DECLARATIONS,
+    '.cpp': _C_DECLARATIONS,
+    '.md': [re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$")],
+    '.css': [re.compile(r"^([^\s{}/][^{]*?)\s*\{")],
+    '.yml': [re.compile(r"^([\w][\w.-]*):")],
+    '.yaml': [re.compile(r"^([\w][\w.-]*):")],
+    '.dockerfile': [re.compile(r"^FROM\s+(\S+)", re.IGNORECASE)],
+    'Dockerfile': [re.compile(r"^FROM\s+(\S+)", re.IGNORECASE)],
+}
+
+_fallback_splitter = None
+
+# ast.parse isn't thread-safe on some CPython releases (gh-106905): concurrent
+# calls can fail with "AST constructor recursion depth mismatch". Splitting runs
+# in job threads when there is no process pool.
+_parse_lock = threading.Lock()
+
+
+class _Unit:
+    """ A run of lines [start, end) (0-based) and the symbols defined in it. """
+    __slots__ = ('start', 'end', 'symbols', 'size')
+
+    def __init__(self, start: int, end: int, symbols: list, size: int):
+        self.start = start
+        self.end = end
+        self.symbols = symbols
+        self.size = size
+
+
+def _line_sizes(lines: list, start: int, end: int) -> int:
+    return sum(len(line) + 1 for line in lines[start:end])
+
+
+def _split_lines(lines: list, start: int, end: int, symbols: list) -> list:
+    """
+    Cuts an oversized run of lines into pieces of at most CHUNK_SIZE characters,
+    preferring to cut at a blank line in the second half of a piece.
+    """
+    units, piece_start, size, last_blank = [], start, 0, None
+    for index in range(start, end):
+        line_size = len(lines[index]) + 1
+        if size + line_size > CHUNK_SIZE and index > piece_start:
+            cut = last_blank + 1 if last_blank is not None and last_blank - piece_start > (index - piece_start) // 2 else index
+            units.append(_Unit(piece_start, cut, symbols, _line_sizes(lines, piece_start, cut)))
+            piece_start, last_blank = cut, None
+            size = _line_sizes(lines, piece_start, index)
+        size += line_size
+        if not lines[index].strip():
+            last_blank = index
+    units.append(_Unit(piece_start, end, symbols, _line_sizes(lines, piece_start, end)))
+    return units
+
+
+def _python_units(lines: list, body: list, start: int, end: int, prefix: str = '') -> list:
+    """
+    Units for a sequence of Python statements covering lines [start, end): each
+    function or class (with its decorators and the comments above it) is one unit,
+    and the statements between them are grouped. Oversized classes are split into
+    their methods, oversized functions by lines.
+    """
+    units = []
+    cursor = start
+    for node in body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        node_start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list]) - 1
+        # Comments directly above the definition belong to it
+        while node_start > cursor and LEADING_LINE.match(lines[node_start - 1]):
+            node_start -= 1
+        if node_start > cursor:
+            units.append(_Unit(cursor, node_start, [], _line_sizes(lines, cursor, node_start)))
+        node_end = node.end_lineno
+        name = prefix + node.name
+        size = _line_sizes(lines, node_start, node_end)
+        if size <= CHUNK_SIZE:
+            units.append(_Unit(node_start, node_end, [name], size))
+        elif isinstance(node, ast.ClassDef) and node.body:
+            body_start = node.body[0].lineno - 1
+            if body_start > node_start:
+                units.append(_Unit(node_start, body_start, [name], _line_sizes(lines, node_start, body_start)))
+            else:
+                body_start = node_start
+            units.extend(_python_units(lines, node.body, body_start, node_end, prefix=f"{name}."))
+        else:
+            units.extend(_split_lines(lines, node_start, node_end, [name]))
+        cursor = node_end
+    if end > cursor:
+        units.append(_Unit(cursor, end, [], _line_sizes(lines, cursor, end)))
+    return [unit for piece in units for unit in (_split_lines(lines, piece.start, piece.end, piece.symbols) if piece.size > CHUNK_SIZE else [piece])]
+
+
+def _regex_units(lines: list, patterns: list) -> list:
+    """ Units for a file whose declarations are found line by line with `patterns`. """
+    boundaries = []
+    for index, line in enumerate(lines):
+        for pattern in patterns:
+            match = pattern.match(line)
+            if match:
+                boundaries.append((index, match.group(1).strip()))
+                break
+
+    # Comments and attributes directly above a declaration belong to it, and lines
+    # after it (its body) up to the next declaration
+    starts, cursor = [], 0
+    for index, name in boundaries:
+        start = index
+        while start > cursor and LEADING_LINE.match(lines[start - 1]):
+            start -= 1
+        starts.append((start, name))
+        cursor = index + 1
+
+    units = []
+    if not starts or starts[0][0] > 0:
+        units.append(_Unit(0, starts[0][0] if starts else len(lines), [], 0))
+    for position, (start, name) in enumerate(starts):
+        end = starts[position + 1][0] if position + 1 < len(starts) else len(lines)
+        units.append(_Unit(start, end, [name], 0))
+
+    sized = []
+    for unit in units:
+        unit.size = _line_sizes(lines, unit.start, unit.end)
+        sized.extend(_split_lines(lines, unit.start, unit.end, unit.symbols) if unit.size > CHUNK_SIZE else [unit])
+    return sized
+
+
+def _pack(lines: list, units: list) -> list:
+    """ Packs consecutive units into chunks of at most CHUNK_SIZE characters. """
+    chunks, current = [], None
+    for unit in units:
+        if current is not None and current.size + unit.size <= CHUNK_SIZE:
+            current.end = unit.end
+            current.size += unit.size
+            current.symbols = current.symbols + [s for s in unit.symbols if s not in current.symbols]
+            continue
+        current = _Unit(unit.start, unit.end, list(unit.symbols), unit.size)
+        chunks.append(current)
+
+    results = []
+    for chunk in chunks:
+        start, end = chunk.start, chunk.end
+        # Trim surrounding blank lines so line ranges point at code
+        while start < end and not lines[start].strip():
+            start += 1
+        while end > start and not lines[end - 1].strip():
+            end -= 1
+        if start < end:
+            results.append({
+                'text': "\n".join(lines[start:end]),
+                'start_line': start + 1,
+                'end_line': end,
+                'symbols': chunk.symbols,
+            })
+    return results
+
+
+def _fallback_chunks(content: str) -> list:
+    """ The generic character splitter, with the line range each chunk came from. """
+    global _fallback_splitter
+    if _fallback_splitter is None:
+        # Imported here: the splitter is the only part of LangChain chunking needs, and it
+        # is slow to import. Most files are split by the syntax-aware chunker instead.
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        _fallback_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len,
+        )
+    results, cursor, line, line_offset = [], 0, 1, 0
+    for text in _fallback_splitter.split_text(content):
+        position = content.find(text, cursor)
+        if position < 0:
+            position = cursor
+        line += content.count("\n", line_offset, position)
+        line_offset = position
+        results.append({
+            'text': text,
+            'start_line': line,
+            'end_line': line + text.count("\n"),
+            'symbols': [],
+        })
+        cursor = position + 1
+    return results
+
+
+def _extension(relative_path: str) -> str:
+    name = os.path.basename(relative_path)
+    return name if name in DECLARATION_PATTERNS else os.path.splitext(name)[1]
+
+
+def chunk_file(relative_path: str, content: str) -> list:
+    """
+    Splits a file into chunks along its definitions: Python with `ast`, languages
+    in DECLARATION_PATTERNS by their top-level declaration lines, and anything else
+    (or Python that doesn't parse) with the generic splitter. Small neighbouring
+    definitions share a chunk; oversized ones are split by lines. Returns dicts with
+    `text`, 1-based inclusive `start_line`/`end_line`, and the `symbols` defined.
+    """
+    if not content.strip():
+        return []
+    extension = _extension(relative_path)
+    lines = content.split("\n")
+    if extension == '.py':
+        try:
+            with _parse_lock:
+                tree = ast.parse(content)
+            chunks = _pack(lines, _python_units(lines, tree.body, 0, len(lines)))
+        except (SyntaxError, ValueError):
+            return _fallback_chunks(content)
+    elif extension in DECLARATION_PATTERNS:
+        chunks = _pack(lines, _regex_units(lines, DECLARATION_PATTERNS[extension]))
+    else:
+        return _fallback_chunks(content)
+    # Lines are never cut, so a very long one (minified code) can overflow a chunk
+    if any(len(chunk['text']) > CHUNK_SIZE for chunk in chunks):
+        return _fallback_chunks(content)
+    return chunks
@@ -0,0 +1,208 @@
+from langchain_core.embeddings import Embeddings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from array import array
+from app.services import telemetry
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# When over budget, evict down to this fraction of it so we don't evict on every write
+EVICT_TARGET_RATIO = 0.9
+
+
+class CacheStats:
+    """ Hit/miss counters for embedding cache lookups. """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'embedding_cache_hits': self.hits,
+            'embedding_cache_misses': self.misses,
+            'embedding_cache_hit_rate': round(self.hit_rate, 4),
+        }
+
+
+# Stats for the onboarding job (or request) currently running in this context
+_current_stats: ContextVar = ContextVar('embedding_cache_stats', default=None)
+
+@contextmanager
+def track_cache_stats():
+    """
+    Collects cache hits and misses made in this context, including threads started
+    with a copy of it, e.g. the embedding writer's workers.
+    """
+    stats = CacheStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding store in a local SQLite file. Vectors
+    are stored as packed float32 and the least recently used rows are evicted once
+    the stored vectors exceed `max_bytes`.
+    """
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several gunicorn workers share the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._bytes = self._stored_bytes()
+
+    @staticmethod
+    def make_key(model_name: str, kind: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model_name}\0{kind}\0{text}".encode('utf-8')).digest()
+
+    def get_many(self, keys: list) -> dict:
+        """ Returns {key: vector} for the keys that are cached. """
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay under SQLite's default bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[bytes(key)] = array('f', blob).tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *batch]
+                    )
+        return found
+
+    def put_many(self, items: dict):
+        """ Stores {key: vector} and evicts old entries if over budget. """
+        now = time.time()
+        rows = [(key, array('f', vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+            self._bytes += sum(len(blob) for _, blob, _ in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def _evict(self):
+        # Caller holds the lock. Other workers write to the same file, so recount first.
+        self._bytes = self._stored_bytes()
+        target = int(self.max_bytes * EVICT_TARGET_RATIO)
+        if self._bytes <= target:
+            return
+        evicted = 0
+        while self._bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            # Only as many of the oldest as it takes to get under the target
+            victims = []
+            for key, size in rows:
+                if self._bytes <= target:
+                    break
+                victims.append((key,))
+                self._bytes -= size
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+            evicted += len(victims)
+        logger.info(f"Evicted {evicted} embeddings from the cache ({self._bytes} bytes remain).")
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so identical chunks (forks, vendored code, licenses)
+    are only ever embedded once per model. Keys hash the model name, whether the
+    text is a document or a query (they are embedded differently), and the text.
+    """
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def _record(self, hits: int, misses: int):
+        self.cache.stats.record(hits, misses)
+        job_stats = _current_stats.get()
+        if job_stats is not None:
+            job_stats.record(hits, misses)
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [EmbeddingCache.make_key(self.model_name, 'document', text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            cached.update(computed)
+
+        self._record(hits=len(texts) - len(missing), misses=len(missing))
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> list:
+        key = EmbeddingCache.make_key(self.model_name, 'query', text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            self._record(hits=1, misses=0)
+            return cached[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many({key: vector})
+        self._record(hits=0, misses=1)
+        return vector
+
+
+class TracedEmbeddings(Embeddings):
+    """ Wraps an embedding model so every API call is an `embed` (or `embed_query`) span. """
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: list) -> list:
+        with telemetry.span("embed", texts=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        with telemetry.span("embed_query"):
+            return self.embeddings.embed_query(text)
@@ -0,0 +1,229 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire(n)` blocks until n tokens are available;
+    a rate of 0 disables limiting.
+    """
+    def __init__(self, rate_per_second: float, capacity: float = None):
+        self.rate = rate_per_second
+        self.capacity = capacity or max(rate_per_second, 1)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        if not self.rate:
+            return
+        # A request larger than the bucket would otherwise wait forever
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+class WriterStats:
+    """ Throughput counters for one `EmbeddingWriter.write` run. """
+    def __init__(self):
+        self.chunks_written = 0
+        self.chunks_skipped = 0
+        self.batches_written = 0
+        self.batches_skipped = 0
+        self.retries = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_written / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'chunks_written': self.chunks_written,
+            'chunks_skipped': self.chunks_skipped,
+            'batches_written': self.batches_written,
+            'batches_skipped': self.batches_skipped,
+            'retries': self.retries,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'chunks_per_second': round(self.chunks_per_second, 2),
+            'elapsed_seconds': round(self.elapsed, 2),
+        }
+
+
+class BatchCheckpoint:
+    """
+    Append-only record of batches that were written successfully, so a retried
+    ingest can skip them. Batches are identified by a hash of their contents.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._done = {line.strip() for line in f if line.strip()}
+
+    @staticmethod
+    def batch_key(documents: list, metadatas: list, ids: list) -> str:
+        digest = hashlib.sha256()
+        for document, metadata, chunk_id in zip(documents, metadatas, ids):
+            digest.update(chunk_id.encode('utf-8'))
+            digest.update(json.dumps(metadata, sort_keys=True).encode('utf-8'))
+            digest.update(document.encode('utf-8'))
+        return digest.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._done
+
+    def mark(self, key: str):
+        with self._lock:
+            self._done.add(key)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(key + '\n')
+
+    def clear(self):
+        with self._lock:
+            self._done.clear()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class EmbeddingWriter:
+    """
+    Embeds and upserts chunk batches with bounded concurrency, token-bucket rate
+    limiting (in chunks) and exponential backoff. `write_fn(documents, metadatas, ids)`
+    does the actual work, e.g. a vector store's `add_texts`, so the writer can be
+    exercised with a fake embedding model and an in-memory store. `slot()`, if given,
+    returns a context manager held around each attempt, e.g. a slot of a pool
+    shared with other writers.
+    """
+    def __init__(self, write_fn, batch_size: int, concurrency: int, rate_limiter: TokenBucket = None,
+                 max_retries: int = 5, backoff_seconds: float = 1.0, max_backoff_seconds: float = 30.0, slot=None):
+        self.write_fn = write_fn
+        self.batch_size = batch_size
+        self.concurrency = max(concurrency, 1)
+        self.rate_limiter = rate_limiter or TokenBucket(0)
+        self.slot = slot or nullcontext
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def write(self, batches, checkpoint: BatchCheckpoint = None, progress_callback=None) -> WriterStats:
+        """
+        Consumes an iterable of (documents, metadatas, ids) and writes it in batches
+        of `batch_size`. At most 2 x concurrency batches are queued, so a streaming
+        producer is throttled rather than buffered. Raises the last error if a batch
+        still fails after `max_retries` retries. `progress_callback(stats)` is called
+        after each batch.
+        """
+        stats = WriterStats()
+        pending = set()
+
+        def on_done(future):
+            stats.record(queue_depth=-1)
+            if progress_callback:
+                progress_callback(stats)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as executor:
+            try:
+                for documents, metadatas, ids in self._rebatch(batches):
+                    key = checkpoint.batch_key(documents, metadatas, ids) if checkpoint is not None else None
+                    if key and checkpoint.contains(key):
+                        stats.record(batches_skipped=1, chunks_skipped=len(documents))
+                        continue
+
+                    # Backpressure: wait for a slot before pulling more from the producer
+                    while len(pending) >= self.concurrency * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+
+                    stats.record(queue_depth=1)
+                    # Run in a copy of the caller's context so per-job tracking (e.g. cache stats) follows the work
+                    future = executor.submit(
+                        contextvars.copy_context().run, self._write_batch, documents, metadatas, ids, key, checkpoint, stats
+                    )
+                    future.add_done_callback(on_done)
+                    pending.add(future)
+
+                for future in pending:
+                    future.result()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+            finally:
+                stats.finished_at = time.monotonic()
+
+        logger.info(f"Embedding writer finished: {stats.to_dict()}")
+        return stats
+
+    def _rebatch(self, batches):
+        for documents, metadatas, ids in batches:
+            for start in range(0, len(documents), self.batch_size):
+                end = start + self.batch_size
+                yield documents[start:end], metadatas[start:end], ids[start:end]
+
+    def _write_batch(self, documents: list, metadatas: list, ids: list, key: str, checkpoint: BatchCheckpoint, stats: WriterStats):
+        attempt = 0
+        while True:
+            try:
+                # Backoff sleeps happen outside the slot, so other writers can use it
+                with self.slot():
+                    self.rate_limiter.acquire(len(documents))
+                    self.write_fn(documents, metadatas, ids)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"Batch of {len(documents)} chunks failed after {attempt} retries: {e}")
+                    raise
+                # Full jitter keeps concurrent writers from retrying in lockstep
+                delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+                logger.warning(f"Batch of {len(documents)} chunks failed ({e}); retrying in {delay:.1f}s.")
+                attempt += 1
+                stats.record(retries=1)
+                time.sleep(delay)
+
+        if key is not None:
+            checkpoint.mark(key)
+        stats.record(batches_written=1, chunks_written=len(documents))
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class HandlePool:
+    """
+    Thread-safe LRU cache of expensive-to-build handles (e.g. vector store
+    collection clients), with a time-to-live since construction. Concurrent
+    misses for the same key wait for a single construction.
+
+    Evicted handles are dropped, not closed: a request or ingest may still be
+    using one, and it is closed (with its connections) once the last user lets go.
+    """
+    def __init__(self, factory, max_size: int, ttl_seconds: float):
+        self.factory = factory
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.construction_seconds = 0.0
+        self.max_construction_seconds = 0.0
+
+    def get(self, key: str):
+        while True:
+            with self._lock:
+                entry = self._handles.get(key)
+                if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+                    self._handles.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                if entry is not None:
+                    del self._handles[key]
+                    self.evictions += 1
+
+                build_lock = self._building.get(key)
+                if build_lock is None:
+                    build_lock = self._building[key] = threading.Lock()
+                    build_lock.acquire()
+                    self.misses += 1
+                    break
+            # Someone else is building this handle; wait for them and re-check
+            with build_lock:
+                pass
+
+        try:
+            started = time.perf_counter()
+            handle = self.factory(key)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._handles[key] = (handle, time.monotonic())
+                self.construction_seconds += elapsed
+                self.max_construction_seconds = max(self.max_construction_seconds, elapsed)
+                while len(self._handles) > self.max_size:
+                    self._handles.popitem(last=False)
+                    self.evictions += 1
+            return handle
+        finally:
+            with self._lock:
+                del self._building[key]
+            build_lock.release()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._handles.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._handles),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'avg_construction_ms': round(self.construction_seconds / self.misses * 1000, 2) if self.misses else 0.0,
+                'max_construction_ms': round(self.max_construction_seconds * 1000, 2),
+            }
+
+
+class RecentNames:
+    """ Most-recently-used list of names persisted to a JSON file, shared across restarts. """
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # Serializes writes to the file, which share a temp path
+        self._write_lock = threading.Lock()
+        self._names = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._names = json.load(f)[:max_size]
+        except (OSError, ValueError):
+            pass
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._names
+
+    def names(self) -> list:
+        with self._lock:
+            return list(self._names)
+
+    def touch(self, name: str):
+        with self._lock:
+            if self._names and self._names[0] == name:
+                return
+            self._names = [name] + [n for n in self._names if n != name][:self.max_size - 1]
+        with self._write_lock:
+            # Take the list again here, so the last write always has the newest order
+            names = self.names()
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(names, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not persist recent collections: {e}")
@@ -1,8 +1,18 @@
 import os
 import git
-import tempfile
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import pathspec
+import threading
+import time
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from app.core.config import settings
+from app.services.repo_cache import RepoCache
+from app.services.chunking import chunk_file
+from app.services.chunk_store import chunk_id
+from app.services.scheduler import stage_scheduler
+from app.services import telemetry
 import logging
 
 # Configure logging
@@ -15,58 +25,338 @@ SUPPORTED_EXTENSIONS = {
     '.yml', '.yaml', '.dockerfile', 'Dockerfile', '.java', '.go', '.rs', '.c', '.cpp'
 }
 
+# Directories that are never worth walking into, on top of .gitignore rules
+IGNORED_DIRS = {'.git', 'node_modules', '__pycache__'}
+
+# Git tree mode used for symbolic links
+SYMLINK_MODE = 0o120000
+
+# How much of a file is checked for NUL bytes to detect binaries
+BINARY_SNIFF_BYTES = 8192
+
+# Files handed to a split worker per task, to amortize inter-process overhead
+FILES_PER_TASK = 32
+
+repo_cache = RepoCache(
+    settings.REPO_CACHE_DIR,
+    settings.REPO_CACHE_MAX_BYTES,
+    depth=settings.CLONE_DEPTH,
+    clone_filter=settings.CLONE_FILTER,
+    sparse_extensions=SUPPORTED_EXTENSIONS if settings.CLONE_SPARSE else None,
+)
+
 def clone_repo(repo_url: str) -> str:
-    """ Clones a public GitHub repository to a temporary directory. """
+    """
+    Checks out a repository's default branch HEAD into a temporary directory, via
+    a shallow, blobless clone served from the on-disk mirror cache. Release the
+    checkout with `release_repo` when done.
+    """
     try:
-        temp_dir = tempfile.mkdtemp()
-        logger.info(f"Cloning {repo_url} into {temp_dir}")
-        git.Repo.clone_from(repo_url, temp_dir)
-        logger.info("Repository cloned successfully.")
-        return temp_dir
+        repo_path = repo_cache.checkout(repo_url)
+        logger.info(f"Repository {repo_url} checked out at {repo_path}.")
+        return repo_path
     except Exception as e:
         logger.error(f"Failed to clone repository: {e}")
         raise
 
-def load_and_split_documents(repo_path: str) -> (list, list, list):
+def release_repo(repo_path: str):
+    """ Deletes a checkout returned by `clone_repo`. """
+    repo_cache.release(repo_path)
+    logger.info(f"Cleaned up checkout: {repo_path}")
+
+def get_file_hashes(repo_path: str) -> dict:
     """
-    Loads all supported files from the cloned repo, splits them into chunks,
-    and prepares them for embedding.
+    Maps every supported file in the checkout's HEAD tree to its git blob SHA,
+    leaving out files under `IGNORED_DIRS` or matched by a `.gitignore` in the tree
+    (committed `node_modules/`, build output, vendored code...). Reading the tree is
+    cheap and doesn't touch the contents of the files themselves.
     """
-    documents = []
-    metadatas = []
-    
-    # Using RecursiveCharacterTextSplitter, which is good for code
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=200,
-        length_function=len,
+    repo = git.Repo(repo_path)
+    blobs, gitignores = [], []
+    for item in repo.head.commit.tree.traverse():
+        # Skip directories, submodules and symlinks
+        if item.type != 'blob' or item.mode == SYMLINK_MODE:
+            continue
+        if Path(item.path).name == '.gitignore':
+            # Read from the object store: sparse checkouts leave .gitignore files out
+            spec = pathspec.PathSpec.from_lines(
+                'gitwildmatch', item.data_stream.read().decode('utf-8', errors='ignore').splitlines()
+            )
+            base = Path(item.path).parent.as_posix()
+            gitignores.append(('' if base == '.' else base, spec))
+        elif _is_supported(item.path):
+            blobs.append(item)
+
+    ignored_dirs = {}
+
+    def in_ignored_dir(relative_path: str) -> bool:
+        parts = relative_path.split('/')
+        for depth in range(1, len(parts)):
+            directory = '/'.join(parts[:depth])
+            if directory not in ignored_dirs:
+                ignored_dirs[directory] = (
+                    parts[depth - 1] in IGNORED_DIRS or _is_ignored(directory, gitignores, is_dir=True)
+                )
+            if ignored_dirs[directory]:
+                return True
+        return False
+
+    hashes = {
+        item.path: item.hexsha for item in blobs
+        if not in_ignored_dir(item.path) and not _is_ignored(item.path, gitignores)
+    }
+    logger.info(
+        f"Hashed {len(hashes)} supported files at {repo.head.commit.hexsha[:12]} "
+        f"({len(blobs) - len(hashes)} ignored)."
     )
+    return hashes
+
+def get_commit_sha(repo_path: str) -> str:
+    """ The commit a checkout is at. """
+    return git.Repo(repo_path).head.commit.hexsha
+
+_remote_heads = {}
+_remote_heads_lock = threading.Lock()
+
+def get_remote_head(repo_url: str) -> str:
+    """
+    Returns the commit SHA of the remote's HEAD via `git ls-remote`, without cloning,
+    or None if the remote can't be reached. Answers are reused for
+    REMOTE_HEAD_CACHE_SECONDS so repeated staleness checks don't hit the remote.
+    """
+    now = time.monotonic()
+    with _remote_heads_lock:
+        cached = _remote_heads.get(repo_url)
+        if cached and now - cached[1] < settings.REMOTE_HEAD_CACHE_SECONDS:
+            return cached[0]
+    try:
+        output = git.cmd.Git().ls_remote(repo_url, 'HEAD')
+    except git.GitCommandError as e:
+        logger.warning(f"Could not read the remote HEAD of {repo_url}: {e}")
+        return None
+    sha = output.split()[0] if output else None
+    with _remote_heads_lock:
+        _remote_heads[repo_url] = (sha, now)
+    return sha
+
+def _is_supported(relative_path: str) -> bool:
+    return os.path.splitext(relative_path)[1] in SUPPORTED_EXTENSIONS
+
+def _load_gitignore(directory: str):
+    gitignore_path = os.path.join(directory, '.gitignore')
+    if not os.path.isfile(gitignore_path):
+        return None
+    try:
+        with open(gitignore_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return pathspec.PathSpec.from_lines('gitwildmatch', f)
+    except OSError:
+        return None
+
+def _is_ignored(relative_path: str, gitignores: list, is_dir: bool = False) -> bool:
+    # Each .gitignore applies to paths relative to the directory it lives in
+    for base, spec in gitignores:
+        if base and not relative_path.startswith(base + '/'):
+            continue
+        candidate = relative_path[len(base) + 1:] if base else relative_path
+        if spec.match_file(candidate + '/' if is_dir else candidate):
+            return True
+    return False
+
+def iter_repo_files(repo_path: str, max_file_bytes: int = None):
+    """
+    Yields the repo-relative (POSIX) paths of supported files. Ignored directories
+    (`IGNORED_DIRS` and anything matched by a `.gitignore`) are pruned before they
+    are descended into, and files larger than `max_file_bytes` are skipped.
+    """
+    max_file_bytes = max_file_bytes or settings.MAX_FILE_BYTES
+    gitignores = []
+    for root, dirs, files in os.walk(repo_path):
+        relative_root = Path(root).relative_to(repo_path).as_posix()
+        relative_root = '' if relative_root == '.' else relative_root
+
+        spec = _load_gitignore(root)
+        if spec is not None:
+            gitignores.append((relative_root, spec))
 
-    repo_path_obj = Path(repo_path)
-    
-    for file_path in repo_path_obj.rglob('*'):
-        if file_path.is_file() and file_path.suffix in SUPPORTED_EXTENSIONS:
-            # Avoid ingesting git files or other large, irrelevant binaries
-            if ".git" in str(file_path):
+        prefix = f"{relative_root}/" if relative_root else ''
+        dirs[:] = sorted(
+            d for d in dirs
+            if d not in IGNORED_DIRS and not _is_ignored(prefix + d, gitignores, is_dir=True)
+        )
+        for name in sorted(files):
+            relative_path = prefix + name
+            if not _is_supported(name) or _is_ignored(relative_path, gitignores):
                 continue
-            
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Split the document content into chunks
-                chunks = text_splitter.split_text(content)
-                
-                for i, chunk in enumerate(chunks):
-                    relative_path = str(file_path.relative_to(repo_path_obj))
-                    documents.append(chunk)
-                    metadatas.append({'file_path': relative_path, 'chunk_index': i})
-
-            except Exception as e:
-                logger.warning(f"Could not read or process file {file_path}: {e}")
-
-    # Create unique IDs for each chunk to be stored in ChromaDB
-    ids = [f"{meta['file_path']}_{meta['chunk_index']}" for meta in metadatas]
-    
+                if os.path.getsize(os.path.join(root, name)) > max_file_bytes:
+                    logger.info(f"Skipping {relative_path}: larger than {max_file_bytes} bytes.")
+                    continue
+            except OSError:
+                continue
+            yield relative_path
+
+def _split_files(repo_path: str, relative_paths: list, max_file_bytes: int) -> tuple:
+    """
+    Reads and splits a group of files along their definitions (see `chunk_file`).
+    Runs in a worker process, so it only returns plain data: (relative_path, chunks)
+    for each file that had content, the bytes read and the seconds it took.
+    """
+    started = time.perf_counter()
+    results, bytes_read = [], 0
+    for relative_path in relative_paths:
+        file_path = os.path.join(repo_path, relative_path)
+        try:
+            if not os.path.isfile(file_path) or os.path.getsize(file_path) > max_file_bytes:
+                continue
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            # Treat anything with NUL bytes near the start as binary
+            if b'\0' in raw[:BINARY_SNIFF_BYTES]:
+                continue
+            content = raw.decode('utf-8')
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Could not read or process file {file_path}: {e}")
+            continue
+        bytes_read += len(raw)
+        results.append((relative_path, chunk_file(relative_path, content)))
+    return results, bytes_read, time.perf_counter() - started
+
+_split_pool = None
+_split_pool_lock = threading.Lock()
+
+def _get_split_pool() -> ProcessPoolExecutor:
+    """ Returns the process pool shared by all ingestions in this worker. """
+    global _split_pool
+    with _split_pool_lock:
+        if _split_pool is None:
+            # Spawn rather than fork: we are called from job threads, and forking a
+            # multi-threaded process can deadlock the child.
+            _split_pool = ProcessPoolExecutor(
+                max_workers=settings.INGEST_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _split_pool
+
+def iter_document_batches(repo_path: str, file_paths: list = None, batch_size: int = None, progress_callback=None):
+    """
+    Streams the repo's chunks as (documents, metadatas, ids) batches of at most
+    `batch_size` chunks, so embedding can start while files are still being split.
+    Files are read and split in a process pool with a bounded number of groups in
+    flight, which keeps memory flat regardless of repo size. If `file_paths`
+    (relative to the repo root) is given, only those files are processed and
+    `progress_callback(done, total)` is called as files complete.
+    """
+    batch_size = batch_size or settings.EMBED_BATCH_SIZE
+    max_file_bytes = settings.MAX_FILE_BYTES
+    if file_paths is None:
+        paths = iter_repo_files(repo_path, max_file_bytes)
+        total_files = 0
+    else:
+        supported = [path for path in file_paths if _is_supported(path)]
+        paths = iter(supported)
+        # Progress counts the files that are split, so it reaches the total
+        total_files = len(supported)
+
+    def groups():
+        group = []
+        for path in paths:
+            group.append(path)
+            if len(group) == FILES_PER_TASK:
+                yield group
+                group = []
+        if group:
+            yield group
+
+    # Concurrent ingests take turns for split slots, so one large repo can't fill the pool
+    split_lane = stage_scheduler.lane("split")
+    if settings.INGEST_WORKERS > 1:
+        pool = _get_split_pool()
+
+        def submit(group):
+            split_lane.acquire()
+            try:
+                future = pool.submit(_split_files, repo_path, group, max_file_bytes)
+            except BaseException:
+                split_lane.release()
+                raise
+            future.add_done_callback(lambda _: split_lane.release())
+            return future
+        max_in_flight = settings.INGEST_WORKERS * 4
+    else:
+        submit = None
+        max_in_flight = 1
+
+    documents, metadatas, ids = [], [], []
+    in_flight = deque()
+    group_iter = groups()
+    files_done = 0
+    while True:
+        while submit and len(in_flight) < max_in_flight:
+            group = next(group_iter, None)
+            if group is None:
+                break
+            in_flight.append((len(group), submit(group)))
+
+        if submit:
+            if not in_flight:
+                break
+            group_size, future = in_flight.popleft()
+            results, bytes_read, seconds = future.result()
+        else:
+            group = next(group_iter, None)
+            if group is None:
+                break
+            group_size = len(group)
+            with split_lane.slot():
+                results, bytes_read, seconds = _split_files(repo_path, group, max_file_bytes)
+
+        # Timed where the work ran, which may be another process
+        chunk_count = sum(len(chunks) for _, chunks in results)
+        telemetry.record_span("split", seconds, files=group_size, chunks=chunk_count, bytes=bytes_read)
+        telemetry.BYTES_READ.inc(bytes_read)
+        telemetry.CHUNKS.inc(chunk_count, operation="split")
+
+        for relative_path, chunks in results:
+            occurrences = Counter()
+            for i, chunk in enumerate(chunks):
+                documents.append(chunk['text'])
+                metadata = {
+                    'file_path': relative_path,
+                    'chunk_index': i,
+                    'start_line': chunk['start_line'],
+                    'end_line': chunk['end_line'],
+                }
+                if chunk['symbols']:
+                    # Vector store metadata values must be scalars
+                    metadata['symbols'] = ', '.join(chunk['symbols'])
+                metadatas.append(metadata)
+                # IDs hash the file and text, so a chunk keeps its ID when lines around it change
+                ids.append(chunk_id(relative_path, chunk['text'], occurrences[chunk['text']]))
+                occurrences[chunk['text']] += 1
+                if len(documents) == batch_size:
+                    yield documents, metadatas, ids
+                    documents, metadatas, ids = [], [], []
+
+        files_done += group_size
+        if progress_callback and total_files:
+            progress_callback(files_done, total_files)
+
+    if documents:
+        yield documents, metadatas, ids
+
+def load_and_split_documents(repo_path: str, file_paths: list = None, progress_callback=None) -> (list, list, list):
+    """
+    Loads all supported files from the cloned repo, splits them into chunks,
+    and prepares them for embedding. Prefer `iter_document_batches` for large
+    repos; this collects every batch in memory.
+    """
+    documents, metadatas, ids = [], [], []
+    for batch_documents, batch_metadatas, batch_ids in iter_document_batches(
+        repo_path, file_paths, progress_callback=progress_callback
+    ):
+        documents.extend(batch_documents)
+        metadatas.extend(batch_metadatas)
+        ids.extend(batch_ids)
+
     logger.info(f"Loaded and split {len(documents)} document chunks from the repository.")
-    return documents, metadatas, ids
\ No newline at end of file
+    return documents, metadatas, ids
@@ -0,0 +1,238 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from app.core.config import settings
+from app.services import pipeline, telemetry
+from app.services.scheduler import FairQueue, stage_scheduler, tenant_for
+import threading
+import logging
+import time
+import uuid
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job lifecycle states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class OnboardingJob:
+    """ Tracks the state and progress of a single background onboarding run. """
+    def __init__(self, repo_url: str, incremental: bool, tenant: str):
+        self.job_id = uuid.uuid4().hex
+        self.repo_url = repo_url
+        self.incremental = incremental
+        self.tenant = tenant
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.current = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.metrics = {}
+        # Seconds spent so far per traced stage, summed, e.g. {"clone": 2.1, "embed": 40.3}
+        self.stage_seconds = {}
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Bumped on every change so watchers can tell when to emit an update
+        self.version = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'repo_url': self.repo_url,
+            'tenant': self.tenant,
+            'status': self.status,
+            'stage': self.stage,
+            'current': self.current,
+            'total': self.total,
+            'result': self.result,
+            'error': self.error,
+            'metrics': self.metrics,
+            'stage_seconds': self.stage_seconds,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+
+class OnboardingBatch:
+    """ A set of onboarding jobs submitted together, e.g. every repo of an organization. """
+    def __init__(self, jobs: list, tenant: str):
+        self.batch_id = uuid.uuid4().hex
+        self.jobs = jobs
+        self.tenant = tenant
+        self.created_at = time.time()
+
+    @property
+    def done(self) -> bool:
+        return all(job.done for job in self.jobs)
+
+    def to_dict(self) -> dict:
+        """ Aggregate and per-repo progress. The caller holds the job manager's lock. """
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        stage_seconds = {}
+        for job in self.jobs:
+            counts[job.status] += 1
+            for name, seconds in job.stage_seconds.items():
+                stage_seconds[name] = round(stage_seconds.get(name, 0.0) + seconds, 3)
+        finished = counts[COMPLETED] + counts[FAILED]
+        updated_at = max([job.updated_at for job in self.jobs] + [self.created_at])
+        return {
+            'batch_id': self.batch_id,
+            'tenant': self.tenant,
+            'status': COMPLETED if finished == len(self.jobs) else RUNNING,
+            'repos': len(self.jobs),
+            'queued': counts[QUEUED],
+            'running': counts[RUNNING],
+            'completed': counts[COMPLETED],
+            'failed': counts[FAILED],
+            'progress': round(finished / len(self.jobs), 4),
+            'chunks_written': int(sum(job.metrics.get('chunks_written', 0) for job in self.jobs)),
+            'stage_seconds': stage_seconds,
+            'elapsed_seconds': round((updated_at if finished == len(self.jobs) else time.time()) - self.created_at, 3),
+            'created_at': self.created_at,
+            'updated_at': updated_at,
+            'jobs': [
+                {name: value for name, value in job.to_dict().items() if name not in ('result', 'metrics')}
+                for job in self.jobs
+            ],
+        }
+
+
+class JobManager:
+    """
+    Runs onboarding jobs on a bounded thread pool so the event loop stays free.
+    Submitting a repo that already has a job in flight returns that job instead
+    of starting a second clone. Queued jobs start round-robin by tenant, so one
+    tenant's thousand-repo batch doesn't hold up another's single repo.
+    """
+    def __init__(self, max_workers: int, max_history: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="onboard")
+        self._max_history = max_history
+        self._jobs = OrderedDict()
+        self._batches = OrderedDict()
+        self._active = {}
+        self._queue = FairQueue()
+        self._lock = threading.Lock()
+
+    def submit(self, repo_url: str, incremental: bool = True, tenant: str = None) -> OnboardingJob:
+        """
+        Queues an onboarding job for `tenant` (by default the repo's owner), coalescing
+        onto an in-flight job for the same repo.
+        """
+        key = pipeline.generate_collection_name(repo_url)
+        with self._lock:
+            active_job = self._active.get(key)
+            if active_job is not None:
+                logger.info(f"Coalescing onboarding of {repo_url} onto job {active_job.job_id}.")
+                return active_job
+
+            job = OnboardingJob(repo_url, incremental, tenant or tenant_for(repo_url))
+            self._jobs[job.job_id] = job
+            self._active[key] = job
+            self._queue.push(job.tenant, job.tenant, (job, key))
+            self._evict_finished()
+
+        # Each task runs whichever queued job is next in turn, not necessarily this one
+        self._executor.submit(self._run_next)
+        logger.info(f"Queued onboarding job {job.job_id} for {repo_url} (tenant {job.tenant}).")
+        return job
+
+    def submit_batch(self, repo_urls: list, incremental: bool = True, tenant: str = None) -> OnboardingBatch:
+        """ Queues a job per distinct repo (see `submit`) and tracks them as one batch. """
+        jobs = {}
+        for repo_url in dict.fromkeys(repo_urls):
+            job = self.submit(repo_url, incremental, tenant)
+            jobs[job.job_id] = job
+        batch = OnboardingBatch(list(jobs.values()), tenant)
+        with self._lock:
+            self._batches[batch.batch_id] = batch
+            excess = len(self._batches) - self._max_history
+            for batch_id in [batch_id for batch_id, old in self._batches.items() if old.done][:max(excess, 0)]:
+                del self._batches[batch_id]
+        logger.info(f"Queued onboarding batch {batch.batch_id} of {len(batch.jobs)} repos.")
+        return batch
+
+    def get_batch(self, batch_id: str) -> dict:
+        """ Returns a consistent snapshot of a batch's aggregate and per-repo progress, or None. """
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None
+            snapshot = batch.to_dict()
+            snapshot['version'] = sum(job.version for job in batch.jobs)
+            return snapshot
+
+    def stats(self) -> dict:
+        """ Queued jobs per tenant and the occupancy of each stage pool. """
+        with self._lock:
+            queued = self._queue.depths()
+        return {'queued_jobs': queued, 'stages': stage_scheduler.stats()}
+
+    def get(self, job_id: str) -> dict:
+        """ Returns a consistent snapshot of a job, or None if it is unknown. """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = job.to_dict()
+            snapshot['version'] = job.version
+            return snapshot
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _update(self, job: OnboardingJob, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = time.time()
+            job.version += 1
+
+    def _run_next(self):
+        with self._lock:
+            job, key = self._queue.pop()
+        self._run(job, key)
+
+    def _run(self, job: OnboardingJob, key: str):
+        self._update(job, status=RUNNING)
+        started = time.perf_counter()
+
+        with stage_scheduler.flow(job.tenant, job.job_id), telemetry.trace() as job_trace:
+            def report(stage: str, current: int = 0, total: int = 0, metrics: dict = None):
+                if metrics:
+                    self._update(job, stage=stage, current=current, total=total, metrics={**job.metrics, **metrics},
+                                 stage_seconds=job_trace.totals())
+                else:
+                    self._update(job, stage=stage, current=current, total=total, stage_seconds=job_trace.totals())
+
+            try:
+                with telemetry.span("onboard", repo_url=job.repo_url, incremental=job.incremental):
+                    result = pipeline.run_onboarding(job.repo_url, job.incremental, progress=report)
+                self._update(job, status=COMPLETED, stage=COMPLETED, result=result, stage_seconds=job_trace.totals())
+                telemetry.JOBS.inc(status=COMPLETED)
+                logger.info(f"Onboarding job {job.job_id} completed in {time.perf_counter() - started:.1f}s: {job_trace.totals()}")
+            except Exception as e:
+                logger.error(f"Onboarding job {job.job_id} failed: {e}")
+                self._update(job, status=FAILED, stage=FAILED, error=str(e), stage_seconds=job_trace.totals())
+                telemetry.JOBS.inc(status=FAILED)
+            finally:
+                with self._lock:
+                    if self._active.get(key) is job:
+                        del self._active[key]
+
+    def _evict_finished(self):
+        # Caller holds the lock; drop the oldest finished jobs beyond the history limit
+        excess = len(self._jobs) - self._max_history
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+
+job_manager = JobManager(settings.ONBOARD_MAX_CONCURRENCY, settings.ONBOARD_JOB_HISTORY)
@@ -0,0 +1,66 @@
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Lazy:
+    """
+    Stands in for an expensive service object (an API client, a database-backed
+    cache) and builds it with `factory` on first use: the first attribute access,
+    or `resolve()`. Attribute reads and writes go to the built object, so module
+    singletons can be wrapped without changing their callers.
+
+    The object is built once even with concurrent first users; a failed build is
+    retried on the next use. Nothing is built at import, which keeps worker
+    startup fast and lets the gunicorn master import the app before forking
+    without sharing connections or open files with the workers.
+    """
+    def __init__(self, name: str, factory):
+        object.__setattr__(self, '_lazy_name', name)
+        object.__setattr__(self, '_lazy_factory', factory)
+        object.__setattr__(self, '_lazy_value', None)
+        object.__setattr__(self, '_lazy_built', False)
+        object.__setattr__(self, '_lazy_lock', threading.Lock())
+
+    @property
+    def resolved(self) -> bool:
+        return self._lazy_built
+
+    def resolve(self):
+        """ Returns the object, building it first if needed. """
+        if self._lazy_built:
+            return self._lazy_value
+        with self._lazy_lock:
+            if not self._lazy_built:
+                started = time.perf_counter()
+                try:
+                    value = self._lazy_factory()
+                except Exception as e:
+                    logger.error(f"Failed to initialize {self._lazy_name}: {e}")
+                    raise
+                object.__setattr__(self, '_lazy_value', value)
+                object.__setattr__(self, '_lazy_built', True)
+                logger.info(f"Initialized {self._lazy_name} in {time.perf_counter() - started:.2f}s.")
+        return self._lazy_value
+
+    def __getattr__(self, name):
+        # Only called for names the proxy itself doesn't have
+        if name.startswith('_lazy_'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __repr__(self) -> str:
+        state = repr(self._lazy_value) if self._lazy_built else "not built"
+        return f"<Lazy {self._lazy_name}: {state}>"
+
+
+def resolve(value):
+    """ Builds `value` now if it is a Lazy proxy; returns the underlying object either way. """
+    return value.resolve() if isinstance(value, Lazy) else value
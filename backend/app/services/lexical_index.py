@@ -0,0 +1,198 @@
+import os
+import re
+import sqlite3
+import threading
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Word-ish tokens; '_' is kept so snake_case identifiers stay whole
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+# Boundaries inside identifiers: snake_case, camelCase, HTTPServer, v2
+SUBTOKEN_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+# Words that carry no signal in developer questions ("how does the ... work")
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from how i if in into is it its me my of on or
+should so that the their then there these this to use used uses using was what when where which
+who why will with would you your
+""".split())
+
+# bm25() column weights, in column order: file_path, text, terms.
+# A hit in the path is strong evidence; identifier sub-words are weak evidence.
+BM25_WEIGHTS = (2.0, 1.0, 0.5)
+
+# Stay under SQLite's default bound-parameter limit
+SQL_BATCH = 500
+
+
+def tokenize(text: str) -> list:
+    """ Lower-cased word tokens of a query or chunk, without stopwords. """
+    return [token for token in (t.lower() for t in TOKEN_PATTERN.findall(text)) if token not in STOPWORDS]
+
+
+def identifier_parts(text: str) -> list:
+    """
+    Sub-words of compound identifiers, e.g. `getOrCreateCollection` and
+    `get_or_create_collection` both give get, or, create, collection.
+    """
+    parts = []
+    for token in TOKEN_PATTERN.findall(text):
+        pieces = [piece.lower() for word in token.split('_') for piece in SUBTOKEN_PATTERN.findall(word)]
+        if len(pieces) > 1:
+            parts.extend(pieces)
+    return parts
+
+
+class LexicalIndex:
+    """
+    BM25 keyword index over a collection's chunks (text and file path), backed by a
+    SQLite FTS5 table. Finds exact identifier and config-key matches that embeddings
+    blur, and answers without an embedding call. Writes are upserts by chunk ID, like
+    the vector stores, so it is kept in step with them by the same ingest.
+
+    The FTS5 table is contentless: it holds only the index, and texts and metadata of
+    matches are read from the `chunk_store` (see ChunkStore), which must be written
+    before and cleaned up after this index. Chunk IDs hash their file and text, so a
+    re-added ID is already indexed as is.
+    """
+    def __init__(self, path: str, collection: str, chunk_store):
+        self.path = path
+        self.collection = collection
+        self.chunk_store = chunk_store
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'chunks'").fetchone()
+        if row and "content=''" not in row[0]:
+            # Indexed with its own copy of every text: start over, and the next onboarding
+            # re-ingests the collection since its index is empty
+            logger.info(f"Rebuilding the keyword index of '{collection}' without stored texts.")
+            self._conn.execute("DROP TABLE chunks")
+            self._conn.execute("DROP TABLE IF EXISTS chunk_rows")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+            " file_path, text, terms, content='',"
+            " tokenize = \"unicode61 tokenchars '_'\")"
+        )
+        # FTS5 rows are only known by rowid, so chunk IDs (and the file path, for prefix
+        # filters) are mapped to one
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_rows (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, file_path TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def _columns(document: str, file_path: str) -> tuple:
+        # Deleting a row from a contentless table takes exactly the values it was indexed with
+        terms = ' '.join(identifier_parts(file_path) + identifier_parts(document))
+        return file_path, document, terms
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_rows").fetchone()[0]
+
+    def _indexed(self, ids: list) -> set:
+        # Caller holds the lock
+        indexed = set()
+        for start in range(0, len(ids), SQL_BATCH):
+            batch = ids[start:start + SQL_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            indexed.update(chunk_id for (chunk_id,) in self._conn.execute(
+                f"SELECT id FROM chunk_rows WHERE id IN ({placeholders})", batch
+            ))
+        return indexed
+
+    def add(self, documents: list, metadatas: list, ids: list):
+        """ Indexes chunks; IDs already indexed are left as they are. """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                indexed = self._indexed(ids)
+                for document, metadata, chunk_id in zip(documents, metadatas, ids):
+                    if chunk_id in indexed:
+                        continue
+                    indexed.add(chunk_id)
+                    file_path = metadata.get('file_path', '')
+                    cursor = self._conn.execute(
+                        "INSERT INTO chunk_rows (id, file_path) VALUES (?, ?)", (chunk_id, file_path)
+                    )
+                    self._conn.execute(
+                        "INSERT INTO chunks (rowid, file_path, text, terms) VALUES (?, ?, ?, ?)",
+                        (cursor.lastrowid, *self._columns(document, file_path)),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: list):
+        """ Unindexes chunks. Call before their texts are deleted from the chunk store. """
+        texts = self.chunk_store.get_many(self.collection, ids)
+        missing = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for start in range(0, len(ids), SQL_BATCH):
+                    batch = ids[start:start + SQL_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT row, id, file_path FROM chunk_rows WHERE id IN ({placeholders})", batch
+                    ).fetchall()
+                    for row, chunk_id, file_path in rows:
+                        if chunk_id in texts:
+                            self._conn.execute(
+                                "INSERT INTO chunks (chunks, rowid, file_path, text, terms) VALUES ('delete', ?, ?, ?, ?)",
+                                (row, *self._columns(texts[chunk_id][0], file_path)),
+                            )
+                        else:
+                            # Its postings stay behind, but no longer map to a chunk
+                            missing += 1
+                        self._conn.execute("DELETE FROM chunk_rows WHERE row = ?", (row,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if missing:
+            logger.warning(f"Unindexed {missing} chunks of '{self.collection}' whose texts were already gone.")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("INSERT INTO chunks (chunks) VALUES ('delete-all')")
+            self._conn.execute("DELETE FROM chunk_rows")
+
+    def search(self, query: str, k: int, path_prefix: str = None) -> list:
+        """
+        Returns up to k (Document, score) pairs ranked by BM25, best first. Any query
+        word may match (OR semantics); BM25 rewards chunks that match more of them.
+        `path_prefix` restricts results to files under a directory.
+        """
+        words = set(tokenize(query)) | set(identifier_parts(query))
+        if not words:
+            return []
+        # Tokens are [A-Za-z0-9_]+, so quoting them is enough to keep FTS5 syntax out
+        match = ' OR '.join(f'"{word}"' for word in sorted(words))
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        where, params = "chunks MATCH ?", [match]
+        if path_prefix:
+            # Unlike LIKE, this is case-sensitive and needs no escaping
+            where += " AND substr(r.file_path, 1, ?) = ?"
+            params.extend([len(path_prefix), path_prefix])
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT r.id, bm25(chunks, {weights}) AS rank"
+                f" FROM chunks JOIN chunk_rows r ON r.row = chunks.rowid WHERE {where} ORDER BY rank LIMIT ?",
+                (*params, k),
+            ).fetchall()
+        # Imported here so importing the app doesn't load LangChain
+        from langchain_core.documents import Document
+
+        chunks = self.chunk_store.get_many(self.collection, [chunk_id for chunk_id, _ in rows])
+        # bm25() is lower-is-better; flip it so scores read like similarities
+        return [
+            (Document(id=chunk_id, page_content=chunks[chunk_id][0], metadata=chunks[chunk_id][1]), -rank)
+            for chunk_id, rank in rows if chunk_id in chunks
+        ]
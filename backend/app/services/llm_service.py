@@ -1,20 +1,88 @@
-import google.generativeai as genai
 from app.core.config import settings
+from app.services.prompt_builder import count_tokens
+from app.tools.google_search import search_service, google_search_tool
+from app.services.lazy import Lazy
+from app.services import telemetry
 import logging
 import json
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure the Gemini API client
-genai.configure(api_key=settings.GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
 
-def generate_onboarding_plan(repo_structure: str):
+def _create_model():
+    # Imported here: google.generativeai takes about a second to import
+    import google.generativeai as genai
+
+    # Configure the Gemini API client
+    genai.configure(api_key=settings.GOOGLE_API_KEY)
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+
+# Built on first use, or by the startup warm-up
+model = Lazy("Gemini model", _create_model)
+
+# Rounds of tool calls (web searches) the model may make before it has to answer
+MAX_TOOL_ROUNDS = 2
+
+# Lets the model see earlier tool calls without making new ones
+NO_MORE_TOOL_CALLS = {"function_calling_config": {"mode": "NONE"}}
+
+
+def _log_usage(kind: str, prompt: str = None, usage_metadata=None) -> dict:
     """
-    Uses Gemini to generate a personalized onboarding plan based on the repository structure.
+    Logs the prompt's estimated tokens (if a prompt is given) and, when Gemini
+    reports them, the billed tokens, which are also counted in metrics. Returns the
+    counts as span attributes.
     """
+    counts = [f"~{count_tokens(prompt)} tokens estimated"] if prompt is not None else []
+    if usage_metadata is None:
+        if counts:
+            logger.info(f"{kind} prompt: {counts[0]}.")
+        return {}
+    prompt_tokens, response_tokens = usage_metadata.prompt_token_count, usage_metadata.candidates_token_count
+    counts.append(f"{prompt_tokens} prompt + {response_tokens} response tokens billed")
+    logger.info(f"{kind} prompt: {', '.join(counts)}.")
+    # Per-module summaries share one label, e.g. "Module summary (api)" counts as "Module summary"
+    label = kind.split(" (")[0]
+    telemetry.LLM_TOKENS.inc(prompt_tokens, kind=label, direction="prompt")
+    telemetry.LLM_TOKENS.inc(response_tokens, kind=label, direction="response")
+    return {'prompt_tokens': prompt_tokens, 'response_tokens': response_tokens}
+
+
+def _describe_source(meta: dict) -> str:
+    if meta.get('start_line') is None:
+        return meta['file_path']
+    return f"{meta['file_path']} (lines {meta['start_line']}-{meta['end_line']})"
+
+
+def _format_module_summaries(module_summaries: list) -> str:
+    sections = []
+    for summary in module_summaries:
+        sections.append(
+            f"Module: {summary.get('module')}\n"
+            f"Summary: {summary.get('summary', '')}\n"
+            f"Key files: {', '.join(summary.get('key_files', []))}\n"
+            f"Technologies: {', '.join(summary.get('technologies', []))}"
+        )
+    return "\n\n".join(sections)
+
+
+def generate_onboarding_plan(repo_structure: str, module_summaries: list = None):
+    """
+    Uses Gemini to generate a personalized onboarding plan based on the repository structure
+    and, for larger repos, summaries of each module written from its code.
+    """
+    modules_section = ""
+    if module_summaries:
+        modules_section = f"""
+    Summaries of the repository's modules, written from their code:
+    {_format_module_summaries(module_summaries)}
+
+    Cover the modules in a sensible learning order and prefer the key files named above.
+"""
     prompt = f"""
     You are an expert Staff Engineer and mentor responsible for onboarding new developers.
     Based on the following file structure, generate a comprehensive and actionable learning path.
@@ -28,7 +96,7 @@ def generate_onboarding_plan(repo_structure: str):
 
     Repository File Structure:
     {repo_structure}
-
+{modules_section}
     Example JSON output structure:
     {{
       "learning_path": [
@@ -62,9 +130,47 @@ def generate_onboarding_plan(repo_structure: str):
       ]
     }}
     """
+    logger.info("Generating enhanced onboarding plan with Gemini...")
+    return _generate_json(prompt, "Onboarding plan")
+
+
+def summarize_module(module: str, module_structure: str, context_documents: list, context_metadatas: list) -> dict:
+    """
+    Uses Gemini to summarize one module of a repository from its file structure and
+    a sample of its code. This is the "map" step of onboarding plan generation.
+    """
+    context_str = "\n\n---\n\n".join(
+        [f"Source File: {_describe_source(meta)}\n\nContent:\n{doc}" for doc, meta in zip(context_documents, context_metadatas)]
+    )
+    prompt = f"""
+    You are an expert Staff Engineer reading an unfamiliar codebase.
+    Summarize the module "{module}" for a developer who is new to the repository, based on its file structure and code excerpts below.
+    Your output MUST be a single, valid JSON object. Do not include any text, markdown, or explanations outside of the JSON.
+
+    Module File Structure:
+    {module_structure}
+
+    Code Excerpts:
+    {context_str}
+
+    JSON output structure:
+    {{
+      "module": "{module}",
+      "summary": "Two to four sentences on what the module does and how it fits into the project.",
+      "key_files": ["The 3-6 files a newcomer should read first, as paths"],
+      "technologies": ["Frameworks, libraries and concepts the module relies on"]
+    }}
+    """
+    logger.info(f"Summarizing module '{module}' with Gemini...")
+    return _generate_json(prompt, f"Module summary ({module})")
+
+
+def _generate_json(prompt: str, kind: str) -> dict:
+    """ Sends a prompt that asks for a JSON object and returns the parsed object. """
     try:
-        logger.info("Generating enhanced onboarding plan with Gemini...")
-        response = model.generate_content(prompt)
+        with telemetry.span("llm", kind=kind.split(" (")[0]) as llm_span:
+            response = model.generate_content(prompt)
+            llm_span.set(**_log_usage(kind, prompt, getattr(response, 'usage_metadata', None)))
 
         # ✅ START: Add robust response validation
         if not response.candidates:
@@ -96,16 +202,13 @@ def generate_onboarding_plan(repo_structure: str):
         logger.error(f"Faulty Gemini response text was: {response.text}")
         raise ValueError("The AI returned a malformed JSON response.") from e
     except Exception as e:
-        logger.error(f"Error generating onboarding plan with Gemini: {e}")
+        logger.error(f"Error generating {kind.lower()} with Gemini: {e}")
         raise
 
 
-def generate_chat_response(query: str, context_documents: list, context_metadatas: list):
-    """
-    Generates a chat response with Google Search grounding enabled.
-    """
+def _build_chat_prompt(query: str, context_documents: list, context_metadatas: list) -> str:
     context_str = "\n\n---\n\n".join(
-        [f"Source File: {meta['file_path']}\n\nContent:\n{doc}" for doc, meta in zip(context_documents, context_metadatas)]
+        [f"Source File: {_describe_source(meta)}\n\nContent:\n{doc}" for doc, meta in zip(context_documents, context_metadatas)]
     )
     
     prompt = f"""
@@ -123,17 +226,156 @@ def generate_chat_response(query: str, context_documents: list, context_metadata
     **User's Question:**
     {query}
     """
-    
+    return prompt
+
+
+def _chat_tools():
+    """ The function-calling tools offered to the model: web search, if it is configured. """
+    return [{"function_declarations": [google_search_tool]}] if search_service.enabled else None
+
+
+def _tool_options(tools, tool_round: int) -> dict:
+    if tools is None:
+        return {}
+    if tool_round < MAX_TOOL_ROUNDS:
+        return {"tools": tools}
+    return {"tools": tools, "tool_config": NO_MORE_TOOL_CALLS}
+
+
+def _function_calls(response) -> list:
+    calls = []
+    for candidate in getattr(response, 'candidates', None) or []:
+        for part in candidate.content.parts:
+            if part.function_call.name:
+                calls.append(part.function_call)
+    return calls
+
+
+def _search_queries(calls: list) -> list:
+    return [
+        str(call.args.get('query', '')) for call in calls
+        if call.name == google_search_tool['name']
+    ]
+
+
+def _tool_turns(calls: list, outcomes: dict) -> list:
+    """ The model's function-call turn and the results of the calls, to continue the conversation with. """
+    import google.generativeai as genai
+
+    parts = []
+    for call in calls:
+        if call.name != google_search_tool['name']:
+            response = {"error": f"Unknown tool '{call.name}'."}
+        else:
+            outcome = outcomes.get(str(call.args.get('query', '')))
+            response = {"error": str(outcome)} if isinstance(outcome, Exception) else {"results": outcome}
+        parts.append(genai.protos.Part(function_response=genai.protos.FunctionResponse(name=call.name, response=response)))
+    return [
+        {"role": "model", "parts": [genai.protos.Part(function_call=call) for call in calls]},
+        {"role": "user", "parts": parts},
+    ]
+
+
+def generate_chat_response(query: str, context_documents: list, context_metadatas: list):
+    """
+    Generates a chat response. The model may call the google_search tool; its
+    searches run concurrently through the search service and the results are fed
+    back until it answers.
+    """
+    with telemetry.span("prompt_build"):
+        prompt = _build_chat_prompt(query, context_documents, context_metadatas)
+    contents = [{"role": "user", "parts": [prompt]}]
+    tools = _chat_tools()
+
     try:
-        logger.info("Generating chat response with Google Search grounding...")
-        
-        # Use Google's built-in search grounding for Gemini 1.5
-        response = model.generate_content(
-            prompt
-        )
-        
+        logger.info("Generating chat response with Gemini...")
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
+            with telemetry.span("llm", kind="Chat", round=tool_round) as llm_span:
+                response = model.generate_content(contents, **_tool_options(tools, tool_round))
+                # Later rounds also send the tool turns, which only the billed count covers,
+                # so the prompt's estimate is logged once
+                estimated = prompt if tool_round == 0 else None
+                llm_span.set(**_log_usage("Chat", estimated, getattr(response, 'usage_metadata', None)))
+            calls = _function_calls(response)
+            if not calls:
+                return response.text
+            queries = _search_queries(calls)
+            logger.info(f"Model requested {len(queries)} web searches: {queries}")
+            contents.extend(_tool_turns(calls, search_service.search_many_sync(queries)))
         return response.text
         
     except Exception as e:
         logger.error(f"Error generating chat response with Gemini: {e}")
         raise
+
+
+def _chunk_text(chunk) -> str:
+    # `text` raises if a streamed chunk carries no parts (e.g. only a finish reason)
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+async def stream_chat_response(query: str, context_documents: list, context_metadatas: list):
+    """
+    Async generator yielding the chat response text as Gemini streams it. Closing the
+    generator early (e.g. the client went away) cancels the generation.
+    """
+    with telemetry.span("prompt_build"):
+        prompt = _build_chat_prompt(query, context_documents, context_metadatas)
+    contents = [{"role": "user", "parts": [prompt]}]
+    tools = _chat_tools()
+    logger.info("Streaming chat response with Gemini...")
+    for tool_round in range(MAX_TOOL_ROUNDS + 1):
+        # Timed by hand rather than with a span, which can't stay open across yields
+        started = time.perf_counter()
+        first_token = None
+        try:
+            response = await model.generate_content_async(contents, stream=True, **_tool_options(tools, tool_round))
+        except Exception as e:
+            logger.error(f"Error starting chat response stream with Gemini: {e}")
+            raise
+
+        # Iterated through our own handle so it can be closed if we stop early
+        stream = aiter(response)
+        finished = False
+        usage_metadata = None
+        calls = []
+        try:
+            async for chunk in stream:
+                # Each chunk reports the usage so far; the last one has the totals
+                usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+                calls.extend(_function_calls(chunk))
+                text = _chunk_text(chunk)
+                if text:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    yield text
+            finished = True
+            # As in generate_chat_response, the prompt's estimate is logged once
+            attributes = _log_usage("Streaming chat", prompt if tool_round == 0 else None, usage_metadata)
+            if first_token is not None:
+                attributes['first_token_ms'] = round(first_token * 1000, 1)
+            telemetry.record_span("llm", time.perf_counter() - started, kind="Streaming chat", round=tool_round, **attributes)
+        except Exception as e:
+            logger.error(f"Error streaming chat response from Gemini: {e}")
+            raise
+        finally:
+            if not finished:
+                # Closing the stream and dropping the response releases the gRPC call,
+                # which grpc cancels when it is collected, so an abandoned generation
+                # stops producing (and billing) tokens
+                aclose = getattr(stream, 'aclose', None)
+                if aclose is not None:
+                    await aclose()
+                    logger.info("Chat response stream closed before completion.")
+                else:
+                    logger.warning("Chat response stream can't be closed; the generation may run to completion.")
+                response = stream = None
+
+        if not calls:
+            return
+        queries = _search_queries(calls)
+        logger.info(f"Model requested {len(queries)} web searches: {queries}")
+        contents.extend(_tool_turns(calls, await search_service.search_many(queries)))
@@ -0,0 +1,346 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+import numpy as np
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The IVF index is retrained once the collection has grown this much since the last training
+IVF_RETRAIN_GROWTH = 2.0
+# Points sampled per centroid when training, and k-means iterations
+IVF_SAMPLES_PER_LIST = 64
+IVF_TRAIN_ITERATIONS = 8
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def train_ivf(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """ Spherical k-means over (a sample of) unit vectors; returns unit centroids. """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * IVF_SAMPLES_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+    for _ in range(IVF_TRAIN_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = sample[assignments == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+def assign_ivf(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    """ Assigns each vector to its nearest centroid, in blocks to bound memory. """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size])
+        assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for self-hosting. Unit-normalized float32 vectors live
+    in a memory-mapped file per collection and chunk text/metadata in SQLite. Small
+    collections are searched exhaustively; past `ivf_min_rows` an IVF index (k-means
+    centroids plus inverted lists) restricts each query to `nprobe` lists.
+
+    Several processes may share a collection directory: every write bumps a
+    generation counter in SQLite, and readers reload when it changes.
+
+    Given a `chunk_store` (see ChunkStore), only IDs and vectors are kept here and
+    search results are filled in from it; the caller keeps it in step, like the
+    lexical index. Rows written without one keep their text and metadata.
+    """
+    def __init__(self, collection_name: str, embedding: Embeddings, root_dir: str, ivf_min_rows: int = 20000, nprobe: int = 8,
+                 chunk_store=None):
+        self.collection_name = collection_name
+        self.embedding = embedding
+        self.chunk_store = chunk_store
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self._dir = os.path.join(root_dir, collection_name)
+        self._vectors_path = os.path.join(self._dir, "vectors.f32")
+        self._centroids_path = os.path.join(self._dir, "centroids.npy")
+        self._lock = threading.RLock()
+        os.makedirs(self._dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(self._dir, "chunks.sqlite"), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL,"
+            " metadata TEXT NOT NULL, list_id INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._generation = None
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    # --- state -------------------------------------------------------------
+
+    def _meta(self, key: str, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _load(self):
+        """ (Re)reads the collection's state from disk. Caller holds the lock. """
+        self._generation = self._meta('generation', 0)
+        self._dim = self._meta('dim')
+        self._trained_rows = self._meta('trained_rows', 0)
+        self._vectors = None
+        self._capacity = 0
+        if self._dim and os.path.exists(self._vectors_path):
+            self._capacity = os.path.getsize(self._vectors_path) // (self._dim * 4)
+            if self._capacity:
+                self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(self._capacity, self._dim))
+
+        self._centroids = np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._assignments = np.full(self._capacity, -1, dtype=np.int32)
+        rows = self._conn.execute("SELECT row, list_id FROM chunks").fetchall()
+        if rows:
+            row_ids, list_ids = np.array(rows, dtype=np.int64).T
+            self._alive[row_ids] = True
+            self._assignments[row_ids] = list_ids
+        self._lists = None
+
+    def _refresh_if_stale(self):
+        if self._meta('generation', 0) != self._generation:
+            self._load()
+
+    def _bump_generation(self):
+        self._generation += 1
+        self._set_meta('generation', self._generation)
+
+    def _ensure_capacity(self, rows_needed: int):
+        if rows_needed <= self._capacity:
+            return
+        new_capacity = max(rows_needed, self._capacity * 2, 1024)
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(new_capacity, self._dim))
+        self._alive = np.concatenate([self._alive, np.zeros(new_capacity - self._capacity, dtype=bool)])
+        self._assignments = np.concatenate([self._assignments, np.full(new_capacity - self._capacity, -1, dtype=np.int32)])
+        self._capacity = new_capacity
+
+    def _inverted_lists(self) -> list:
+        # Rebuilt lazily after writes: one argsort over the assignments
+        if self._lists is None:
+            live_rows = np.flatnonzero(self._alive & (self._assignments >= 0))
+            order = live_rows[np.argsort(self._assignments[live_rows], kind='stable')]
+            bounds = np.searchsorted(self._assignments[order], np.arange(len(self._centroids) + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+        return self._lists
+
+    def _maybe_train(self):
+        live_rows = np.flatnonzero(self._alive)
+        if len(live_rows) < self.ivf_min_rows:
+            return
+        if self._centroids is not None and len(live_rows) < self._trained_rows * IVF_RETRAIN_GROWTH:
+            return
+        n_lists = max(int(np.sqrt(len(live_rows))), 1)
+        logger.info(f"Training IVF index for '{self.collection_name}' with {n_lists} lists over {len(live_rows)} vectors.")
+        vectors = np.asarray(self._vectors[live_rows])
+        self._centroids = train_ivf(vectors, n_lists)
+        assignments = assign_ivf(vectors, self._centroids)
+        self._assignments[live_rows] = assignments
+        np.save(self._centroids_path, self._centroids)
+        self._conn.executemany(
+            "UPDATE chunks SET list_id = ? WHERE row = ?",
+            zip(assignments.tolist(), live_rows.tolist()),
+        )
+        self._trained_rows = len(live_rows)
+        self._set_meta('trained_rows', self._trained_rows)
+        self._lists = None
+
+    # --- VectorStore API ---------------------------------------------------
+
+    def add_texts(self, texts, metadatas: list = None, ids: list = None, **kwargs) -> list:
+        """ Embeds and upserts texts; an existing ID is overwritten in place. """
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        # An ID repeated within the batch keeps its last text, as separate upserts would;
+        # otherwise the earlier copy would get a row the ID no longer points to
+        last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+        vectors =_normalize(np.asarray(self.embedding.embed_documents(texts), dtype=np.float32))
+
+        with self._lock:
+            # BEGIN IMMEDIATE serializes row allocation with writers in other processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh_if_stale()
+                if self._dim is None:
+                    self._dim = vectors.shape[1]
+                    self._set_meta('dim', self._dim)
+                elif vectors.shape[1] != self._dim:
+                    raise ValueError(f"Expected {self._dim}-dimensional embeddings, got {vectors.shape[1]}.")
+
+                rows = []
+                next_row = self._meta('next_row', 0)
+                for chunk_id in ids:
+                    existing = self._conn.execute("SELECT row FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+                    free = None if existing else self._conn.execute("SELECT row FROM free_rows LIMIT 1").fetchone()
+                    if existing:
+                        rows.append(existing[0])
+                    elif free:
+                        self._conn.execute("DELETE FROM free_rows WHERE row = ?", free)
+                        rows.append(free[0])
+                    else:
+                        rows.append(next_row)
+                        next_row += 1
+                self._set_meta('next_row', next_row)
+
+                self._ensure_capacity(next_row)
+                rows = np.array(rows, dtype=np.int64)
+                self._vectors[rows] = vectors
+                self._vectors.flush()
+                list_ids = assign_ivf(vectors, self._centroids) if self._centroids is not None else np.full(len(rows), -1)
+                if self.chunk_store is not None:
+                    texts, metadatas = [''] * len(texts), [{}] * len(texts)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (row, id, text, metadata, list_id) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (int(row), chunk_id, text, json.dumps(metadata), int(list_id))
+                        for row, chunk_id, text, metadata, list_id in zip(rows, ids, texts, metadatas, list_ids)
+                    ],
+                )
+                self._alive[rows] = True
+                self._assignments[rows] = list_ids
+                self._lists = None
+                self._maybe_train()
+                self._bump_generation()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._load()
+                raise
+        return ids
+
+    def delete(self, ids: list = None, **kwargs) -> bool:
+        """ Deletes chunks by ID; their rows are reused by later inserts. """
+        if not ids:
+            return True
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh_if_stale()
+                rows = []
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    rows += [row for (row,) in self._conn.execute(f"SELECT row FROM chunks WHERE id IN ({placeholders})", batch)]
+                    self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+                self._conn.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", [(row,) for row in rows])
+                self._alive[rows] = False
+                self._lists = None
+                self._bump_generation()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._load()
+                raise
+        return True
+
+    def clear(self):
+        """ Deletes every chunk in the collection. """
+        ids = [chunk_id for (chunk_id,) in self._conn.execute("SELECT id FROM chunks")]
+        self.delete(ids)
+
+    def search_vectors(self, query_vector, k: int) -> list:
+        """ Returns up to k (row, cosine similarity) pairs, best first. """
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        with self._lock:
+            self._refresh_if_stale()
+            if self._vectors is None or not self._alive.any():
+                return []
+            if self._centroids is None:
+                # Exhaustive scan straight off the memory map; dead rows are masked out
+                high = int(np.flatnonzero(self._alive)[-1]) + 1
+                scores = np.asarray(self._vectors[:high] @ query)
+                scores[~self._alive[:high]] = -np.inf
+                candidates = np.arange(high)
+            else:
+                lists = self._inverted_lists()
+                probes = np.argsort(self._centroids @ query)[-self.nprobe:]
+                candidates = np.concatenate([lists[c] for c in probes])
+                scores = np.asarray(self._vectors[candidates]) @ query if len(candidates) else np.empty(0)
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def similarity_search_with_score_by_vector(self, embedding: list, k: int = 4, **kwargs) -> list:
+        hits = self.search_vectors(embedding, k)
+        if not hits:
+            return []
+        placeholders = ','.join('?' * len(hits))
+        with self._lock:
+            rows = {
+                row: (chunk_id, text, metadata)
+                for row, chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({placeholders})", [row for row, _ in hits]
+                )
+            }
+        stored = {}
+        if self.chunk_store is not None:
+            stored = self.chunk_store.get_many(self.collection_name, [chunk_id for chunk_id, _, _ in rows.values()])
+        results = []
+        for row, score in hits:
+            if row not in rows:
+                continue
+            chunk_id, text, metadata = rows[row]
+            if chunk_id in stored:
+                text, metadata = stored[chunk_id]
+            elif text or self.chunk_store is None:
+                metadata = json.loads(metadata)
+            else:
+                # Deleted from the chunk store since the search
+                continue
+            results.append((Document(id=chunk_id, page_content=text, metadata=metadata), score))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    @classmethod
+    def from_texts(cls, texts, embedding: Embeddings, metadatas: list = None, ids: list = None,
+                   collection_name: str = "default", root_dir: str = "data/vectors", **kwargs):
+        store = cls(collection_name, embedding, root_dir, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
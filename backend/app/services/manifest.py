@@ -0,0 +1,66 @@
+import json
+import os
+import logging
+from app.core.config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ManifestStore:
+    """
+    Persists a per-collection manifest of file path -> git blob SHA, together with
+    the chunk IDs each file produced, so re-onboarding only touches changed files.
+    """
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _path(self, collection_name: str) -> str:
+        return os.path.join(self.root_dir, f"{collection_name}.json")
+
+    def load(self, collection_name: str) -> dict:
+        """ Returns the stored manifest for a collection, or an empty one. """
+        path = self._path(collection_name)
+        if not os.path.exists(path):
+            return {"files": {}}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            # A corrupt manifest only costs us a full re-ingest, so don't fail the request
+            logger.warning(f"Ignoring unreadable manifest for '{collection_name}': {e}")
+            return {"files": {}}
+
+    def save(self, collection_name: str, manifest: dict):
+        """ Atomically writes the manifest for a collection. """
+        path = self._path(collection_name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved manifest for '{collection_name}' ({len(manifest.get('files', {}))} files).")
+
+    def delete(self, collection_name: str):
+        """ Removes the manifest for a collection, forcing the next ingest to be a full one. """
+        path = self._path(collection_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def diff_manifest(previous_files: dict, current_hashes: dict) -> (list, list, list):
+    """
+    Compares the stored manifest entries with the blob SHAs of a fresh checkout.
+    Returns the added, modified and removed file paths.
+    """
+    added = [path for path in current_hashes if path not in previous_files]
+    modified = [
+        path for path, sha in current_hashes.items()
+        if path in previous_files and previous_files[path].get('sha') != sha
+    ]
+    removed = [path for path in previous_files if path not in current_hashes]
+    return added, modified, removed
+
+
+manifest_store = ManifestStore(os.path.join(settings.DATA_DIR, "manifests"))
@@ -0,0 +1,191 @@
+from app.services import ingestion, planner
+from app.services.vector_store import vector_store_manager
+from app.services.manifest import manifest_store, diff_manifest
+from app.services.answer_cache import answer_cache
+from app.services.plan_store import plan_store
+from app.services.chunking import CHUNKER_VERSION
+from app.services.chunk_store import CHUNK_ID_VERSION
+from app.services.scheduler import stage_scheduler
+from app.services import telemetry
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class OnboardingError(ValueError):
+    """ Raised when a repository cannot be onboarded because of its contents. """
+
+
+def _no_progress(stage: str, current: int = 0, total: int = 0, metrics: dict = None):
+    pass
+
+
+def _reingest_reason(manifest: dict, lexical_index) -> str:
+    """
+    Why a collection indexed as recorded in `manifest` must be fully re-ingested
+    (it predates the keyword index, the current chunker or chunk ID scheme), or None.
+    """
+    if not manifest['files']:
+        return None
+    if lexical_index is not None and not lexical_index.count():
+        # Re-read every file once to build the keyword index (the embeddings
+        # themselves come from the embedding cache)
+        return "has no keyword index yet"
+    if manifest.get('chunker') != CHUNKER_VERSION:
+        # Re-split every file so chunks (and line ranges) are consistent across the collection
+        return "was chunked differently"
+    if manifest.get('chunk_ids') != CHUNK_ID_VERSION:
+        # Texts are in the vector store: re-ingest once so every chunk is in the chunk
+        # store and cited by a stable ID
+        return "uses an older chunk ID scheme"
+    return None
+
+
+def generate_collection_name(repo_url: str) -> str:
+    """ Generates a ChromaDB-compatible collection name from a repo URL. """
+    return repo_url.replace("https://", "").replace("/", "_").replace(".", "_")
+
+
+def run_onboarding(repo_url: str, incremental: bool = True, progress=_no_progress) -> dict:
+    """
+    Onboards a repository: clones it, processes files, creates embeddings,
+    and generates an initial learning plan. This is blocking and is meant to run
+    on a worker thread; `progress(stage, current, total, metrics)` is called as it goes.
+    Each stage waits for a slot of its stage_scheduler pool, shared with concurrent runs.
+    """
+    # Imported here: the embedding cache module loads LangChain, which the app defers
+    from app.services.embedding_cache import track_cache_stats
+
+    repo_path = None
+    collection_name = generate_collection_name(repo_url)
+
+    # 0. A plan generated from the remote's current HEAD is still valid: nothing to do,
+    # unless the collection was indexed in a way that now needs a full re-ingest
+    if incremental:
+        progress("checking")
+        with stage_scheduler.slot("clone"), telemetry.span("check_remote"):
+            remote_head = ingestion.get_remote_head(repo_url)
+            stored = plan_store.get(collection_name, remote_head, planner.PLAN_PROMPT_VERSION) if remote_head else None
+        if stored is not None:
+            collection = vector_store_manager.get_or_create_collection(collection_name)
+            reason = _reingest_reason(
+                manifest_store.load(collection_name), vector_store_manager.lexical_index_for(collection)
+            )
+            if reason is None:
+                logger.info(f"'{collection_name}' is up to date at {remote_head[:12]}; reusing its stored plan.")
+                return stored['plan']
+            logger.info(f"'{collection_name}' is up to date at {remote_head[:12]} but {reason}; onboarding again.")
+
+    try:
+        # 1. Clone the repository
+        progress("cloning")
+        with stage_scheduler.slot("clone"), telemetry.span("clone"):
+            repo_path = ingestion.clone_repo(repo_url)
+
+        # 2. Get the collection for this repo
+        collection = vector_store_manager.get_or_create_collection(collection_name)
+
+        # 3. Work out which files changed since the last onboarding of this repo
+        with telemetry.span("walk") as walk_span:
+            file_hashes = ingestion.get_file_hashes(repo_path)
+            walk_span.set(files=len(file_hashes))
+        if not file_hashes:
+            raise OnboardingError("No supported files found in the repository.")
+
+        manifest = manifest_store.load(collection_name)
+        previous_files = manifest['files']
+        added, modified, removed = diff_manifest(previous_files, file_hashes)
+        content_changed = bool(added or modified or removed)
+        lexical_index = vector_store_manager.lexical_index_for(collection)
+        reason = _reingest_reason(manifest, lexical_index) if incremental else None
+        if reason is not None:
+            logger.info(f"Collection '{collection_name}' {reason}; re-ingesting all files.")
+            incremental = False
+        if not incremental:
+            # A full re-ingest treats every previously indexed file as modified
+            added = [path for path in file_hashes if path not in previous_files]
+            modified = [path for path in file_hashes if path in previous_files]
+        logger.info(f"Ingest plan for '{collection_name}': {len(added)} added, {len(modified)} modified, {len(removed)} removed.")
+
+        # 4. Split and embed changed files. Chunks are embedded batch by batch while later
+        # files are still being split; batches already written by a failed earlier run
+        # of this ingest are skipped via the collection's checkpoint.
+        changed_paths = added + modified
+        ids_by_path = {path: [] for path in changed_paths}
+        counts = {'split': 0}
+
+        def tracked_batches():
+            for documents, metadatas, ids in ingestion.iter_document_batches(
+                repo_path,
+                changed_paths,
+                progress_callback=lambda done, total: progress("splitting", done, total),
+            ):
+                counts['split'] += len(documents)
+                for meta, chunk_id in zip(metadatas, ids):
+                    ids_by_path[meta['file_path']].append(chunk_id)
+                yield documents, metadatas, ids
+
+        checkpoint = vector_store_manager.checkpoint_for(collection)
+        if len(checkpoint):
+            logger.info(f"Resuming ingest of '{collection_name}' with {len(checkpoint)} batches already written.")
+        with track_cache_stats() as cache_stats:
+            stats = vector_store_manager.write_document_batches(
+                collection,
+                tracked_batches(),
+                checkpoint=checkpoint,
+                progress_callback=lambda stats: progress(
+                    "embedding",
+                    stats.chunks_written + stats.chunks_skipped,
+                    counts['split'],
+                    metrics={**stats.to_dict(), **cache_stats.to_dict()},
+                ),
+            )
+        logger.info(
+            f"Embedded {stats.chunks_written} chunks from {len(changed_paths)} changed files "
+            f"(embedding cache hit rate {cache_stats.hit_rate:.1%})."
+        )
+
+        # 5. Drop chunks of removed files, and chunks of modified files that are gone.
+        # Chunk IDs hash the file and text, so unchanged chunks were overwritten in place.
+        new_ids = {chunk_id for chunk_ids in ids_by_path.values() for chunk_id in chunk_ids}
+        stale_ids = [
+            chunk_id for path in modified + removed for chunk_id in previous_files[path]['ids']
+            if chunk_id not in new_ids
+        ]
+        vector_store_manager.delete_documents_from_collection(collection, stale_ids)
+
+        # 6. Record what is now indexed so the next onboarding can skip unchanged files
+        files = {
+            path: previous_files[path] for path in file_hashes if path not in ids_by_path
+        }
+        for path, chunk_ids in ids_by_path.items():
+            files[path] = {'sha': file_hashes[path], 'ids': chunk_ids}
+        if not any(entry['ids'] for entry in files.values()):
+            raise OnboardingError("No supported files found in the repository.")
+        manifest_store.save(collection_name, {'files': files, 'chunker': CHUNKER_VERSION, 'chunk_ids': CHUNK_ID_VERSION})
+        checkpoint.clear()
+        if answer_cache and content_changed:
+            # Answers were grounded in the old code
+            answer_cache.invalidate(collection_name)
+
+        # 7. Generate onboarding plan with LLM: per-module summaries (cached by module
+        # content, so only changed modules are re-summarized) reduced into one plan
+        progress("planning")
+        with stage_scheduler.slot("plan"), telemetry.span("plan"):
+            plan_data = planner.generate_plan(file_hashes, repo_path, lexical_index, progress)
+
+        commit_sha = ingestion.get_commit_sha(repo_path)
+        result = {
+            'learning_path': plan_data['learning_path'],
+            'starter_tasks': plan_data['starter_tasks'],
+            'message': f"Successfully onboarded {repo_url}. You can now start asking questions.",
+            'commit_sha': commit_sha,
+        }
+        plan_store.put(collection_name, commit_sha, planner.PLAN_PROMPT_VERSION, repo_url, result)
+        return result
+    finally:
+        # 8. Clean up the checkout (the cached mirror is kept for the next onboarding)
+        if repo_path:
+            ingestion.release_repo(repo_path)
@@ -0,0 +1,88 @@
+from app.core.config import settings
+from app.services.lazy import Lazy
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PlanStore:
+    """
+    Generated onboarding plans in a local SQLite file, keyed by collection, the
+    commit they were generated from, and the plan prompt version. A repo whose
+    remote HEAD still matches a stored plan can be resumed without any work.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            " collection TEXT NOT NULL, commit_sha TEXT NOT NULL, prompt_version TEXT NOT NULL,"
+            " repo_url TEXT NOT NULL, plan TEXT NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (collection, commit_sha, prompt_version))"
+        )
+
+    @staticmethod
+    def _row(row) -> dict:
+        if row is None:
+            return None
+        collection, commit_sha, prompt_version, repo_url, plan, created_at = row
+        return {
+            'collection': collection,
+            'commit_sha': commit_sha,
+            'prompt_version': prompt_version,
+            'repo_url': repo_url,
+            'plan': json.loads(plan),
+            'created_at': created_at,
+        }
+
+    def get(self, collection: str, commit_sha: str, prompt_version: str) -> dict:
+        """ Returns the stored plan for exactly this commit and prompt version, or None. """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM plans WHERE collection = ? AND commit_sha = ? AND prompt_version = ?",
+                (collection, commit_sha, prompt_version),
+            ).fetchone()
+        return self._row(row)
+
+    def latest(self, collection: str, prompt_version: str) -> dict:
+        """ Returns the most recently generated plan of a collection for a prompt version, or None. """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM plans WHERE collection = ? AND prompt_version = ? ORDER BY created_at DESC LIMIT 1",
+                (collection, prompt_version),
+            ).fetchone()
+        return self._row(row)
+
+    def put(self, collection: str, commit_sha: str, prompt_version: str, repo_url: str, plan: dict):
+        """ Stores a plan, keeping only the newest few per collection. """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?)",
+                    (collection, commit_sha, prompt_version, repo_url, json.dumps(plan), time.time()),
+                )
+                self._conn.execute(
+                    "DELETE FROM plans WHERE collection = ? AND rowid NOT IN ("
+                    " SELECT rowid FROM plans WHERE collection = ? ORDER BY created_at DESC LIMIT ?)",
+                    (collection, collection, settings.PLAN_STORE_HISTORY),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Stored onboarding plan for '{collection}' at {commit_sha[:12]}.")
+
+
+# Opened on first use, so each worker gets its own connection
+plan_store = Lazy("plan store", lambda: PlanStore(settings.PLAN_STORE_PATH))
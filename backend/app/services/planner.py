@@ -0,0 +1,248 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.core.config import settings
+from app.services import ingestion, llm_service, telemetry
+from app.services.prompt_builder import pack_context, summarize_file_tree
+from app.tools.google_search import search_service
+import contextvars
+import hashlib
+import json
+import os
+import re
+import threading
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pseudo-modules for files at the top of the repo and for small modules grouped together
+ROOT_MODULE = "(root)"
+OTHER_MODULE = "(other)"
+
+# Bump when the module summary prompt changes, so cached summaries are regenerated
+SUMMARY_PROMPT_VERSION = "1"
+
+# Bump when the plan or module summary prompts change, so stored plans are regenerated
+PLAN_PROMPT_VERSION = "3"
+
+# Files that usually explain a module best, in order of preference
+ENTRY_POINT_NAMES = (
+    'readme', '__init__', 'main', '__main__', 'index', 'app', 'server', 'cli', 'api',
+    'routes', 'urls', 'models', 'schemas', 'config', 'settings', 'setup', 'package', 'pyproject',
+)
+
+# Keyword query for a module's most informative chunks when sampling it from the index
+EVIDENCE_QUERY = "main app init index config api route service server handler model schema class export"
+
+# Files sampled from the checkout when the keyword index can't be used
+MAX_EVIDENCE_FILES = 6
+
+# The quoted search in a resource suggestion, e.g. "Search for 'FastAPI tutorial'"
+QUOTED_SEARCH = re.compile(r"['\"\u2018\u201c]([^'\"\u2019\u201d]{3,})['\"\u2019\u201d]")
+
+# Where to look for each kind of external resource
+RESOURCE_SITES = {"youtube": "site:youtube.com"}
+
+
+def split_modules(paths: list, max_modules: int) -> dict:
+    """
+    Groups repository paths into modules: top-level directories, with files at the
+    top level as ROOT_MODULE. A directory holding most of the repo (src/, packages/)
+    is split into its subdirectories, and past `max_modules` the smallest modules
+    are grouped as OTHER_MODULE. Returns {module: [paths]}; module names are the
+    directory paths.
+    """
+    def group(module_paths: list, prefix: str) -> dict:
+        grouped = {}
+        for path in module_paths:
+            rest = path[len(prefix):]
+            name = prefix + rest.split('/', 1)[0] if '/' in rest else (prefix.rstrip('/') or ROOT_MODULE)
+            grouped.setdefault(name, []).append(path)
+        return grouped
+
+    modules = group(paths, '')
+    while len(modules) < max_modules:
+        largest = max(modules, key=lambda name: len(modules[name]))
+        if largest == ROOT_MODULE or len(modules[largest]) * 2 < len(paths):
+            break
+        children = group(modules[largest], largest + '/')
+        if len(children) < 2 or len(modules) - 1 + len(children) > max_modules:
+            break
+        del modules[largest]
+        modules.update(children)
+
+    if len(modules) > max_modules:
+        by_size = sorted(modules, key=lambda name: len(modules[name]), reverse=True)
+        kept = {name: modules[name] for name in by_size[:max_modules - 1]}
+        kept[OTHER_MODULE] = [path for name in by_size[max_modules - 1:] for path in modules[name]]
+        modules = kept
+    return modules
+
+
+def module_hash(module: str, file_hashes: dict) -> str:
+    """ Content hash of a module: its name and the blob SHAs of its files. """
+    digest = hashlib.sha256(f"{SUMMARY_PROMPT_VERSION}\0{module}\n".encode('utf-8'))
+    for path in sorted(file_hashes):
+        digest.update(f"{path}\0{file_hashes[path]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SummaryStore:
+    """
+    Module summaries on disk, one JSON file per module content hash. Identical
+    modules (forks, unchanged code) are only ever summarized once.
+    """
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, summary: dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f)
+        os.replace(tmp_path, path)
+
+
+summary_store = SummaryStore(os.path.join(settings.DATA_DIR, "module_summaries"))
+
+_map_pool = None
+_map_pool_lock = threading.Lock()
+
+def _get_map_pool() -> ThreadPoolExecutor:
+    """ One pool for every job, so PLAN_MAP_CONCURRENCY bounds LLM calls per worker. """
+    global _map_pool
+    with _map_pool_lock:
+        if _map_pool is None:
+            _map_pool = ThreadPoolExecutor(max_workers=settings.PLAN_MAP_CONCURRENCY, thread_name_prefix="plan-map")
+        return _map_pool
+
+
+def _representative_files(paths: list) -> list:
+    def priority(path: str):
+        stem = os.path.splitext(os.path.basename(path))[0].lower()
+        rank = ENTRY_POINT_NAMES.index(stem) if stem in ENTRY_POINT_NAMES else len(ENTRY_POINT_NAMES)
+        return (rank, path.count('/'), path)
+    return sorted(paths, key=priority)[:MAX_EVIDENCE_FILES]
+
+
+def _module_evidence(module: str, paths: list, repo_path: str, lexical_index):
+    """ Retrieves a sample of the module's code, packed to PLAN_EVIDENCE_TOKEN_BUDGET. """
+    results = []
+    if lexical_index is not None and module not in (ROOT_MODULE, OTHER_MODULE):
+        query = f"{module.replace('/', ' ')} {EVIDENCE_QUERY}"
+        results = lexical_index.search(query, settings.RETRIEVAL_CANDIDATES, path_prefix=module + '/')
+    if results:
+        documents = [document.page_content for document, _ in results]
+        metadatas = [document.metadata for document, _ in results]
+    else:
+        documents, metadatas, _ = ingestion.load_and_split_documents(repo_path, _representative_files(paths))
+    return pack_context(documents, metadatas, settings.PLAN_EVIDENCE_TOKEN_BUDGET)
+
+
+def _summarize_module(module: str, paths: list, repo_path: str, lexical_index) -> dict:
+    with telemetry.span("summarize_module", module=module, files=len(paths)):
+        evidence = _module_evidence(module, paths, repo_path, lexical_index)
+        structure = summarize_file_tree(paths, settings.PLAN_MODULE_STRUCTURE_TOKEN_BUDGET)
+        summary = llm_service.summarize_module(module, structure, evidence.documents, evidence.metadatas)
+    summary['module'] = module
+    return summary
+
+
+def summarize_modules(modules: dict, file_hashes: dict, repo_path: str, lexical_index=None, progress=None) -> list:
+    """
+    The "map" step: summarizes each module concurrently, reusing cached summaries of
+    modules whose content hasn't changed. A module whose summary fails is left out.
+    """
+    summaries, pending = {}, {}
+    for module, paths in modules.items():
+        key = module_hash(module, {path: file_hashes[path] for path in paths})
+        cached = summary_store.get(key)
+        if cached is not None:
+            summaries[module] = cached
+        else:
+            pending[module] = key
+    logger.info(f"Module summaries: {len(summaries)} cached, {len(pending)} to generate.")
+
+    pool = _get_map_pool()
+    # Each summary runs in a copy of the caller's context, so its spans join the job's trace
+    futures = {
+        pool.submit(contextvars.copy_context().run, _summarize_module, module, modules[module], repo_path, lexical_index): module
+        for module in pending
+    }
+    for done, future in enumerate(as_completed(futures), start=1):
+        module = futures[future]
+        try:
+            summaries[module] = future.result()
+            summary_store.put(pending[module], summaries[module])
+        except Exception as e:
+            logger.warning(f"Could not summarize module '{module}': {e}")
+        if progress:
+            progress("planning", done, len(futures))
+
+    # Keep the modules in a stable order for the reduce prompt
+    return [summaries[module] for module in sorted(summaries)]
+
+
+def _resource_query(resource: dict) -> str:
+    match = QUOTED_SEARCH.search(resource.get('suggestion', ''))
+    query = match.group(1) if match else resource.get('suggestion', '')
+    site = RESOURCE_SITES.get(str(resource.get('type', '')).lower())
+    return f"{query} {site}" if site else query
+
+
+def attach_resource_links(plan: dict) -> dict:
+    """
+    Looks up the plan's suggested external resources on the web, all at once, and
+    adds the top result's link and title to each. Resources whose search fails or
+    finds nothing keep just their suggestion.
+    """
+    resources = [
+        resource for step in plan.get('learning_path', [])
+        for resource in step.get('external_resources', []) or []
+        if resource.get('suggestion')
+    ]
+    if not resources:
+        return plan
+    queries = [_resource_query(resource) for resource in resources]
+    outcomes = search_service.search_many_sync(queries, num_results=1)
+    found = 0
+    for resource, query in zip(resources, queries):
+        outcome = outcomes.get(query)
+        if isinstance(outcome, Exception):
+            logger.warning(f"Could not find a link for '{query}': {outcome}")
+        elif outcome and outcome[0].get('link'):
+            resource['link'], resource['title'] = outcome[0]['link'], outcome[0].get('title')
+            found += 1
+    logger.info(f"Found links for {found} of {len(resources)} external resources ({len(set(queries))} searches).")
+    return plan
+
+
+def generate_plan(file_hashes: dict, repo_path: str, lexical_index=None, progress=None) -> dict:
+    """
+    Generates the onboarding plan. Small repos get a single LLM call over the file
+    structure; larger ones are summarized module by module first (map) and the
+    summaries combined into the plan (reduce).
+    """
+    paths = sorted(file_hashes)
+    repo_structure = summarize_file_tree(paths, settings.PLAN_STRUCTURE_TOKEN_BUDGET)
+    modules = split_modules(paths, settings.PLAN_MAX_MODULES)
+    if len(paths) <= settings.PLAN_MAP_MIN_FILES or len(modules) < 2:
+        plan = llm_service.generate_onboarding_plan(repo_structure)
+    else:
+        module_summaries = summarize_modules(modules, file_hashes, repo_path, lexical_index, progress)
+        plan = llm_service.generate_onboarding_plan(repo_structure, module_summaries)
+
+    if settings.PLAN_RESOURCE_LINKS and search_service.enabled:
+        plan = attach_resource_links(plan)
+    return plan
@@ -0,0 +1,227 @@
+from collections import Counter
+import math
+import os
+import re
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Gemini's tokenizer isn't available offline; code averages a little under 4 characters
+# per token, and a word/punctuation count catches symbol-dense text that runs higher
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+CHARS_PER_TOKEN = 4
+
+# Longest chunk overlap looked for when merging neighbouring chunks (the splitter uses 200)
+MAX_CHUNK_OVERLAP = 400
+
+# Don't bother squeezing in a truncated passage smaller than this
+MIN_PASSAGE_TOKENS = 100
+
+# Appended to a passage cut to fit the budget
+TRUNCATION_MARKER = "\n..."
+
+# Files listed per directory before the rest are summarized by extension
+MAX_FILES_PER_DIRECTORY = 15
+
+
+def count_tokens(text: str) -> int:
+    """ Estimates how many tokens Gemini will count for `text`, erring high. """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / CHARS_PER_TOKEN), math.ceil(len(_TOKEN_PIECES.findall(text)) * 0.75))
+
+
+def _overlap_length(left: str, right: str) -> int:
+    """ Length of the longest suffix of `left` that is also a prefix of `right`. """
+    for length in range(min(len(left), len(right), MAX_CHUNK_OVERLAP), 0, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+class PackedContext:
+    """
+    Context selected for a prompt: `documents`/`metadatas` are the passages to put in
+    the prompt (neighbouring chunks merged), `sources` the (chunk, metadata) pairs they
+    were built from, for provenance, and `tokens` their estimated size.
+    """
+    def __init__(self, documents: list, metadatas: list, sources: list, tokens: int, dropped: int):
+        self.documents = documents
+        self.metadatas = metadatas
+        self.sources = sources
+        self.tokens = tokens
+        self.dropped = dropped
+
+
+def _position(chunk: tuple) -> tuple:
+    """ Sort key placing a file's chunks in file order (by line, else chunk index). """
+    rank, _, metadata = chunk
+    for key in ('start_line', 'chunk_index'):
+        if metadata.get(key) is not None:
+            return (0, metadata[key])
+    return (1, rank)
+
+
+def _continues(passage: dict, metadata: dict) -> bool:
+    """ Whether a chunk picks up where a passage of the same file ends. """
+    start_line = metadata.get('start_line')
+    if start_line is not None and passage['end_line'] is not None and start_line <= passage['end_line'] + 1:
+        return True
+    # Only blank lines (dropped by the chunker) can separate consecutive chunks
+    index = metadata.get('chunk_index')
+    return index is not None and passage['last_index'] is not None and index == passage['last_index'] + 1
+
+
+def merge_chunks(documents: list, metadatas: list) -> list:
+    """
+    Merges chunks of the same file that are adjacent (touching or overlapping line
+    ranges, or consecutive chunk indexes) into one passage, removing the text they
+    share. Takes chunks in relevance order and returns
+    passages in the order of their most relevant chunk, as (text, metadata, sources).
+    """
+    by_file = {}
+    for rank, (document, metadata) in enumerate(zip(documents, metadatas)):
+        by_file.setdefault(metadata.get('file_path'), []).append((rank, document, metadata))
+
+    passages = []
+    for file_path, chunks in by_file.items():
+        chunks.sort(key=_position)
+        current = None
+        for rank, document, metadata in chunks:
+            start_line, end_line = metadata.get('start_line'), metadata.get('end_line')
+            if current is not None and _continues(current, metadata):
+                if end_line is not None and current['end_line'] is not None and end_line <= current['end_line']:
+                    pass # Already covered by the passage
+                elif start_line is not None and current['end_line'] is not None and start_line > current['end_line']:
+                    # Chunks cut on line boundaries share no text; restore the blank lines between them
+                    current['text'] += "\n" * (start_line - current['end_line']) + document
+                else:
+                    overlap = _overlap_length(current['text'], document)
+                    # Without shared text the splitter cut at (and stripped) a line break
+                    current['text'] += document[overlap:] if overlap else "\n" + document
+                if end_line is not None and current['end_line'] is not None:
+                    current['end_line'] = max(current['end_line'], end_line)
+                current['last_index'] = metadata.get('chunk_index')
+                current['rank'] = min(current['rank'], rank)
+                current['sources'].append((document, metadata))
+                continue
+            current = {
+                'text': document, 'file_path': file_path, 'rank': rank,
+                'start_line': start_line, 'end_line': end_line if start_line is not None else None,
+                'last_index': metadata.get('chunk_index'), 'sources': [(document, metadata)],
+            }
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage['rank'])
+    results = []
+    for passage in passages:
+        metadata = {'file_path': passage['file_path']}
+        if passage['start_line'] is not None:
+            metadata['start_line'], metadata['end_line'] = passage['start_line'], passage['end_line']
+        results.append((passage['text'], metadata, passage['sources']))
+    return results
+
+
+def pack_context(documents: list, metadatas: list, token_budget: int) -> PackedContext:
+    """
+    Selects retrieved chunks (given best first) for a prompt: neighbouring chunks of a
+    file are merged, then passages are added by relevance until `token_budget` is
+    spent. A passage that doesn't fit is cut to the remaining budget if enough is left.
+    """
+    packed_documents, packed_metadatas, sources = [], [], []
+    used, dropped = 0, 0
+    for text, metadata, passage_sources in merge_chunks(documents, metadatas):
+        tokens = count_tokens(text)
+        remaining = token_budget - used
+        if tokens > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                dropped += len(passage_sources)
+                continue
+            # Keep the head of the passage; it is where the match usually starts
+            text = text[:remaining * CHARS_PER_TOKEN]
+            # The marker counts against the budget too
+            while count_tokens(text + TRUNCATION_MARKER) > remaining:
+                text = text[:int(len(text) * 0.9)]
+            if metadata.get('start_line') is not None:
+                metadata = {**metadata, 'end_line': metadata['start_line'] + text.count("\n")}
+            text += TRUNCATION_MARKER
+            tokens = count_tokens(text)
+        packed_documents.append(text)
+        packed_metadatas.append(metadata)
+        sources.extend(passage_sources)
+        used += tokens
+    return PackedContext(packed_documents, packed_metadatas, sources, used, dropped)
+
+
+def _describe_files(paths: list) -> str:
+    """ E.g. "12 .py, 3 .md, 1 Dockerfile". """
+    extensions = Counter(os.path.splitext(path)[1] or os.path.basename(path) for path in paths)
+    breakdown = ', '.join(f"{count} {extension}" for extension, count in extensions.most_common(4))
+    if len(extensions) > 4:
+        breakdown += ', ...'
+    return breakdown
+
+
+def _build_tree(paths: list) -> dict:
+    tree = {'dirs': {}, 'files': []}
+    for path in sorted(paths):
+        node = tree
+        *directories, name = path.split('/')
+        for directory in directories:
+            node = node['dirs'].setdefault(directory, {'dirs': {}, 'files': []})
+        node['files'].append(name)
+    return tree
+
+
+def _all_files(node: dict, prefix: str = '') -> list:
+    files = [prefix + name for name in node['files']]
+    for name, child in node['dirs'].items():
+        files.extend(_all_files(child, f"{prefix}{name}/"))
+    return files
+
+
+def _render_tree(node: dict, max_depth: int, depth: int = 0) -> list:
+    indent = ' ' * 4 * depth
+    lines = []
+    for name, child in sorted(node['dirs'].items()):
+        if depth >= max_depth:
+            files = _all_files(child)
+            lines.append(f"{indent}{name}/ ({len(files)} files: {_describe_files(files)})")
+        else:
+            lines.append(f"{indent}{name}/")
+            lines.extend(_render_tree(child, max_depth, depth + 1))
+    files = node['files']
+    lines.extend(f"{indent}{name}" for name in files[:MAX_FILES_PER_DIRECTORY])
+    if len(files) > MAX_FILES_PER_DIRECTORY:
+        rest = files[MAX_FILES_PER_DIRECTORY:]
+        lines.append(f"{indent}... {len(rest)} more files ({_describe_files(rest)})")
+    return lines
+
+
+def _tree_depth(node: dict) -> int:
+    return 1 + max((_tree_depth(child) for child in node['dirs'].values()), default=0)
+
+
+def summarize_file_tree(paths: list, token_budget: int) -> str:
+    """
+    Renders repository paths (posix, relative) as an indented tree that fits
+    `token_budget`. Rather than cutting the listing off, directories below the
+    deepest level that fits are collapsed into a summary of their file counts and
+    types, and long file lists are summarized by extension.
+    """
+    tree = _build_tree(paths)
+    for max_depth in range(_tree_depth(tree), -1, -1):
+        rendered = "\n".join(_render_tree(tree, max_depth))
+        if count_tokens(rendered) <= token_budget:
+            return rendered
+    # Even the top level alone is over budget: keep what fits
+    lines, used = [], 0
+    for line in _render_tree(tree, 0):
+        used += count_tokens(line) + 1
+        if used > token_budget:
+            lines.append("...")
+            break
+        lines.append(line)
+    return "\n".join(lines)
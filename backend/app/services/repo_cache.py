@@ -0,0 +1,187 @@
+import os
+import git
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Touched whenever a mirror is used; its mtime drives LRU eviction
+LAST_USED_MARKER = "ccoa-last-used"
+
+
+def sparse_patterns(extensions) -> list:
+    """ Turns SUPPORTED_EXTENSIONS-style entries into non-cone sparse-checkout patterns. """
+    return sorted(f"*{ext}" if ext.startswith('.') else ext for ext in extensions)
+
+
+def _clone_options(depth: int, clone_filter: str) -> list:
+    options = []
+    if depth:
+        options.append(f"--depth={depth}")
+    if clone_filter:
+        options.append(f"--filter={clone_filter}")
+    return options
+
+
+def _checkout(worktree: git.Repo, patterns: list):
+    # The worktree starts with an empty index; restrict it before populating so a
+    # blobless clone only downloads the blobs we are going to read.
+    if patterns:
+        worktree.git.sparse_checkout('set', '--no-cone', *patterns)
+    worktree.git.read_tree('-mu', 'HEAD')
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class RepoCache:
+    """
+    Keeps a persistent, shallow, blobless bare mirror per repository URL. Each
+    checkout is a throwaway worktree of its mirror, so repeat onboards only fetch
+    the commits that changed. Mirrors are evicted least-recently-used once their
+    total size exceeds `max_bytes`; `max_bytes=0` disables the cache and falls
+    back to one-off shallow clones.
+    """
+    def __init__(self, root_dir: str, max_bytes: int, depth: int = 1, clone_filter: str = "blob:none", sparse_extensions=None):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.depth = depth
+        self.clone_filter = clone_filter
+        self.patterns = sparse_patterns(sparse_extensions) if sparse_extensions else []
+        self._lock = threading.Lock()
+        self._mirror_locks = {}
+        # Mirror dir -> number of live worktrees, and worktree path -> mirror dir
+        self._in_use = {}
+        self._worktrees = {}
+        if self.max_bytes:
+            os.makedirs(self.root_dir, exist_ok=True)
+
+    def _mirror_dir(self, repo_url: str) -> str:
+        digest = hashlib.sha256(repo_url.encode('utf-8')).hexdigest()[:16]
+        name = repo_url.rstrip('/').split('/')[-1].removesuffix('.git') or "repo"
+        return os.path.join(self.root_dir, f"{name}-{digest}.git")
+
+    def _mirror_lock(self, mirror_dir: str) -> threading.Lock:
+        with self._lock:
+            return self._mirror_locks.setdefault(mirror_dir, threading.Lock())
+
+    def checkout(self, repo_url: str) -> str:
+        """ Returns the path of a fresh checkout of the repository's default branch HEAD. """
+        if not self.max_bytes:
+            return self._clone_uncached(repo_url)
+
+        mirror_dir = self._mirror_dir(repo_url)
+        with self._mirror_lock(mirror_dir):
+            mirror = self._sync_mirror(repo_url, mirror_dir)
+            checkout_dir = tempfile.mkdtemp(prefix="ccoa-")
+            mirror.worktree('add', '--detach', '--no-checkout', checkout_dir, 'HEAD')
+            with self._lock:
+                self._in_use[mirror_dir] = self._in_use.get(mirror_dir, 0) + 1
+                self._worktrees[checkout_dir] = mirror_dir
+
+        try:
+            _checkout(git.Repo(checkout_dir), self.patterns)
+        except Exception:
+            self.release(checkout_dir)
+            raise
+        return checkout_dir
+
+    def release(self, checkout_dir: str):
+        """ Removes a checkout returned by `checkout` and applies the cache size limit. """
+        with self._lock:
+            mirror_dir = self._worktrees.pop(checkout_dir, None)
+
+        if mirror_dir is None:
+            shutil.rmtree(checkout_dir, ignore_errors=True)
+            return
+
+        with self._mirror_lock(mirror_dir):
+            try:
+                git.Git(mirror_dir).worktree('remove', '--force', checkout_dir)
+            except git.GitCommandError as e:
+                logger.warning(f"Could not remove worktree {checkout_dir}: {e}")
+                shutil.rmtree(checkout_dir, ignore_errors=True)
+                git.Git(mirror_dir).worktree('prune')
+            with self._lock:
+                self._in_use[mirror_dir] -= 1
+        self.evict()
+
+    def evict(self):
+        """ Deletes least-recently-used idle mirrors until the cache fits in `max_bytes`. """
+        if not self.max_bytes or not os.path.isdir(self.root_dir):
+            return
+        mirrors = []
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if os.path.isdir(path):
+                marker = os.path.join(path, LAST_USED_MARKER)
+                last_used = os.path.getmtime(marker) if os.path.exists(marker) else 0
+                mirrors.append((last_used, path, _dir_size(path)))
+
+        total = sum(size for _, _, size in mirrors)
+        for _, path, size in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            with self._mirror_lock(path):
+                with self._lock:
+                    if self._in_use.get(path):
+                        continue
+                shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.info(f"Evicted cached mirror {path} ({size} bytes).")
+
+    def _sync_mirror(self, repo_url: str, mirror_dir: str) -> git.Git:
+        # Caller holds the mirror lock. Commands run through git.Git rather than
+        # git.Repo: once a worktree enables sparse checkout, core.bare moves to
+        # config.worktree, which GitPython's bare-repo detection doesn't read.
+        if os.path.isdir(mirror_dir):
+            try:
+                mirror = git.Git(mirror_dir)
+                branch = mirror.symbolic_ref('HEAD')
+                logger.info(f"Fetching {repo_url} into cached mirror {mirror_dir}")
+                mirror.fetch(*_clone_options(self.depth, self.clone_filter), 'origin', f"+HEAD:{branch}")
+                self._touch(mirror_dir)
+                return mirror
+            except git.GitCommandError as e:
+                with self._lock:
+                    in_use = self._in_use.get(mirror_dir)
+                if in_use:
+                    raise
+                logger.warning(f"Cached mirror {mirror_dir} is unusable, recloning: {e}")
+                shutil.rmtree(mirror_dir, ignore_errors=True)
+
+        logger.info(f"Cloning {repo_url} into cached mirror {mirror_dir}")
+        options = ['--bare', '--single-branch'] + _clone_options(self.depth, self.clone_filter)
+        git.Repo.clone_from(repo_url, mirror_dir, multi_options=options)
+        self._touch(mirror_dir)
+        return git.Git(mirror_dir)
+
+    def _touch(self, mirror_dir: str):
+        with open(os.path.join(mirror_dir, LAST_USED_MARKER), 'w') as f:
+            f.write(str(time.time()))
+
+    def _clone_uncached(self, repo_url: str) -> str:
+        temp_dir = tempfile.mkdtemp(prefix="ccoa-")
+        logger.info(f"Cloning {repo_url} into {temp_dir}")
+        options = ['--single-branch', '--no-checkout'] + _clone_options(self.depth, self.clone_filter)
+        try:
+            repo = git.Repo.clone_from(repo_url, temp_dir, multi_options=options)
+            _checkout(repo, self.patterns)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return temp_dir
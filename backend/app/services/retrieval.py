@@ -0,0 +1,136 @@
+from app.services.lexical_index import LexicalIndex, tokenize, identifier_parts
+import re
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Reciprocal rank fusion constant from Cormack et al.; damps the head of each list
+RRF_K = 60
+
+# Queries that are a single code-like token: snake_case, camelCase, CONSTANT_CASE, dotted or path-like
+IDENTIFIER_QUERY = re.compile(r"^[`'\"]?[\w./-]*(?:_|\.|/|[a-z][A-Z])[\w./-]*[`'\"]?$|^[`'\"]?[A-Z0-9_]{3,}[`'\"]?$")
+
+# How much query-term coverage can reorder the fused list when reranking
+RERANK_WEIGHT = 0.5
+
+
+def is_identifier_query(query: str) -> bool:
+    """ True for queries like `get_or_create_collection`, `EMBED_BATCH_SIZE` or `app/main.py`. """
+    return bool(IDENTIFIER_QUERY.match(query.strip()))
+
+
+def chunk_key(document) -> str:
+    """ Stable identity of a chunk across result lists; not every store returns IDs. """
+    if getattr(document, 'id', None):
+        return document.id
+    return f"{document.metadata.get('file_path')}_{document.metadata.get('chunk_index')}"
+
+
+def reciprocal_rank_fusion(result_lists: list, rrf_k: int = RRF_K) -> list:
+    """
+    Fuses ranked [(Document, score)] lists into one by summing 1 / (rrf_k + rank).
+    Only ranks are used, so BM25 scores and cosine similarities need no calibration.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, (document, _) in enumerate(results, start=1):
+            key = chunk_key(document)
+            entry = fused.setdefault(key, [document, 0.0])
+            entry[1] += 1.0 / (rrf_k + rank)
+    return sorted(((document, score) for document, score in fused.values()), key=lambda item: -item[1])
+
+
+def _covers(outer: dict, inner: dict) -> bool:
+    """ Whether chunk metadata `outer`'s line range contains `inner`'s. """
+    if None in (outer.get('start_line'), outer.get('end_line'), inner.get('start_line'), inner.get('end_line')):
+        return False
+    return outer['start_line'] <= inner['start_line'] and inner['end_line'] <= outer['end_line']
+
+
+def dedup_chunks(results: list, max_per_file: int) -> list:
+    """
+    Drops chunks that repeat a better-ranked one: identical text (vendored copies,
+    duplicated files), lines of a file already covered by a kept chunk, and anything
+    past `max_per_file` chunks of one file, so the context covers more files.
+    Neighbouring chunks of a file only touch (or overlap at their boundary); they are
+    kept and merged into one passage when the prompt is built.
+    """
+    kept, seen_texts, kept_by_file = [], set(), {}
+    for document, score in results:
+        text_key = document.page_content.strip()
+        if text_key in seen_texts:
+            continue
+        file_path = document.metadata.get('file_path')
+        same_file = kept_by_file.setdefault(file_path, [])
+        if any(_covers(metadata, document.metadata) for metadata in same_file):
+            continue
+        if len(same_file) >= max_per_file:
+            continue
+        seen_texts.add(text_key)
+        same_file.append(document.metadata)
+        kept.append((document, score))
+    return kept
+
+
+def rerank(query: str, results: list) -> list:
+    """
+    Cheap second stage over the fused candidates: boosts chunks that contain more
+    of the query's words (in the text or file path) and the query verbatim. No model
+    call, so it costs microseconds per candidate.
+    """
+    words = set(tokenize(query)) | set(identifier_parts(query))
+    if not words or not results:
+        return results
+    phrase = query.strip().strip('`\'"').lower()
+    top_score = results[0][1] or 1.0
+
+    rescored = []
+    for document, score in results:
+        # Substring tests also match identifier sub-words, and are much cheaper than tokenizing
+        haystack = f"{document.metadata.get('file_path', '')}\n{document.page_content}".lower()
+        coverage = sum(word in haystack for word in words) / len(words)
+        if phrase and phrase in haystack:
+            coverage += 1.0
+        rescored.append((document, score / top_score + RERANK_WEIGHT * coverage))
+    return sorted(rescored, key=lambda item: -item[1])
+
+
+class HybridRetriever:
+    """
+    Combines BM25 keyword search with vector similarity search: each returns
+    `candidates` chunks, the lists are fused by reciprocal rank, deduplicated and
+    optionally reranked. Single-identifier queries that the keyword index already
+    answers skip the embedding call entirely.
+    """
+    def __init__(self, candidates: int = 20, max_chunks_per_file: int = 2, use_rerank: bool = True, lexical_fast_path: bool = True):
+        self.candidates = candidates
+        self.max_chunks_per_file = max_chunks_per_file
+        self.use_rerank = use_rerank
+        self.lexical_fast_path = lexical_fast_path
+
+    def search(self, query: str, k: int, vector_search, lexical_index: LexicalIndex = None) -> list:
+        """
+        Returns up to k (Document, score) pairs. `vector_search(query, n)` returns
+        [(Document, score)], e.g. a vector store's `similarity_search_with_score`.
+        """
+        started = time.perf_counter()
+        candidates = max(self.candidates, k)
+        lexical = lexical_index.search(query, candidates) if lexical_index is not None else []
+
+        if self.lexical_fast_path and len(lexical) >= k and is_identifier_query(query):
+            result_lists = [lexical]
+            source = "lexical"
+        else:
+            vector = vector_search(query, candidates)
+            result_lists = [vector, lexical] if lexical else [vector]
+            source = "hybrid" if lexical else "vector"
+
+        results = reciprocal_rank_fusion(result_lists)
+        if self.use_rerank:
+            results = rerank(query, results)
+        results = dedup_chunks(results, self.max_chunks_per_file)[:k]
+        logger.info(f"Retrieved {len(results)} chunks ({source}) in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        return results
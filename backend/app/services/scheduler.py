@@ -0,0 +1,186 @@
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.core.config import settings
+from app.services import telemetry
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Who work is done for when no onboarding job set it, e.g. a direct pipeline call
+DEFAULT_TENANT = "default"
+
+# Waits shorter than this are not recorded as queueing
+MIN_RECORDED_WAIT_SECONDS = 0.001
+
+# (tenant, flow) the current onboarding work belongs to; a flow is one job
+_current_flow = ContextVar("onboarding_flow", default=(DEFAULT_TENANT, DEFAULT_TENANT))
+
+
+def tenant_for(repo_url: str) -> str:
+    """ The default tenant of a repository: its host and owner, e.g. "github.com/tiangolo". """
+    parts = [part for part in repo_url.split("://", 1)[-1].rstrip('/').split('/') if part]
+    return '/'.join(parts[:2]) if len(parts) > 2 else (parts[0] if parts else DEFAULT_TENANT)
+
+
+class FairQueue:
+    """
+    Items queued per tenant and, within a tenant, per flow (e.g. one onboarding
+    job). `pop` serves the tenant that has been served least (start-time fair
+    queuing: a tenant that starts queueing joins at the current virtual time, so
+    it goes next but gets no credit for having been idle), then round-robin over
+    that tenant's flows, FIFO within a flow. So a tenant with a hundred repos, or
+    a repo with a thousand batches, gets the same turns as one with a single item.
+    Not thread-safe; callers hold their own lock.
+    """
+    def __init__(self):
+        self._tenants = OrderedDict()
+        self._served = {}
+        self._clock = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, tenant: str, flow: str, item):
+        if tenant not in self._tenants:
+            self._served[tenant] = self._clock
+        flows = self._tenants.setdefault(tenant, OrderedDict())
+        flows.setdefault(flow, deque()).append(item)
+        self._size += 1
+
+    def pop(self):
+        """ Removes and returns the next item in turn; raises IndexError if empty. """
+        if not self._size:
+            raise IndexError("pop from an empty FairQueue")
+        # Ties go to the tenant that has waited longest, by queue order
+        tenant = min(self._tenants, key=lambda name: self._served[name])
+        flows = self._tenants[tenant]
+        flow, items = next(iter(flows.items()))
+        item = items.popleft()
+        self._size -= 1
+        self._clock = self._served[tenant]
+        self._served[tenant] += 1
+        # The tenant and the flow that were just served go to the back of the line
+        if items:
+            flows.move_to_end(flow)
+        else:
+            del flows[flow]
+        if flows:
+            self._tenants.move_to_end(tenant)
+        else:
+            # It rejoins at the virtual time of its next push
+            del self._tenants[tenant]
+            del self._served[tenant]
+        return item
+
+    def depths(self) -> dict:
+        """ Queued items per tenant. """
+        return {tenant: sum(len(items) for items in flows.values()) for tenant, flows in self._tenants.items()}
+
+
+class StageLane:
+    """
+    A fixed number of slots for one pipeline stage, shared by every onboarding
+    job in the worker. When all slots are taken, waiters queue in a FairQueue and
+    a released slot is handed directly to the next one in turn.
+    """
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(slots, 1)
+        self.in_use = 0
+        self.granted = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self._waiters = FairQueue()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Blocks until a slot is free for the current flow. Pair with `release`. """
+        tenant, flow = _current_flow.get()
+        with self._lock:
+            self.granted += 1
+            if self.in_use < self.slots and not len(self._waiters):
+                self.in_use += 1
+                return
+            self.queued += 1
+            ticket = threading.Event()
+            self._waiters.push(tenant, flow, ticket)
+        started = time.perf_counter()
+        # `release` hands its slot over by setting the ticket; in_use stays the same
+        ticket.wait()
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.wait_seconds += waited
+        if waited >= MIN_RECORDED_WAIT_SECONDS:
+            telemetry.record_span(f"queue_{self.name}", waited)
+
+    def release(self):
+        with self._lock:
+            if len(self._waiters):
+                self._waiters.pop().set()
+            else:
+                self.in_use -= 1
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'in_use': self.in_use,
+                'waiting': self._waiters.depths(),
+                'granted': self.granted,
+                'queued': self.queued,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+
+class StageScheduler:
+    """
+    Stage-specific slot pools for onboarding, so concurrent jobs share capacity by
+    the kind of work rather than by request: network-bound clones, CPU-bound
+    splitting (sized to the split process pool), rate-limited embedding (sized to
+    the embedding quota) and LLM-bound planning. Slots are granted fairly across
+    tenants, then across each tenant's jobs; see `flow`.
+    """
+    def __init__(self, slots: dict):
+        self._lanes = {name: StageLane(name, count) for name, count in slots.items()}
+
+    @contextmanager
+    def flow(self, tenant: str, flow: str):
+        """ Runs the enclosed work (and copies of its context) as `flow` of `tenant`. """
+        token = _current_flow.set((tenant or DEFAULT_TENANT, flow))
+        try:
+            yield
+        finally:
+            _current_flow.reset(token)
+
+    def lane(self, stage: str) -> StageLane:
+        return self._lanes[stage]
+
+    def slot(self, stage: str):
+        """ Context manager holding one slot of `stage` for the current flow. """
+        return self._lanes[stage].slot()
+
+    def stats(self) -> dict:
+        return {name: lane.stats() for name, lane in self._lanes.items()}
+
+
+stage_scheduler = StageScheduler({
+    "clone": settings.CLONE_CONCURRENCY,
+    # One group splitting and one queued per split process keeps the pool busy
+    "split": settings.INGEST_WORKERS * 2 if settings.INGEST_WORKERS > 1 else 1,
+    "embed": settings.EMBED_CONCURRENCY,
+    "plan": settings.PLAN_CONCURRENCY,
+})
@@ -0,0 +1,395 @@
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from app.core.config import settings
+import itertools
+import json
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets: stages run from
+# milliseconds (a vector query) to minutes (cloning and embedding a large repo)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Request header that asks for the request's spans in the response
+DEBUG_REQUEST_HEADER = b"x-debug-trace"
+
+# A trace keeps at most this many spans (a large ingest records one per batch), and
+# the X-Trace header lists at most MAX_HEADER_SPANS, to stay within proxy header limits
+MAX_TRACE_SPANS = 1000
+MAX_HEADER_SPANS = 60
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """ A monotonically increasing count per label set. """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """ Observations bucketed by upper bound, with their sum and count, per label set. """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> list:
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        samples = []
+        for key, (counts, total, count) in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    The metrics of this worker process, rendered in the Prometheus text format.
+    Each gunicorn worker keeps its own, so scrape workers individually (or run one
+    worker per container) for complete counts.
+    """
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "ccoa_stage_duration_seconds", "Time spent in each traced pipeline stage.", ("stage",)
+)
+REQUEST_SECONDS = registry.histogram(
+    "ccoa_http_request_duration_seconds", "HTTP request latency up to the end of the response body.", ("method", "route", "status")
+)
+CHUNKS = registry.counter(
+    "ccoa_chunks_total", "Chunks split from files, embedded and written, or deleted as stale.", ("operation",)
+)
+BYTES_READ = registry.counter(
+    "ccoa_file_bytes_read_total", "Bytes of repository files read for splitting."
+)
+LLM_TOKENS = registry.counter(
+    "ccoa_llm_tokens_total", "Gemini tokens billed, by call kind and direction.", ("kind", "direction")
+)
+JOBS = registry.counter(
+    "ccoa_onboarding_jobs_total", "Finished onboarding jobs, by outcome.", ("status",)
+)
+
+
+class SpanRecord:
+    """ One finished (or running) span: offsets and duration are relative to its trace. """
+    __slots__ = ('span_id', 'parent_id', 'name', 'start', 'duration', 'attributes')
+
+    def __init__(self, span_id: int, parent_id: int, name: str, start: float, attributes: dict):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """ Adds attributes known only once the work is done, e.g. token counts. """
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        entry = {
+            'id': self.span_id,
+            'name': self.name,
+            'start_ms': round(self.start * 1000, 1),
+            'ms': round(self.duration * 1000, 1) if self.duration is not None else None,
+        }
+        if self.parent_id is not None:
+            entry['parent'] = self.parent_id
+        if self.attributes:
+            entry['attributes'] = self.attributes
+        return entry
+
+
+class Trace:
+    """
+    The spans recorded while handling one request or running one onboarding job.
+    Per-name totals cover every span; only the first MAX_TRACE_SPANS are kept.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._totals = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def open(self, name: str, parent_id: int, attributes: dict, started: float) -> SpanRecord:
+        with self._lock:
+            record = SpanRecord(next(self._ids), parent_id, name, started - self.started, attributes)
+            if len(self.spans) < MAX_TRACE_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped += 1
+        return record
+
+    def finish(self, record: SpanRecord, seconds: float):
+        with self._lock:
+            record.duration = seconds
+            self._totals[record.name] = self._totals.get(record.name, 0.0) + seconds
+
+    def totals(self) -> dict:
+        """ Seconds per span name, summed over repeats (e.g. every embedded batch). """
+        with self._lock:
+            return {name: round(seconds, 4) for name, seconds in self._totals.items()}
+
+    def server_timing(self) -> str:
+        """ A Server-Timing header value, which browsers show in their network panel. """
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals().items())
+
+    def to_list(self, limit: int = MAX_TRACE_SPANS) -> list:
+        with self._lock:
+            return [record.to_dict() for record in self.spans[:limit]]
+
+    def to_header(self) -> str:
+        return json.dumps(self.to_list(MAX_HEADER_SPANS), separators=(',', ':'))
+
+
+# The trace being recorded in this context (a request or a job), and the open span
+# that new spans nest under. Threads started with a copy of the context (FastAPI's
+# threadpool, the embedding writer, the plan map pool) record into the same trace.
+_current_trace: ContextVar = ContextVar('trace', default=None)
+_current_span: ContextVar = ContextVar('span', default=None)
+
+
+class _OpenTelemetry:
+    """
+    Mirrors spans to an OTLP collector when OTEL_EXPORTER_OTLP_ENDPOINT is set and
+    the SDK is installed. Set up on the first span, so processes that never trace
+    (e.g. split workers) don't start an exporter.
+    """
+    def __init__(self, endpoint: str, service_name: str):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._tracer = None
+        self._initialized = not endpoint
+        self._lock = threading.Lock()
+
+    @property
+    def tracer(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._tracer = self._create_tracer()
+                    self._initialized = True
+        return self._tracer
+
+    def _create_tracer(self):
+        try:
+            from opentelemetry import trace
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning(
+                "OTEL_EXPORTER_OTLP_ENDPOINT is set but the OpenTelemetry SDK is not installed "
+                "(pip install opentelemetry-sdk opentelemetry-exporter-otlp); spans are not exported."
+            )
+            return None
+        provider = TracerProvider(resource=Resource.create({"service.name": self.service_name}))
+        # The exporter reads the endpoint and headers from the standard OTEL_* variables
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+        logger.info(f"Exporting traces to {self.endpoint}.")
+        return trace.get_tracer("ccoa")
+
+
+_otel = _OpenTelemetry(settings.OTEL_EXPORTER_OTLP_ENDPOINT, settings.OTEL_SERVICE_NAME)
+
+
+def _otel_attributes(attributes: dict) -> dict:
+    return {key: value for key, value in attributes.items() if isinstance(value, (str, bool, int, float))}
+
+
+@contextmanager
+def trace():
+    """ Records the spans of everything run in this context (and copies of it) into a new Trace. """
+    current = Trace()
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(None)
+    try:
+        yield current
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times a stage: observed in the `ccoa_stage_duration_seconds` histogram, added to
+    the current trace (if any), and exported to OpenTelemetry (if configured).
+    Yields the span, whose `set` adds attributes.
+    """
+    current = _current_trace.get()
+    parent = _current_span.get()
+    started = time.perf_counter()
+    record = current.open(name, parent.span_id if parent else None, attributes, started) if current else SpanRecord(0, None, name, 0.0, attributes)
+    token = _current_span.set(record)
+    tracer = _otel.tracer
+    with tracer.start_as_current_span(name) if tracer else nullcontext() as exported:
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - started
+            if current:
+                current.finish(record, seconds)
+            else:
+                record.duration = seconds
+            STAGE_SECONDS.observe(seconds, stage=name)
+            _current_span.reset(token)
+            if exported is not None:
+                exported.set_attributes(_otel_attributes(record.attributes))
+
+
+def record_span(name: str, seconds: float, **attributes):
+    """ Records a span for work timed elsewhere, e.g. in a worker process, as ending now. """
+    current = _current_trace.get()
+    parent = _current_span.get()
+    ended = time.perf_counter()
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if current:
+        current.finish(current.open(name, parent.span_id if parent else None, attributes, ended - seconds), seconds)
+    tracer = _otel.tracer
+    if tracer:
+        end_ns = time.time_ns()
+        exported = tracer.start_span(name, start_time=end_ns - int(seconds * 1e9), attributes=_otel_attributes(attributes))
+        exported.end(end_time=end_ns)
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware that traces each HTTP request and observes its latency. When
+    TRACE_DEBUG_HEADER is on and the request sends `X-Debug-Trace: 1`, the spans
+    recorded before the response started are returned in `Server-Timing` and (as
+    JSON, with nesting and attributes) `X-Trace` headers.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        debug = settings.TRACE_DEBUG_HEADER and any(
+            name == DEBUG_REQUEST_HEADER and value not in (b"", b"0", b"false") for name, value in scope['headers']
+        )
+        status = {'code': 500}
+
+        with trace() as current:
+            async def send_with_trace(message):
+                if message['type'] == 'http.response.start':
+                    status['code'] = message['status']
+                    if debug:
+                        # Span names and JSON (ASCII-escaped) are safe header values
+                        message['headers'] = list(message.get('headers', [])) + [
+                            (b"server-timing", current.server_timing().encode('latin-1')),
+                            (b"x-trace", current.to_header().encode('latin-1')),
+                        ]
+                await send(message)
+
+            tracer = _otel.tracer
+            try:
+                with tracer.start_as_current_span(f"{scope['method']} {scope['path']}") if tracer else nullcontext():
+                    await self.app(scope, receive, send_with_trace)
+            finally:
+                route = scope.get('route')
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - current.started,
+                    method=scope['method'],
+                    route=getattr(route, 'path', "unmatched"),
+                    status=status['code'],
+                )
+
+
+def current_trace() -> Trace:
+    """ The trace being recorded in this context, or None. """
+    return _current_trace.get()
+
+
+def debug_requested(headers) -> bool:
+    """ Whether a request asked for trace data (for responses that carry it in the body). """
+    return settings.TRACE_DEBUG_HEADER and headers.get("x-debug-trace", "0") not in ("", "0", "false")
@@ -1,36 +1,137 @@
-from langchain_astradb import AstraDBVectorStore
-from langchain_google_genai import GoogleGenerativeAIEmbeddings  # Fixed: AI not Ai
 from app.core.config import settings
+from app.services.embedding_writer import EmbeddingWriter, BatchCheckpoint, TokenBucket, WriterStats
+from app.services.handle_pool import HandlePool, RecentNames
+from app.services.lexical_index import LexicalIndex
+from app.services.chunk_store import chunk_store
+from app.services.retrieval import HybridRetriever
+from app.services.lazy import Lazy, resolve
+from app.services.scheduler import stage_scheduler
+from app.services import telemetry
+import os
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = "models/embedding-001"
+
+# Vector store backends selectable with VECTOR_STORE_BACKEND
+ASTRA_BACKEND = "astra"
+LOCAL_BACKEND = "local"
+
+# Retrieval modes selectable with RETRIEVAL_MODE
+HYBRID_RETRIEVAL = "hybrid"
+VECTOR_RETRIEVAL = "vector"
+
+def _create_embedding_client():
+    # Imported here: the Google client libraries take about a second to import
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings  # Fixed: AI not Ai
+    return GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL_NAME,
+        google_api_key=settings.GOOGLE_API_KEY
+    )
+
+
+def _create_embedding_cache():
+    # Imported here, like the embedding wrappers: they subclass LangChain's
+    # Embeddings, and langchain_core takes about half a second to import
+    from app.services.embedding_cache import EmbeddingCache
+    return EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_BYTES)
+
+
 class VectorStoreManager:
-    """ Manages interactions with the Astra DB vector store. """
+    """
+    Manages interactions with the vector store: Astra DB, or an in-process
+    local index when VECTOR_STORE_BACKEND=local.
+    """
     def __init__(self):
-        try:
-            # Initialize Gemini embeddings model with correct class name
-            self.embedding_model = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001", 
-                google_api_key=settings.GOOGLE_API_KEY
-            )
-            logger.info("Successfully initialized Google Generative AI Embeddings.")
-        except Exception as e:
-            logger.error(f"Failed to initialize embeddings: {e}")
-            raise
+        # The embedding client and cache are built on first use (or by the startup
+        # warm-up), so importing the app neither pays for them nor fails without a key
+        self.embedding_client = Lazy("Google Generative AI Embeddings", _create_embedding_client)
+        self.embedding_cache = None
+        if settings.EMBEDDING_CACHE_MAX_BYTES:
+            self.embedding_cache = Lazy("embedding cache", _create_embedding_cache)
+        self.embedding_model = Lazy("embedding model", self._create_embedding_model)
+
+        # Shared by every ingest in this worker so concurrent jobs respect one quota
+        self.rate_limiter = TokenBucket(settings.EMBED_CHUNKS_PER_MINUTE / 60)
+
+        self.backend = settings.VECTOR_STORE_BACKEND
+        if self.backend not in (ASTRA_BACKEND, LOCAL_BACKEND):
+            raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{self.backend}'.")
+        # Building a collection handle costs client construction and, for Astra DB,
+        # collection setup round-trips, so handles are pooled and reused across requests.
+        # Reusing a handle also reuses its HTTP keep-alive connections.
+        self._handles = HandlePool(
+            self._create_collection,
+            max_size=settings.COLLECTION_POOL_SIZE,
+            ttl_seconds=settings.COLLECTION_POOL_TTL_SECONDS,
+        )
+        self._recent_collections = RecentNames(
+            os.path.join(settings.DATA_DIR, "recent_collections.json"), settings.COLLECTION_WARMUP_COUNT
+        )
+
+        if settings.RETRIEVAL_MODE not in (HYBRID_RETRIEVAL, VECTOR_RETRIEVAL):
+            raise ValueError(f"Unknown RETRIEVAL_MODE '{settings.RETRIEVAL_MODE}'.")
+        self.hybrid = settings.RETRIEVAL_MODE == HYBRID_RETRIEVAL
+        self._lexical_indexes = HandlePool(
+            lambda name: LexicalIndex(os.path.join(settings.LEXICAL_INDEX_DIR, f"{name}.sqlite"), name, chunk_store),
+            max_size=settings.COLLECTION_POOL_SIZE,
+            ttl_seconds=settings.COLLECTION_POOL_TTL_SECONDS,
+        )
+        self.retriever = HybridRetriever(
+            candidates=settings.RETRIEVAL_CANDIDATES,
+            max_chunks_per_file=settings.RETRIEVAL_MAX_CHUNKS_PER_FILE,
+            use_rerank=settings.RETRIEVAL_RERANK,
+        )
+
+    def _create_embedding_model(self):
+        from app.services.embedding_cache import CachedEmbeddings, TracedEmbeddings
+
+        # Wraps the client and cache proxies without building them
+        embedding_model = TracedEmbeddings(self.embedding_client)
+        if self.embedding_cache is not None:
+            # Both ingestion and queries go through the cache before calling the API
+            embedding_model = CachedEmbeddings(embedding_model, EMBEDDING_MODEL_NAME, self.embedding_cache)
+        return embedding_model
 
     def get_or_create_collection(self, name: str):
         """
-        Gets an AstraDBVectorStore instance for the given collection name.
+        Gets a vector store instance for the given collection name from the handle pool.
         The collection is created automatically if it doesn't exist.
         """
+        vector_store = self._handles.get(name)
+        self._recent_collections.touch(name)
+        return vector_store
+
+    def _create_collection(self, name: str):
+        if self.backend == LOCAL_BACKEND:
+            # Imported here: it loads numpy and LangChain's VectorStore
+            from app.services.local_vector_store import LocalVectorStore
+
+            vector_store = LocalVectorStore(
+                name,
+                resolve(self.embedding_model),
+                settings.LOCAL_VECTOR_STORE_DIR,
+                ivf_min_rows=settings.LOCAL_IVF_MIN_ROWS,
+                nprobe=settings.LOCAL_IVF_NPROBE,
+                chunk_store=chunk_store,
+            )
+            logger.info(f"Local collection '{name}' opened.")
+            return vector_store
         try:
+            # Only needed for the Astra backend, so self-hosted setups don't import it
+            from langchain_astradb import AstraDBVectorStore
+            from langchain_astradb.utils.astradb import SetupMode
+
+            # Collections we have used before already exist; skip the creation round-trips
+            setup_mode = SetupMode.OFF if name in self._recent_collections else SetupMode.SYNC
             vector_store = AstraDBVectorStore(
                 collection_name=name,
-                embedding=self.embedding_model,
+                embedding=resolve(self.embedding_model),
                 api_endpoint=settings.ASTRA_DB_API_ENDPOINT,
                 token=settings.ASTRA_DB_APPLICATION_TOKEN,
+                setup_mode=setup_mode,
             )
             logger.info(f"Astra DB collection '{name}' accessed/created successfully.")
             return vector_store
@@ -38,30 +139,127 @@ class VectorStoreManager:
             logger.error(f"Failed to get or create Astra DB collection '{name}': {e}")
             raise
 
+    def warm_up(self):
+        """ Pre-builds handles for the most recently used collections. Meant for startup. """
+        for name in self._recent_collections.names():
+            try:
+                self._handles.get(name)
+            except Exception as e:
+                logger.warning(f"Could not warm up collection '{name}': {e}")
+        logger.info(f"Warmed up collection handles: {self._handles.stats()}")
+
+    def handle_stats(self) -> dict:
+        """ Hit rate and construction latency of the collection handle pool. """
+        return self._handles.stats()
+
+    def lexical_index_for(self, vector_store):
+        """ Returns the collection's keyword index, or None when retrieval is vector-only. """
+        if not self.hybrid:
+            return None
+        return self._lexical_indexes.get(vector_store.collection_name)
+
+    def _writer(self, vector_store) -> EmbeddingWriter:
+        lexical_index = self.lexical_index_for(vector_store)
+
+        def write_fn(documents, metadatas, ids):
+            # Store texts and index keywords first: both are local and cheap, and upserts,
+            # so a retry of a batch whose embedding call failed just rewrites them
+            with telemetry.span("upsert", chunks=len(documents)):
+                chunk_store.put(vector_store.collection_name, ids, documents, metadatas)
+                if lexical_index is not None:
+                    lexical_index.add(documents, metadatas, ids)
+                # The store's add_texts handles documents, metadatas, and ids (and
+                # embeds the documents, so `embed` spans nest inside this one)
+                vector_store.add_texts(texts=documents, metadatas=metadatas, ids=ids)
+            telemetry.CHUNKS.inc(len(documents), operation="upserted")
+
+        return EmbeddingWriter(
+            write_fn,
+            batch_size=settings.EMBED_BATCH_SIZE,
+            concurrency=settings.EMBED_CONCURRENCY,
+            rate_limiter=self.rate_limiter,
+            max_retries=settings.EMBED_MAX_RETRIES,
+            backoff_seconds=settings.EMBED_BACKOFF_SECONDS,
+            # Concurrent ingests take turns for the worker's embedding slots
+            slot=lambda: stage_scheduler.slot("embed"),
+        )
+
+    def checkpoint_for(self, vector_store) -> BatchCheckpoint:
+        """ Returns the resumable-write checkpoint for a collection. """
+        return BatchCheckpoint(os.path.join(settings.DATA_DIR, "checkpoints", f"{vector_store.collection_name}.txt"))
+
+    def write_document_batches(self, vector_store, batches, checkpoint: BatchCheckpoint = None, progress_callback=None) -> WriterStats:
+        """
+        Embeds and upserts a stream of (documents, metadatas, ids) batches with bounded
+        concurrency, rate limiting and retries. Batches recorded in `checkpoint` are
+        skipped. `progress_callback(stats)` is called after each batch.
+        """
+        try:
+            stats = self._writer(vector_store).write(batches, checkpoint=checkpoint, progress_callback=progress_callback)
+            logger.info(f"Added {stats.chunks_written} documents to collection '{vector_store.collection_name}'.")
+            return stats
+        except Exception as e:
+            logger.error(f"Failed to add documents to collection '{vector_store.collection_name}': {e}")
+            raise
+
     def add_documents_to_collection(self, vector_store, documents: list, metadatas: list, ids: list):
         """ Adds documents with their metadata to the specified collection. """
+        self.write_document_batches(vector_store, [(documents, metadatas, ids)])
+
+    def delete_documents_from_collection(self, vector_store, ids: list):
+        """ Removes the chunks with the given IDs from the specified collection. """
+        if not ids:
+            return
         try:
-            # AstraDBVectorStore's add_texts handles documents, metadatas, and ids
-            vector_store.add_texts(texts=documents, metadatas=metadatas, ids=ids)
-            logger.info(f"Added {len(documents)} documents to collection '{vector_store.collection_name}'.")
+            with telemetry.span("delete_stale", chunks=len(ids)):
+                vector_store.delete(ids=ids)
+                # The keyword index reads the texts it unindexes from the chunk store
+                lexical_index = self.lexical_index_for(vector_store)
+                if lexical_index is not None:
+                    lexical_index.delete(ids)
+                chunk_store.delete(vector_store.collection_name, ids)
+            telemetry.CHUNKS.inc(len(ids), operation="deleted")
+            logger.info(f"Deleted {len(ids)} documents from collection '{vector_store.collection_name}'.")
         except Exception as e:
-            logger.error(f"Failed to add documents to collection '{vector_store.collection_name}': {e}")
+            logger.error(f"Failed to delete documents from collection '{vector_store.collection_name}': {e}")
             raise
 
     def query_collection(self, vector_store, query_text: str, n_results: int = 5):
         """
-        Queries the collection to find the most relevant document chunks.
-        Returns results in a format similar to the old ChromaDB response.
+        Queries the collection to find the most relevant document chunks: hybrid
+        keyword + vector retrieval, or vector search alone with RETRIEVAL_MODE=vector.
+        Returns results in a format similar to the old ChromaDB response, plus the
+        query's embedding (None if the keyword index answered on its own).
         """
+        # The query embedding, if retrieval needed one, is handed back so the answer
+        # cache can match similar questions without embedding the query again
+        query_embedding = []
+
+        def vector_search(query: str, k: int) -> list:
+            embedding_model = vector_store.embeddings
+            if embedding_model is None:
+                # Embedded server-side
+                return vector_store.similarity_search_with_score(query=query, k=k)
+            query_embedding[:] = embedding_model.embed_query(query)
+            return vector_store.similarity_search_with_score_by_vector(query_embedding, k=k)
+
         try:
-            results = vector_store.similarity_search_with_score(query=query_text, k=n_results)
+            with telemetry.span("vector_query", k=n_results) as query_span:
+                if self.hybrid:
+                    results = self.retriever.search(
+                        query_text, n_results, vector_search, self.lexical_index_for(vector_store)
+                    )
+                else:
+                    results = vector_search(query_text, n_results)
+                query_span.set(results=len(results))
             logger.info(f"Query returned {len(results)} results.")
 
-            # Format the results to match the expected structure
+            # Format the results to match the expected structure; the chunk ID is what
+            # provenance refers to
             documents = [[doc.page_content for doc, score in results]]
-            metadatas = [[doc.metadata for doc, score in results]]
+            metadatas = [[{**doc.metadata, 'chunk_id': doc.id} for doc, score in results]]
 
-            return {"documents": documents, "metadatas": metadatas}
+            return {"documents": documents, "metadatas": metadatas, "query_embedding": query_embedding or None}
         except Exception as e:
             logger.error(f"Failed to query collection '{vector_store.collection_name}': {e}")
             return None
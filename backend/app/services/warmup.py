@@ -0,0 +1,118 @@
+from app.core.config import settings
+import importlib
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Third-party modules the services import on first use because they are slow to
+# import. The gunicorn master can import them before forking (GUNICORN_PRELOAD) so
+# the workers share their memory.
+HEAVY_MODULES = (
+    "google.generativeai",
+    "langchain_google_genai",
+    "langchain_text_splitters",
+    "langchain_core.vectorstores",
+)
+ASTRA_MODULES = ("langchain_astradb",)
+
+WARMING = "warming"
+WARM = "warm"
+FAILED = "failed"
+
+
+def preload_modules():
+    """ Imports the heavy third-party modules. Safe before forking: no clients, connections or files are opened. """
+    started = time.perf_counter()
+    modules = HEAVY_MODULES + (ASTRA_MODULES if settings.VECTOR_STORE_BACKEND == "astra" else ())
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Could not preload {name}: {e}")
+    logger.info(f"Preloaded {len(modules)} modules in {time.perf_counter() - started:.2f}s.")
+
+
+class Readiness:
+    """
+    Tracks this worker's startup warm-up: each component is warming, warm or
+    failed. A worker is up as soon as it serves requests and warm once every
+    component has been built; until then, requests build what they need on
+    first use and are slower.
+    """
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._components = {}
+        self._lock = threading.Lock()
+
+    def expect(self, names: list):
+        """ Registers the components the warm-up will build, so they read as warming before it reaches them. """
+        with self._lock:
+            for name in names:
+                self._components.setdefault(name, {"status": WARMING})
+
+    def run(self, name: str, warm):
+        """ Calls `warm()` and records how long it took, or why it failed. Never raises. """
+        self.expect([name])
+        started = time.perf_counter()
+        try:
+            warm()
+            state = {"status": WARM, "seconds": round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {e}")
+            state = {"status": FAILED, "error": str(e)}
+        with self._lock:
+            self._components[name] = state
+
+    def status(self) -> dict:
+        with self._lock:
+            components = {name: dict(state) for name, state in self._components.items()}
+        states = {state["status"] for state in components.values()}
+        if FAILED in states:
+            status = FAILED
+        elif WARMING in states or not components:
+            status = WARMING
+        else:
+            status = WARM
+        return {
+            "status": status,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "components": components,
+        }
+
+
+readiness = Readiness()
+
+
+def warm_up():
+    """
+    Builds this worker's clients, caches and recently used collection handles.
+    Runs in a background thread from the app's lifespan, after any fork.
+    """
+    # Imported here so importing this module (e.g. from the gunicorn config) stays cheap
+    from app.services import chunking, llm_service
+    from app.services.answer_cache import answer_cache
+    from app.services.chunk_store import chunk_store
+    from app.services.lazy import resolve
+    from app.services.plan_store import plan_store
+    from app.services.vector_store import vector_store_manager
+
+    steps = [
+        ("embeddings", lambda: resolve(vector_store_manager.embedding_client)),
+        ("embedding_cache", lambda: resolve(vector_store_manager.embedding_cache)),
+        ("embedding_model", lambda: resolve(vector_store_manager.embedding_model)),
+        ("llm", lambda: resolve(llm_service.model)),
+        ("chunker", lambda: chunking.chunk_file("warm_up.txt", "warm up")),
+        ("plan_store", lambda: resolve(plan_store)),
+        ("answer_cache", lambda: resolve(answer_cache)),
+        ("chunk_store", lambda: resolve(chunk_store)),
+        ("collections", vector_store_manager.warm_up),
+    ]
+    started = time.perf_counter()
+    readiness.expect([name for name, _ in steps])
+    for name, warm in steps:
+        readiness.run(name, warm)
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s: {readiness.status()['status']}.")
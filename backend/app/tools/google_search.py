@@ -1,38 +1,278 @@
-from serpapi import GoogleSearch
+from collections import OrderedDict
+from urllib.parse import quote_plus
 from app.core.config import settings
+from app.services import telemetry
+import asyncio
 import json
+import os
+import re
+import threading
+import time
+import httpx
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SERPAPI_URL = "https://serpapi.com/search.json"
+
+# Results returned per query unless asked otherwise
+DEFAULT_NUM_RESULTS = 5
+
+
+class SearchError(RuntimeError):
+    """ Raised when a search fails or times out. Failures are not cached. """
+
+
+def normalize_query(query: str) -> str:
+    """ Cache key form of a query: lower-cased, quotes dropped, whitespace collapsed. """
+    return re.sub(r"\s+", " ", query.replace('"', ' ').replace("'", ' ')).strip().lower()
+
+
+def _simplify(result: dict) -> dict:
+    return {
+        "title": result.get("title"),
+        "link": result.get("link"),
+        "snippet": result.get("snippet"),
+    }
+
+
+class SerpApiBackend:
+    """ Google results from SerpApi, over an async HTTP client. """
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._client = None
+
+    async def search(self, query: str, num_results: int) -> list:
+        if self._client is None:
+            # Created on first use so it belongs to the search service's event loop
+            self._client = httpx.AsyncClient(timeout=None)
+        params = {"engine": "google", "q": query, "num": num_results, "api_key": self.api_key}
+        response = await self._client.get(SERPAPI_URL, params=params)
+        response.raise_for_status()
+        results = response.json()
+        if results.get("error"):
+            raise SearchError(results["error"])
+        return [_simplify(result) for result in results.get("organic_results", [])[:num_results]]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FixtureBackend:
+    """
+    Offline stand-in for a search engine: answers from a JSON file mapping queries
+    to results, and with a made-up result for anything else. `latency` (seconds)
+    simulates a slow engine. For local development, tests and benchmarks.
+    """
+    def __init__(self, path: str = None, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.results = {}
+        if path and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.results = {normalize_query(query): results for query, results in json.load(f).items()}
+
+    async def search(self, query: str, num_results: int) -> list:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        results = self.results.get(normalize_query(query))
+        if results is None:
+            results = [{
+                "title": f"{query} - search results",
+                "link": f"https://www.google.com/search?q={quote_plus(query)}",
+                "snippet": f"Results for '{query}'.",
+            }]
+        return [_simplify(result) for result in results[:num_results]]
+
+    async def close(self):
+        pass
+
+
+def build_backend(name: str):
+    """ The backend configured by SEARCH_BACKEND, or None if search is unavailable. """
+    if name == "serpapi":
+        if not settings.SERPAPI_API_KEY:
+            logger.warning("SERPAPI_API_KEY is not set; web search is disabled.")
+            return None
+        return SerpApiBackend(settings.SERPAPI_API_KEY)
+    if name == "fixture":
+        return FixtureBackend(settings.SEARCH_FIXTURE_PATH)
+    return None
+
+
+class SearchService:
+    """
+    Web search for every thread and event loop of a worker, run on one background
+    event loop so that:
+    - results are cached (LRU, with a TTL) by normalized query,
+    - concurrent identical queries share a single backend call,
+    - each call has a timeout and at most `max_concurrency` are in flight.
+    Use `search`/`search_many` from async code and the `_sync` variants from threads.
+    """
+    def __init__(self, backend, max_entries: int, ttl_seconds: float, timeout: float, max_concurrency: int):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self._loop = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="search-loop", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _cache_get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return results
+
+    def _cache_put(self, key, results: list):
+        if not self.max_entries:
+            return
+        self._cache[key] = (time.monotonic() + self.ttl_seconds, results)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, key, query: str, num_results: int, timeout: float) -> list:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            async with self._semaphore:
+                results = await asyncio.wait_for(self.backend.search(query, num_results), timeout)
+        except asyncio.TimeoutError:
+            self._stats["errors"] += 1
+            raise SearchError(f"Search for '{query}' timed out after {timeout}s.")
+        except SearchError:
+            self._stats["errors"] += 1
+            raise
+        except Exception as e:
+            self._stats["errors"] += 1
+            raise SearchError(f"Search for '{query}' failed: {e}") from e
+        self._cache_put(key, results)
+        return results
+
+    async def _search(self, query: str, num_results: int, timeout: float) -> list:
+        # Runs on the service loop, so the cache and in-flight table need no locks
+        key = (normalize_query(query), num_results)
+        results = self._cache_get(key)
+        if results is not None:
+            self._stats["hits"] += 1
+            return results
+        task = self._in_flight.get(key)
+        if task is None:
+            self._stats["misses"] += 1
+            task = asyncio.ensure_future(self._fetch(key, query, num_results, timeout))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self._stats["coalesced"] += 1
+        # Shielded so one caller giving up doesn't cancel the search for the others
+        return await asyncio.shield(task)
+
+    def _submit(self, coroutine):
+        if not self.enabled:
+            coroutine.close()
+            raise SearchError("Web search is not configured.")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+
+    async def search(self, query: str, num_results: int = DEFAULT_NUM_RESULTS, timeout: float = None) -> list:
+        """ Returns up to `num_results` results as {title, link, snippet} dicts; raises SearchError. """
+        timeout = timeout or self.timeout
+        with telemetry.span("web_search", queries=1):
+            return await asyncio.wrap_future(self._submit(self._search(query, num_results, timeout)))
+
+    def search_sync(self, query: str, num_results: int = DEFAULT_NUM_RESULTS, timeout: float = None) -> list:
+        """ Blocking `search`, for worker threads. """
+        timeout = timeout or self.timeout
+        with telemetry.span("web_search", queries=1):
+            return self._submit(self._search(query, num_results, timeout)).result()
+
+    async def _search_many(self, queries: list, num_results: int, timeout: float) -> dict:
+        unique = list(dict.fromkeys(queries))
+        outcomes = await asyncio.gather(
+            *(self._search(query, num_results, timeout) for query in unique),
+            return_exceptions=True,
+        )
+        return dict(zip(unique, outcomes))
+
+    async def search_many(self, queries: list, num_results: int = DEFAULT_NUM_RESULTS, timeout: float = None) -> dict:
+        """
+        Runs searches concurrently. Returns {query: results}, with a SearchError in
+        place of the results of any query that failed.
+        """
+        timeout = timeout or self.timeout
+        with telemetry.span("web_search", queries=len(queries)):
+            return await asyncio.wrap_future(self._submit(self._search_many(queries, num_results, timeout)))
+
+    def search_many_sync(self, queries: list, num_results: int = DEFAULT_NUM_RESULTS, timeout: float = None) -> dict:
+        """ Blocking `search_many`, for worker threads. """
+        timeout = timeout or self.timeout
+        with telemetry.span("web_search", queries=len(queries)):
+            return self._submit(self._search_many(queries, num_results, timeout)).result()
+
+    def stats(self) -> dict:
+        return {**self._stats, "entries": len(self._cache), "in_flight": len(self._in_flight)}
+
+    def close(self):
+        """ Closes the backend's connections and stops the service loop. """
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.backend.close(), loop).result(timeout=self.timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+search_service = SearchService(
+    build_backend(settings.SEARCH_BACKEND),
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+    timeout=settings.SEARCH_TIMEOUT_SECONDS,
+    max_concurrency=settings.SEARCH_MAX_CONCURRENCY,
+)
+
 
 def search(query: str):
     """
-    Performs a Google search for the given query using SerpApi and returns the top organic results.
-    
+    Performs a Google search for the given query and returns the top organic results.
+    Kept for callers of the original module API. The model's `google_search` tool
+    calls don't come through here: llm_service runs each round's queries together
+    with `search_service.search_many_sync` (or `search_many` when streaming).
+
     Args:
         query (str): The search query.
-        
+
     Returns:
         str: A JSON string of the search results.
     """
-    params = {
-        "engine": "google",
-        "q": query,
-        "api_key": settings.SERPAPI_API_KEY,
-    }
-
-    search_client = GoogleSearch(params)
-    results = search_client.get_dict()
-    
-    organic_results = results.get("organic_results", [])
-    
-    # Extract relevant info from the top 5 results
-    simplified_results = []
-    for result in organic_results[:5]:
-        simplified_results.append({
-            "title": result.get("title"),
-            "link": result.get("link"),
-            "snippet": result.get("snippet"),
-        })
-
-    return json.dumps(simplified_results)
+    return json.dumps(search_service.search_sync(query))
 
 # Define the tool for the Gemini model
 google_search_tool = {
@@ -48,4 +288,4 @@ google_search_tool = {
         },
         "required": ["query"]
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,366 @@
+"""
+End-to-end benchmark of the API without any credentials: Gemini, the embedding
+API, web search and the vector store are replaced by deterministic fakes with
+injected latency (benchmarks/fakes.py), synthetic git repositories are generated
+(benchmarks/synthetic_repo.py), and the FastAPI app is driven in-process through
+its ASGI interface. Reports per-stage onboarding latencies, chat latency and
+throughput, fake service call counts and peak memory as JSON, for regression
+tracking.
+
+Phases:
+  onboard_cold         every repo onboarded concurrently from scratch (one request
+                       each, or a single batch request with --batch)
+  onboard_resume       the same repos again, unchanged (served from the plan store)
+  onboard_incremental  after a commit touching --changed-files files per repo
+  chat                 --chat-requests POST /chat calls, --concurrency at a time
+  chat_stream          the same through /chat/stream (other questions), with time to first token
+
+Also reports chat response sizes and the on-disk size of the vector, chunk and
+keyword stores.
+
+Run from the backend/ directory:
+
+    python -m benchmarks.bench_e2e --repos 4 --files 300 --mix py=50,ts=30,md=20 --output e2e.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing
+
+import numpy as np
+
+# Seconds between polls of an onboarding job
+JOB_POLL_INTERVAL = 0.02
+
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    return {
+        'p50': round(float(np.percentile(values, 50)), 2),
+        'p95': round(float(np.percentile(values, 95)), 2),
+        'p99': round(float(np.percentile(values, 99)), 2),
+        'max': round(float(max(values)), 2),
+    }
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _disk_usage_mb(paths: list) -> float:
+    """ Total size of files and directory trees, after folding SQLite write-ahead logs into their databases. """
+    def files():
+        for path in paths:
+            if os.path.isdir(path):
+                yield from (os.path.join(directory, name) for directory, _, names in os.walk(path) for name in names)
+            else:
+                yield from (candidate for candidate in (path, f"{path}-wal", f"{path}-shm") if os.path.isfile(candidate))
+
+    for path in list(files()):
+        if path.endswith('.sqlite'):
+            with closing(sqlite3.connect(path)) as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return round(sum(os.path.getsize(path) for path in files()) / 1024 ** 2, 2)
+
+
+def _configure_environment(data_dir: str):
+    """ Points all state at a scratch directory and selects offline backends. Must run before importing app. """
+    os.environ['DATA_DIR'] = data_dir
+    os.environ['VECTOR_STORE_BACKEND'] = 'local'
+    os.environ['SEARCH_BACKEND'] = 'fixture'
+    # Re-check the (local) remote every time, so changed repos are noticed at once
+    os.environ['REMOTE_HEAD_CACHE_SECONDS'] = '0'
+    os.environ.setdefault('GOOGLE_API_KEY', 'benchmark')
+
+
+class StageRecorder:
+    """ Wraps pipeline.run_onboarding to timestamp each stage of each run. """
+    def __init__(self, pipeline):
+        self.runs = []
+        original = pipeline.run_onboarding
+
+        def timed(repo_url, incremental=True, progress=None):
+            marks = [("start", time.perf_counter())]
+            self.runs.append(marks)
+
+            def report(stage, current=0, total=0, metrics=None):
+                if marks[-1][0] != stage:
+                    marks.append((stage, time.perf_counter()))
+                if progress:
+                    progress(stage, current, total, metrics)
+            try:
+                return original(repo_url, incremental, progress=report)
+            finally:
+                marks.append(("done", time.perf_counter()))
+        pipeline.run_onboarding = timed
+
+    def take(self) -> dict:
+        """ Stage durations (ms) over the runs since the last call. """
+        durations = {}
+        for marks in self.runs:
+            for (stage, started), (_, ended) in zip(marks, marks[1:]):
+                if stage != "start":
+                    durations.setdefault(stage, []).append((ended - started) * 1000)
+        self.runs = []
+        return {stage: _percentiles(values) for stage, values in durations.items()}
+
+
+async def _onboard(client, repo_url: str, incremental: bool = True) -> dict:
+    started = time.perf_counter()
+    response = await client.post("/api/v1/onboard", json={"repo_url": repo_url, "incremental": incremental})
+    response.raise_for_status()
+    job = response.json()
+    while job['status'] not in ("completed", "failed"):
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+        job = (await client.get(f"/api/v1/onboard/{job['job_id']}")).json()
+    if job['status'] == "failed":
+        raise RuntimeError(f"Onboarding {repo_url} failed: {job['error']}")
+    return {'seconds': time.perf_counter() - started, 'stage_seconds': job.get('stage_seconds') or {}}
+
+
+async def _onboard_batch(client, repo_urls: list) -> list:
+    """ Onboards the repos with one batch request; returns a run per repo, like `_onboard`. """
+    started = time.perf_counter()
+    response = await client.post("/api/v1/onboard/batches", json={"repo_urls": repo_urls})
+    response.raise_for_status()
+    batch = response.json()
+    finished = {}
+    while True:
+        for job in batch['jobs']:
+            if job['job_id'] not in finished and job['status'] in ("completed", "failed"):
+                if job['status'] == "failed":
+                    raise RuntimeError(f"Onboarding {job['repo_url']} failed: {job['error']}")
+                finished[job['job_id']] = {'seconds': time.perf_counter() - started, 'stage_seconds': job['stage_seconds']}
+        if batch['status'] == "completed":
+            return list(finished.values())
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+        batch = (await client.get(f"/api/v1/onboard/batches/{batch['batch_id']}")).json()
+
+
+async def onboard_phase(client, repo_urls: list, recorder: StageRecorder, files_per_repo: int, batch: bool = False) -> dict:
+    started = time.perf_counter()
+    if batch:
+        runs = await _onboard_batch(client, repo_urls)
+    else:
+        runs = await asyncio.gather(*(_onboard(client, url) for url in repo_urls))
+    wall = time.perf_counter() - started
+    traced = {}
+    for run in runs:
+        for name, seconds in run['stage_seconds'].items():
+            traced.setdefault(name, []).append(seconds * 1000)
+    return {
+        'wall_seconds': round(wall, 3),
+        'repo_ms': _percentiles([run['seconds'] * 1000 for run in runs]),
+        'files_per_second': round(len(repo_urls) * files_per_repo / wall, 1),
+        # Wall time between progress stages, and time per traced span summed over the job
+        'stage_ms': recorder.take(),
+        'traced_ms': {name: _percentiles(values) for name, values in traced.items()},
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+async def _asgi_stream(app, path: str, body: dict) -> dict:
+    """
+    POSTs to a streaming endpoint through the ASGI interface directly, timing the
+    first token event (httpx's ASGI transport only returns complete bodies).
+    """
+    payload = json.dumps(body).encode('utf-8')
+    finished = asyncio.Event()
+    received = {'sent': False}
+    timings = {'first_token': None, 'status': None}
+    chunks = []
+    started = time.perf_counter()
+
+    async def receive():
+        if not received['sent']:
+            received['sent'] = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message['type'] == "http.response.start":
+            timings['status'] = message['status']
+        elif message['type'] == "http.response.body":
+            chunk = message.get('body', b'')
+            if timings['first_token'] is None and b"event: token" in chunk:
+                timings['first_token'] = time.perf_counter() - started
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                finished.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    finished.set()
+    text = b"".join(chunks).decode('utf-8')
+    return {
+        'status': timings['status'],
+        'seconds': time.perf_counter() - started,
+        'first_token': timings['first_token'],
+        'cached': '"cached": true' in text,
+        'bytes': len(text.encode('utf-8')),
+        'error': "event: error" in text,
+    }
+
+
+async def chat_phase(client, app, session_ids: list, queries: list, requests: int, concurrency: int, stream: bool) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(1)
+    latencies, first_tokens, sizes, errors, cached = [], [], [], 0, 0
+
+    async def one(session_id: str, query: str):
+        nonlocal errors, cached
+        async with semaphore:
+            body = {"session_id": session_id, "query": query}
+            if stream:
+                result = await _asgi_stream(app, "/api/v1/chat/stream", body)
+                if result['status'] != 200 or result['error']:
+                    errors += 1
+                    return
+                cached += result['cached']
+                latencies.append(result['seconds'] * 1000)
+                sizes.append(result['bytes'])
+                if result['first_token'] is not None:
+                    first_tokens.append(result['first_token'] * 1000)
+            else:
+                started = time.perf_counter()
+                response = await client.post("/api/v1/chat", json=body)
+                if response.status_code != 200:
+                    errors += 1
+                    return
+                latencies.append((time.perf_counter() - started) * 1000)
+                sizes.append(len(response.content))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(rng.choice(session_ids), rng.choice(queries)) for _ in range(requests)))
+    wall = time.perf_counter() - started
+    report = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(requests / wall, 1),
+        'latency_ms': _percentiles(latencies),
+        'response_bytes': _percentiles(sizes),
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+    if stream:
+        report['first_token_ms'] = _percentiles(first_tokens)
+        report['answer_cache_hits'] = cached
+    return report
+
+
+async def run(args, root: str) -> dict:
+    import httpx
+    from app.core.config import settings
+    from app.main import app
+    from app.services import pipeline
+    from benchmarks import synthetic_repo
+    from benchmarks.fakes import install_fakes
+
+    fakes = install_fakes(
+        embedding_latency=args.embedding_latency_ms / 1000,
+        llm_latency=args.llm_latency_ms / 1000,
+        llm_token_latency=args.llm_token_latency_ms / 1000,
+        search_latency=args.search_latency_ms / 1000,
+        store_latency=args.store_latency_ms / 1000,
+    )
+    recorder = StageRecorder(pipeline)
+
+    mix = synthetic_repo.parse_mix(args.mix) if args.mix else synthetic_repo.DEFAULT_MIX
+    repo_urls, symbols = [], []
+    started = time.perf_counter()
+    for i in range(args.repos):
+        repo_path = os.path.join(root, "repos", f"repo{i}")
+        summary = synthetic_repo.generate_repo(repo_path, args.files, mix, seed=args.seed + i)
+        repo_urls.append(repo_path)
+        symbols.extend(summary['symbols'])
+    generate_seconds = time.perf_counter() - started
+
+    # Fixed pools of questions, so some repeat (and can be served from the answer
+    # cache); the streaming phase asks different ones, so it isn't all cache hits
+    rng = random.Random(args.seed)
+    names = symbols or ["this"]
+    queries = [f"How does {rng.choice(names)} work?" for _ in range(args.unique_queries)]
+    stream_queries = [f"Where is {rng.choice(names)} used?" for _ in range(args.unique_queries)]
+    session_ids = [pipeline.generate_collection_name(url) for url in repo_urls]
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'repos': {'count': args.repos, 'files_each': args.files, 'mix': mix, 'generate_seconds': round(generate_seconds, 3)},
+        'phases': {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        phases = report['phases']
+        phases['onboard_cold'] = await onboard_phase(client, repo_urls, recorder, args.files, args.batch)
+        phases['onboard_resume'] = await onboard_phase(client, repo_urls, recorder, args.files, args.batch)
+        for i, repo_path in enumerate(repo_urls):
+            synthetic_repo.commit_changes(repo_path, args.changed_files, seed=args.seed + i)
+        phases['onboard_incremental'] = await onboard_phase(client, repo_urls, recorder, args.files, args.batch)
+        phases['chat'] = await chat_phase(client, app, session_ids, queries, args.chat_requests, args.concurrency, stream=False)
+        phases['chat_stream'] = await chat_phase(client, app, session_ids, stream_queries, args.chat_requests, args.concurrency, stream=True)
+
+    report['fake_calls'] = {
+        'embedding_calls': fakes['embeddings'].calls,
+        'embedded_texts': fakes['embeddings'].texts,
+        'llm_calls': fakes['llm'].calls,
+        'search_calls': fakes['search'].calls,
+    }
+    report['storage_mb'] = {
+        'vectors': _disk_usage_mb([settings.LOCAL_VECTOR_STORE_DIR]),
+        'chunks': _disk_usage_mb([settings.CHUNK_STORE_PATH]),
+        'lexical': _disk_usage_mb([settings.LEXICAL_INDEX_DIR]),
+    }
+    report['peak_rss_mb'] = _peak_rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repos', type=int, default=4)
+    parser.add_argument('--files', type=int, default=200, help="Files per synthetic repository")
+    parser.add_argument('--mix', default=None, help="Language mix, e.g. py=50,ts=30,md=20 (default: a polyglot mix)")
+    parser.add_argument('--changed-files', type=int, default=10, help="Files changed per repo before the incremental phase")
+    parser.add_argument('--batch', action='store_true', help="Onboard all repos with one batch request instead of one request each")
+    parser.add_argument('--chat-requests', type=int, default=200)
+    parser.add_argument('--unique-queries', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--embedding-latency-ms', type=float, default=20.0, help="Per embedding API call")
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0, help="Time to first token")
+    parser.add_argument('--llm-token-latency-ms', type=float, default=10.0, help="Per streamed chunk")
+    parser.add_argument('--search-latency-ms', type=float, default=50.0)
+    parser.add_argument('--store-latency-ms', type=float, default=0.0, help="Per vector store round-trip (0: local store as is)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ccoa-bench-e2e-") as root:
+        _configure_environment(os.path.join(root, "data"))
+        report = asyncio.run(run(args, root))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
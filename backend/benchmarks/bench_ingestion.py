@@ -0,0 +1,154 @@
+"""
+Compares the streaming ingestion pipeline with the original load_and_split_documents
+on a synthetic repository tree, reporting wall time and peak RSS for each.
+
+Run from the backend/ directory:
+
+    python -m benchmarks.bench_ingestion --files 50000
+
+Each implementation runs in its own subprocess so peak RSS is measured independently.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Roughly the extension mix of a polyglot monorepo
+EXTENSION_WEIGHTS = {
+    '.py': 30, '.ts': 15, '.tsx': 10, '.js': 10, '.go': 8, '.java': 6,
+    '.md': 6, '.json': 5, '.yml': 4, '.css': 3, '.rs': 3,
+}
+
+CODE_LINE = "    result = compute_value(item, options) + offset  # keep going\n"
+
+
+def generate_tree(root: str, file_count: int, seed: int = 0):
+    """ Writes a synthetic repository with nested packages, ignored dirs and a few binaries. """
+    rng = random.Random(seed)
+    extensions = list(EXTENSION_WEIGHTS)
+    weights = list(EXTENSION_WEIGHTS.values())
+    root_path = Path(root)
+    (root_path / '.gitignore').write_text("build/\n*.log\n")
+
+    for i in range(file_count):
+        package = root_path / f"pkg{i % 50}" / f"mod{i % 400}"
+        package.mkdir(parents=True, exist_ok=True)
+        extension = rng.choices(extensions, weights)[0]
+        # Mostly small files with a long tail of larger ones
+        lines = int(rng.paretovariate(1.5) * 40)
+        (package / f"file{i}{extension}").write_text(f"# file {i}\n" + CODE_LINE * lines)
+
+    # Content the pipeline should never read
+    for ignored in ('build', 'node_modules', '.git/objects'):
+        ignored_dir = root_path / ignored
+        ignored_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(file_count // 20):
+            (ignored_dir / f"generated{i}.js").write_text(CODE_LINE * 50)
+    (root_path / 'pkg0' / 'logo.py').write_bytes(b'\x89PNG\x00' * 1000)
+
+
+def legacy_load_and_split_documents(repo_path: str):
+    """ The original implementation, kept verbatim for comparison. """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from app.services.ingestion import SUPPORTED_EXTENSIONS
+
+    documents = []
+    metadatas = []
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200, length_function=len)
+    repo_path_obj = Path(repo_path)
+    for file_path in repo_path_obj.rglob('*'):
+        if file_path.is_file() and file_path.suffix in SUPPORTED_EXTENSIONS:
+            if ".git" in str(file_path):
+                continue
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                chunks = text_splitter.split_text(content)
+                for i, chunk in enumerate(chunks):
+                    relative_path = str(file_path.relative_to(repo_path_obj))
+                    documents.append(chunk)
+                    metadatas.append({'file_path': relative_path, 'chunk_index': i})
+            except Exception:
+                pass
+    ids = [f"{meta['file_path']}_{meta['chunk_index']}" for meta in metadatas]
+    return documents, metadatas, ids
+
+
+def _peak_rss_kib(pid: int) -> int:
+    """ A live process's peak RSS so far (VmHWM), in KiB, from /proc (Linux). """
+    with open(f"/proc/{pid}/status", 'r') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_once(mode: str, tree: str) -> dict:
+    from app.services import ingestion
+
+    started = time.perf_counter()
+    if mode == 'legacy':
+        documents, _, _ = legacy_load_and_split_documents(tree)
+        chunks = len(documents)
+    else:
+        chunks = 0
+        # Consume batches the way the embedder does, without holding on to them
+        for documents, _, _ in ingestion.iter_document_batches(tree):
+            chunks += len(documents)
+    elapsed = time.perf_counter() - started
+
+    worker_rss = None
+    pool = ingestion._split_pool
+    if pool is not None:
+        # Read while the split workers are alive: RUSAGE_CHILDREN would only count
+        # exited children, and counts a forked child's pages from before its exec
+        worker_rss = max(_peak_rss_kib(pid) for pid in pool._processes)
+        pool.shutdown(wait=True)
+
+    # ru_maxrss is KiB on Linux; the split workers are reported separately
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'mode': mode,
+        'chunks': chunks,
+        'wall_seconds': round(elapsed, 2),
+        'peak_rss_mb': round(self_rss / 1024, 1),
+        'peak_worker_rss_mb': round(worker_rss / 1024, 1) if worker_rss is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--tree', help="Reuse an existing synthetic tree instead of generating one")
+    parser.add_argument('--run', choices=['legacy', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_once(args.run, args.tree)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="ccoa-bench-") as generated:
+        tree = args.tree
+        if not tree:
+            tree = generated
+            print(f"Generating {args.files} files in {tree}...", file=sys.stderr)
+            generate_tree(tree, args.files)
+
+        results = []
+        for mode in ('legacy', 'streaming'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_ingestion', '--run', mode, '--tree', tree],
+                check=True, capture_output=True, text=True, env=os.environ,
+            )
+            results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        print(json.dumps({'files': args.files, 'cpus': os.cpu_count(), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
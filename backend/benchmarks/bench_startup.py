@@ -0,0 +1,183 @@
+"""
+Cold-start benchmark of the production server: launches gunicorn with uvicorn
+workers (as in the Dockerfile) against a scratch data directory and offline
+backends, and reports
+  - time until every worker has started its application ("up"),
+  - time until every worker has built its clients and caches ("warm"),
+  - time to the first answered request,
+  - RSS, PSS and USS of the master and each worker. PSS/USS show how much memory
+    workers share copy-on-write, e.g. with --preload.
+
+Workers log "Application startup complete." when up and "Warm-up finished" when
+their background warm-up finishes; a build without background warm-up is warm
+when it is up.
+
+Run from the backend/ directory:
+
+    python -m benchmarks.bench_startup --workers 4 --runs 3
+    python -m benchmarks.bench_startup --workers 4 --runs 3 --preload
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+UP_MARKER = "Application startup complete."
+WARM_MARKER = "Warm-up finished"
+
+# How long to wait for the server before giving up on a run
+START_TIMEOUT_SECONDS = 120
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _memory(pid: int) -> dict:
+    """ RSS, PSS and USS of a process in MiB, from /proc (Linux). """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                values[name] = int(rest.split()[0]) / 1024
+    return {
+        'rss_mb': round(values['Rss'], 1),
+        'pss_mb': round(values['Pss'], 1),
+        'uss_mb': round(values['Private_Clean'] + values['Private_Dirty'], 1),
+    }
+
+
+def _children(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children", 'r') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _first_response(url: str, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return time.perf_counter()
+        except OSError:
+            time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer in time.")
+
+
+def run_once(workers: int, preload: bool, env: dict) -> dict:
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app",
+        "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+    ] if os.path.exists("gunicorn.conf.py") else [
+        sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker",
+        "app.main:app", "--bind", f"127.0.0.1:{port}",
+    ]
+    env = {**env, 'GUNICORN_PRELOAD': 'true' if preload else 'false'}
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    marks = {'up': [], 'warm': []}
+    log = []
+
+    def read_log():
+        for line in process.stderr:
+            log.append(line)
+            now = time.perf_counter() - started
+            if UP_MARKER in line:
+                marks['up'].append(now)
+            if WARM_MARKER in line:
+                marks['warm'].append(now)
+    reader = threading.Thread(target=read_log, daemon=True)
+    reader.start()
+
+    try:
+        deadline = started + START_TIMEOUT_SECONDS
+        first_response = _first_response(f"http://127.0.0.1:{port}/", deadline) - started
+        while len(marks['up']) < workers:
+            if time.perf_counter() > deadline or process.poll() is not None:
+                raise RuntimeError("Workers did not start:\n" + "".join(log[-20:]))
+            time.sleep(0.01)
+        # Builds that warm up in the background log when they are done
+        warm_deadline = time.perf_counter() + 5 if not marks['warm'] else deadline
+        while len(marks['warm']) < workers and time.perf_counter() < warm_deadline:
+            time.sleep(0.01)
+            if marks['warm']:
+                warm_deadline = deadline
+        up = max(marks['up'])
+        warm = max(marks['warm']) if len(marks['warm']) == workers else up
+        # Memory once the workers are warm and idle
+        time.sleep(0.5)
+        worker_memory = [_memory(pid) for pid in _children(process.pid)]
+        return {
+            'first_response_s': round(first_response, 2),
+            'all_up_s': round(up, 2),
+            'all_warm_s': round(warm, 2),
+            'master': _memory(process.pid),
+            'workers': worker_memory,
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _summary(runs: list) -> dict:
+    def median(values):
+        return round(statistics.median(values), 2)
+    workers = [memory for run in runs for memory in run['workers']]
+    return {
+        'first_response_s': median([run['first_response_s'] for run in runs]),
+        'all_up_s': median([run['all_up_s'] for run in runs]),
+        'all_warm_s': median([run['all_warm_s'] for run in runs]),
+        'master_rss_mb': median([run['master']['rss_mb'] for run in runs]),
+        'worker_rss_mb': median([memory['rss_mb'] for memory in workers]),
+        'worker_pss_mb': median([memory['pss_mb'] for memory in workers]),
+        'worker_uss_mb': median([memory['uss_mb'] for memory in workers]),
+        'total_pss_mb': median([run['master']['pss_mb'] + sum(m['pss_mb'] for m in run['workers']) for run in runs]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--preload', action='store_true', help="Preload in the gunicorn master (GUNICORN_PRELOAD=true)")
+    parser.add_argument('--output', default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ccoa-startup-") as data_dir:
+        env = {
+            **os.environ,
+            'DATA_DIR': data_dir,
+            'VECTOR_STORE_BACKEND': 'local',
+            'SEARCH_BACKEND': 'fixture',
+        }
+        env.setdefault('GOOGLE_API_KEY', 'benchmark')
+        runs = [run_once(args.workers, args.preload, env) for _ in range(args.runs)]
+
+    report = {
+        'config': {'workers': args.workers, 'runs': args.runs, 'preload': args.preload, 'cpus': os.cpu_count()},
+        'summary': _summary(runs),
+        'runs': runs,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Measures top-k latency and recall of the local vector store's IVF index against
+exact (exhaustive) search on synthetic clustered embeddings.
+
+Run from the backend/ directory:
+
+    python -m benchmarks.bench_vector_search --vectors 100000 --dim 768
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.local_vector_store import LocalVectorStore
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """ "Embeds" the string form of a row index by looking the vector up. """
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return self.vectors[[int(text) for text in texts]].tolist()
+
+    def embed_query(self, text):
+        return self.vectors[int(text)].tolist()
+
+
+def clustered_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    # Real code embeddings are strongly clustered (by language, module, boilerplate)
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=count)] + rng.normal(scale=0.6, size=(count, dim))
+    return vectors.astype(np.float32)
+
+
+def measure(store: LocalVectorStore, queries: np.ndarray, k: int):
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append({row for row, _ in store.search_vectors(query, k)})
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16])
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.vectors + args.queries, args.dim, clusters=max(args.vectors // 500, 1))
+    corpus, queries = vectors[:args.vectors], vectors[args.vectors:]
+    embedding = PrecomputedEmbeddings(corpus)
+
+    with tempfile.TemporaryDirectory(prefix="ccoa-vec-bench-") as root:
+        # Build once with IVF; exact search is the same store with the index hidden
+        store = LocalVectorStore("bench", embedding, root, ivf_min_rows=args.vectors)
+        started = time.perf_counter()
+        for start in range(0, args.vectors, 5000):
+            batch = [str(i) for i in range(start, min(start + 5000, args.vectors))]
+            store.add_texts(batch, ids=batch)
+        build_seconds = time.perf_counter() - started
+
+        centroids = store._centroids
+        store._centroids = None
+        exact, exact_latencies = measure(store, queries, args.k)
+        store._centroids = centroids
+
+        report = {
+            'vectors': args.vectors,
+            'dim': args.dim,
+            'k': args.k,
+            'build_seconds': round(build_seconds, 2),
+            'ivf_lists': 0 if centroids is None else len(centroids),
+            'exact': {'p50_ms': round(float(np.percentile(exact_latencies, 50)), 3)},
+            'ivf': [],
+        }
+        for nprobe in args.nprobe:
+            store.nprobe = nprobe
+            approximate, latencies = measure(store, queries, args.k)
+            recall = np.mean([len(a & e) / len(e) for a, e in zip(approximate, exact)])
+            report['ivf'].append({
+                'nprobe': nprobe,
+                'recall_at_k': round(float(recall), 4),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+                'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+            })
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
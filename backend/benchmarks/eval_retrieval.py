@@ -0,0 +1,134 @@
+"""
+Offline evaluation of chat retrieval: indexes a fixture repository into a local
+vector store and keyword index, then measures recall@k, MRR and query latency of
+vector-only, keyword-only and hybrid retrieval over a set of labelled queries.
+
+By default the fixture is this backend's own `app/` package with the queries in
+benchmarks/fixtures/retrieval_queries.json, embedded with a hashing embedding so
+no network or API key is needed. Pass `--embeddings google` (with GOOGLE_API_KEY
+set) to evaluate against the real embedding model.
+
+Run from the backend/ directory:
+
+    python -m benchmarks.eval_retrieval --k 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.chunk_store import ChunkStore
+from app.services.ingestion import load_and_split_documents
+from app.services.lexical_index import LexicalIndex
+from app.services.local_vector_store import LocalVectorStore
+from app.services.retrieval import HybridRetriever
+from benchmarks.fakes import HashingEmbeddings
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class CountingEmbeddings(Embeddings):
+    """ Counts query embeddings, i.e. the calls the keyword fast path saves. """
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.queries = 0
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self.embeddings.embed_query(text)
+
+
+def build_embeddings(name: str) -> Embeddings:
+    if name == "hash":
+        return HashingEmbeddings()
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=os.environ["GOOGLE_API_KEY"])
+
+
+def evaluate(search, queries: list, k: int) -> dict:
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for item in queries:
+        started = time.perf_counter()
+        results = search(item['query'], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        files = [document.metadata['file_path'] for document, _ in results]
+        relevant = set(item['relevant'])
+        recalls.append(len(relevant & set(files)) / len(relevant))
+        rank = next((i for i, path in enumerate(files, start=1) if path in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        f'recall_at_{k}': round(float(np.mean(recalls)), 4),
+        'mrr': round(float(np.mean(reciprocal_ranks)), 4),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repo', default="app", help="Directory to index (default: this backend's app/)")
+    parser.add_argument('--queries', default=os.path.join(FIXTURES_DIR, "retrieval_queries.json"))
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--candidates', type=int, default=20)
+    parser.add_argument('--max-chunks-per-file', type=int, default=2)
+    parser.add_argument('--embeddings', choices=["hash", "google"], default="hash")
+    args = parser.parse_args()
+
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        queries = json.load(f)['queries']
+
+    documents, metadatas, ids = load_and_split_documents(args.repo)
+    embeddings = CountingEmbeddings(build_embeddings(args.embeddings))
+
+    with tempfile.TemporaryDirectory(prefix="ccoa-retrieval-eval-") as root:
+        started = time.perf_counter()
+        store = LocalVectorStore("eval", embeddings, root)
+        store.add_texts(documents, metadatas=metadatas, ids=ids)
+        vector_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        chunk_store = ChunkStore(os.path.join(root, "chunks.sqlite"))
+        chunk_store.put("eval", ids, documents, metadatas)
+        lexical_index = LexicalIndex(os.path.join(root, "lexical.sqlite"), "eval", chunk_store)
+        lexical_index.add(documents, metadatas, ids)
+        lexical_seconds = time.perf_counter() - started
+
+        def vector_search(query, n):
+            return store.similarity_search_with_score(query, k=n)
+
+        def hybrid(use_rerank: bool):
+            retriever = HybridRetriever(args.candidates, args.max_chunks_per_file, use_rerank=use_rerank)
+            return lambda query, k: retriever.search(query, k, vector_search, lexical_index)
+
+        strategies = {
+            'vector': vector_search,
+            'lexical': lexical_index.search,
+            'hybrid': hybrid(use_rerank=False),
+            'hybrid_rerank': hybrid(use_rerank=True),
+        }
+        report = {
+            'repo': args.repo,
+            'chunks': len(documents),
+            'queries': len(queries),
+            'embeddings': args.embeddings,
+            'index_seconds': {'vector': round(vector_seconds, 3), 'lexical': round(lexical_seconds, 3)},
+            'strategies': {},
+        }
+        for name, search in strategies.items():
+            embeddings.queries = 0
+            result = evaluate(search, queries, args.k)
+            result['embedding_calls'] = embeddings.queries
+            report['strategies'][name] = result
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Deterministic stand-ins for the services the backend calls over the network
+(Gemini, the embedding API, web search and the vector store), each with
+injectable latency, so benchmarks can run without credentials. Import this only
+after the environment is configured; `install_fakes` patches the live singletons.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+
+import google.generativeai as genai
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.lexical_index import tokenize, identifier_parts
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for an embedding model: feature-hashed bag of words,
+    identifier sub-words and character trigrams. Crude, but it ranks related
+    text together, which is enough to compare retrieval strategies offline.
+    """
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = tokenize(text) + identifier_parts(text)
+        features = words + [word[i:i + 3] for word in words for i in range(max(len(word) - 2, 1))]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FakeEmbeddings(HashingEmbeddings):
+    """ HashingEmbeddings behind a simulated API: `latency` seconds per call. """
+    def __init__(self, latency: float = 0.0, dim: int = 512):
+        super().__init__(dim)
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _record(self, count: int):
+        with self._lock:
+            self.calls += 1
+            self.texts += count
+        if self.latency:
+            time.sleep(self.latency)
+
+    def embed_documents(self, texts):
+        self._record(len(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self._record(1)
+        return super().embed_query(text)
+
+
+class _FakeResponse:
+    """ The parts of a Gemini response llm_service reads. """
+    def __init__(self, text: str, prompt: str):
+        part = genai.protos.Part(text=text)
+        self.candidates = [genai.protos.Candidate(content=genai.protos.Content(parts=[part], role="model"))]
+        self.text = text
+        self.prompt_feedback = None
+        self.usage_metadata = genai.protos.GenerateContentResponse.UsageMetadata(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+        )
+
+
+class _FakeStream:
+    """ An async-iterable streamed response, iterated through an async generator like the SDK's. """
+    def __init__(self, chunks: list, token_latency: float):
+        self.chunks = chunks
+        self.token_latency = token_latency
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield chunk
+
+
+class FakeGeminiModel:
+    """
+    Answers llm_service's prompts with canned, well-formed output: onboarding plans,
+    module summaries and chat answers. `latency` is the time to the first token and
+    `token_latency` the time per streamed chunk.
+    """
+    MODULE_PATTERN = re.compile(r'Summarize the module "([^"]+)"')
+    WORDS_PER_CHUNK = 4
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prompt_text(contents) -> str:
+        if isinstance(contents, str):
+            return contents
+        texts = []
+        for content in contents:
+            parts = content.get('parts', []) if isinstance(content, dict) else []
+            texts.extend(part for part in parts if isinstance(part, str))
+        return "\n".join(texts)
+
+    def _answer(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+        module = self.MODULE_PATTERN.search(prompt)
+        if module:
+            return json.dumps({
+                "module": module.group(1),
+                "summary": f"The {module.group(1)} module implements a part of the system.",
+                "key_files": [],
+                "technologies": ["Python"],
+            })
+        if '"learning_path"' in prompt:
+            return json.dumps({
+                "learning_path": [
+                    {
+                        "step": step,
+                        "title": f"Step {step}",
+                        "description": "Read the entry points and follow the main flow.",
+                        "files_to_review": [],
+                        "external_resources": [
+                            {"type": "Official Docs", "suggestion": f"Search for 'synthetic topic {step} documentation'"},
+                            {"type": "YouTube", "suggestion": f"Search for 'synthetic topic {step} tutorial'"},
+                        ],
+                    }
+                    for step in range(1, 4)
+                ],
+                "starter_tasks": [
+                    {"title": "Add a test", "description": "Cover the main flow with a test.", "suggested_files": []},
+                ],
+            })
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        return f"Based on the code, this works as described in the context (answer {digest}). " * 5
+
+    def generate_content(self, contents, **kwargs):
+        prompt = self._prompt_text(contents)
+        if self.latency:
+            time.sleep(self.latency)
+        return _FakeResponse(self._answer(prompt), prompt)
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        prompt = self._prompt_text(contents)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._answer(prompt)
+        if not stream:
+            return _FakeResponse(text, prompt)
+        words = text.split(' ')
+        pieces = [' '.join(words[i:i + self.WORDS_PER_CHUNK]) + ' ' for i in range(0, len(words), self.WORDS_PER_CHUNK)]
+        return _FakeStream([_FakeResponse(piece, prompt) for piece in pieces], self.token_latency)
+
+
+class LatencyStore:
+    """ Wraps a vector store, adding `latency` seconds to each call that would be a round-trip. """
+    ROUND_TRIPS = (
+        'add_texts', 'delete', 'similarity_search', 'similarity_search_with_score',
+        'similarity_search_with_score_by_vector',
+    )
+
+    def __init__(self, store, latency: float):
+        self._store = store
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attribute = getattr(self._store, name)
+        if name not in self.ROUND_TRIPS:
+            return attribute
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            return attribute(*args, **kwargs)
+        return call
+
+
+def install_fakes(embedding_latency: float = 0.0, llm_latency: float = 0.0, llm_token_latency: float = 0.0,
+                  search_latency: float = 0.0, store_latency: float = 0.0) -> dict:
+    """
+    Replaces the embedding model, Gemini model, search backend and (if
+    `store_latency`) vector store handles of the running app with fakes. Returns
+    the fakes, whose call counters can be read afterwards.
+    """
+    from app.core.config import settings
+    from app.services import llm_service
+    from app.services.embedding_cache import CachedEmbeddings, TracedEmbeddings
+    from app.services.vector_store import vector_store_manager
+    from app.tools import google_search
+
+    embeddings = FakeEmbeddings(embedding_latency)
+    traced = TracedEmbeddings(embeddings)
+    if getattr(vector_store_manager, 'embedding_cache', None) is not None:
+        vector_store_manager.embedding_model = CachedEmbeddings(traced, "fake-embedding", vector_store_manager.embedding_cache)
+    else:
+        vector_store_manager.embedding_model = traced
+
+    if store_latency:
+        create = vector_store_manager._handles.factory
+        vector_store_manager._handles.factory = lambda name: LatencyStore(create(name), store_latency)
+
+    model = FakeGeminiModel(llm_latency, llm_token_latency)
+    llm_service.model = model
+
+    search_backend = google_search.FixtureBackend(settings.SEARCH_FIXTURE_PATH, latency=search_latency)
+    google_search.search_service.backend = search_backend
+    return {'embeddings': embeddings, 'llm': model, 'search': search_backend}
@@ -0,0 +1,151 @@
+"""
+Generates synthetic git repositories of a given size and language mix for
+benchmarks: files of functions and classes in each language, grouped into
+nested modules, with a README per module and commit helpers for simulating
+upstream changes.
+"""
+import json
+import os
+import random
+
+import git
+
+# Share of files per language when no mix is given
+DEFAULT_MIX = {'py': 40, 'ts': 20, 'js': 10, 'go': 10, 'java': 5, 'md': 10, 'json': 5}
+
+WORDS = (
+    "account", "batch", "cache", "config", "event", "file", "graph", "index", "job", "key",
+    "list", "message", "node", "order", "page", "query", "record", "session", "task", "user",
+    "value", "worker", "stream", "token", "route", "schema", "model", "policy", "report", "upload",
+)
+VERBS = ("load", "save", "build", "parse", "render", "validate", "merge", "sync", "fetch", "compute")
+
+BODY_LINES = {
+    'py': "    {a} = {b} + len({c})",
+    'ts': "  const {a} = {b} + {c}.length;",
+    'js': "  const {a} = {b} + {c}.length;",
+    'go': "\t{a} := {b} + len({c})",
+    'java': "        int {a} = {b} + {c}.size();",
+}
+
+ACTOR = git.Actor("Benchmark", "benchmark@example.com")
+
+
+def parse_mix(text: str) -> dict:
+    """ Parses "py=40,ts=20,md=10" into {language: weight}. """
+    mix = {}
+    for item in text.split(','):
+        language, _, weight = item.partition('=')
+        if language.strip():
+            mix[language.strip()] = float(weight or 1)
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise ValueError(f"Unknown languages in mix: {sorted(unknown)}; choose from {sorted(DEFAULT_MIX)}.")
+    return mix
+
+
+def _identifier(rng: random.Random, style: str) -> str:
+    verb, first, second = rng.choice(VERBS), rng.choice(WORDS), rng.choice(WORDS)
+    if style == 'snake':
+        return f"{verb}_{first}_{second}"
+    return f"{verb}{first.capitalize()}{second.capitalize()}"
+
+
+def _body(rng: random.Random, language: str, lines: int) -> list:
+    template = BODY_LINES[language]
+    return [template.format(a=f"{rng.choice(WORDS)}{i}", b=rng.randint(0, 99), c=rng.choice(WORDS)) for i in range(lines)]
+
+
+def _source(rng: random.Random, language: str, functions: int, symbols: list) -> str:
+    lines = []
+    for _ in range(functions):
+        body = _body(rng, language, rng.randint(3, 25))
+        if language == 'py':
+            name = _identifier(rng, 'snake')
+            if rng.random() < 0.3:
+                class_name = f"{rng.choice(WORDS).capitalize()}{rng.choice(WORDS).capitalize()}Service"
+                lines += [f"class {class_name}:", f'    """ Handles {name.replace("_", " ")}. """', f"    def {name}(self, items):"]
+                lines += ["    " + line for line in body] + ["        return items", ""]
+                symbols.append(class_name)
+            else:
+                lines += [f"def {name}(items):", f'    """ {name.replace("_", " ").capitalize()}. """'] + body + ["    return items", ""]
+        elif language in ('ts', 'js'):
+            name = _identifier(rng, 'camel')
+            signature = f"export function {name}(items: string[]): number {{" if language == 'ts' else f"export function {name}(items) {{"
+            lines += [f"// {name} for the {rng.choice(WORDS)} flow", signature] + body + ["  return items.length;", "}", ""]
+        elif language == 'go':
+            name = _identifier(rng, 'camel')
+            name = name[0].upper() + name[1:]
+            lines += [f"// {name} processes items.", f"func {name}(items []string) int {{"] + body + ["\treturn len(items)", "}", ""]
+        elif language == 'java':
+            name = _identifier(rng, 'camel')
+            lines += [f"    public int {name}(List<String> items) {{"] + body + ["        return items.size();", "    }", ""]
+        symbols.append(name)
+    if language == 'java':
+        lines = ["import java.util.List;", "", f"public class {rng.choice(WORDS).capitalize()}Handler {{"] + lines + ["}"]
+    if language == 'go':
+        lines = ["package main", ""] + lines
+    return "\n".join(lines) + "\n"
+
+
+def _markdown(rng: random.Random, module: str, symbols: list) -> str:
+    sections = [f"# {module}", "", f"The {module} module handles {rng.choice(WORDS)} and {rng.choice(WORDS)} processing.", ""]
+    for symbol in symbols[-5:]:
+        sections += [f"## {symbol}", "", f"`{symbol}` is called when a {rng.choice(WORDS)} changes.", ""]
+    return "\n".join(sections)
+
+
+def _extension(language: str) -> str:
+    return f".{language}"
+
+
+def generate_repo(root: str, files: int, mix: dict = None, seed: int = 0) -> dict:
+    """
+    Writes a repository of `files` files at `root` and commits it. Returns a summary
+    with the file count, total bytes and the function/class names defined, which
+    make natural chat queries.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    languages, weights = list(mix), list(mix.values())
+    modules = [f"{rng.choice(WORDS)}_{i}" for i in range(max(2, files // 25))]
+    symbols, total_bytes = [], 0
+    for i in range(files):
+        language = rng.choices(languages, weights)[0]
+        module = modules[i % len(modules)]
+        directory = os.path.join(root, "src", module) if language != 'md' else os.path.join(root, "docs")
+        os.makedirs(directory, exist_ok=True)
+        if language == 'md':
+            content = _markdown(rng, module, symbols)
+        elif language == 'json':
+            content = json.dumps({rng.choice(WORDS): {"enabled": True, "limit": rng.randint(1, 100)} for _ in range(8)}, indent=2)
+        else:
+            # Mostly small files with a long tail of larger ones
+            content = _source(rng, language, min(int(rng.paretovariate(1.5) * 3), 60), symbols)
+        path = os.path.join(directory, f"{rng.choice(WORDS)}_{i}{_extension(language)}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        total_bytes += len(content)
+
+    repo = git.Repo.init(root)
+    repo.git.add(A=True)
+    repo.index.commit("Initial commit", author=ACTOR, committer=ACTOR)
+    return {'files': files, 'bytes': total_bytes, 'symbols': symbols}
+
+
+def commit_changes(root: str, count: int, seed: int = 0) -> list:
+    """ Appends a function to `count` source files and commits, like an upstream change. Returns the paths. """
+    rng = random.Random(seed)
+    repo = git.Repo(root)
+    sources = sorted(
+        item.path for item in repo.head.commit.tree.traverse()
+        if item.type == 'blob' and os.path.splitext(item.path)[1] in ('.py', '.ts', '.js')
+    )
+    changed = rng.sample(sources, min(count, len(sources)))
+    for path in changed:
+        language = os.path.splitext(path)[1][1:]
+        with open(os.path.join(root, path), 'a', encoding='utf-8') as f:
+            f.write(_source(rng, language, 1, []))
+    repo.git.add(A=True)
+    repo.index.commit(f"Change {len(changed)} files", author=ACTOR, committer=ACTOR)
+    return changed
@@ -0,0 +1,22 @@
+# backend/gunicorn.conf.py
+"""
+Gunicorn settings for production (see the Dockerfile). Every value can be
+overridden on the command line.
+
+With GUNICORN_PRELOAD=true the master imports the app and the slow third-party
+client libraries once, before forking, so workers start faster and share that
+memory copy-on-write. Clients, connections and files are only opened in the
+workers (lazily, or by the warm-up in the app's lifespan), so this is fork-safe.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+
+def on_starting(server):
+    if preload_app:
+        from app.services.warmup import preload_modules
+        preload_modules()
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Settings are read at import time: keep the app's local state (manifests, caches,
+# stores) out of the working tree
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="ccoa-tests-"))
@@ -0,0 +1,104 @@
+import math
+
+import pytest
+
+from app.services import answer_cache as answer_cache_module
+from app.services.answer_cache import AnswerCache, normalize_query
+
+
+class Clock:
+    """ Stands in for the time module: each reading is a second after the last. """
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def open_cache(tmp_path, clock):
+    """ Opens the cache file; each call is a fresh instance, as in another worker. """
+    return lambda max_entries=10: AnswerCache(str(tmp_path / "answers.sqlite3"), max_entries, threshold=0.9, ttl_seconds=3600)
+
+
+def _at(cosine: float) -> list:
+    """ A unit vector at the given cosine similarity to [1, 0]. """
+    return [cosine, math.sqrt(1 - cosine ** 2)]
+
+
+def _store(cache: AnswerCache, query: str, answer: str, vector=None):
+    lookup = cache.lookup("shop", query)
+    assert lookup.answer is None
+    if vector is not None:
+        assert cache.lookup_similar(lookup, vector) is None
+    cache.store(lookup, {'answer': answer})
+
+
+def test_normalize_query():
+    assert normalize_query("  How does   Login work?? ") == "how does login work"
+
+
+def test_exact_match_hits_after_normalization(open_cache):
+    _store(open_cache(), "How does login work?", "Via OAuth.")
+
+    lookup = open_cache().lookup("shop", "how does login   work")
+    assert lookup.answer == {'answer': "Via OAuth."}
+    assert open_cache().lookup("other", "How does login work?").answer is None
+
+
+def test_similar_question_hits_at_the_threshold(open_cache):
+    cache = open_cache()
+    _store(cache, "How does login work?", "Via OAuth.", vector=[2.0, 0.0])
+
+    # Vectors are normalized, and a question only hits at or above the threshold
+    assert cache.lookup_similar(cache.lookup("shop", "Explain the login flow"), _at(0.91)) == {'answer': "Via OAuth."}
+    assert cache.lookup_similar(cache.lookup("shop", "Explain the logout flow"), _at(0.89)) is None
+    # Another worker sees the cached question embedding too
+    other = open_cache()
+    assert other.lookup_similar(other.lookup("shop", "Walk me through login"), _at(0.95)) == {'answer': "Via OAuth."}
+
+
+def test_reingest_retires_cached_and_in_flight_answers(open_cache):
+    cache = open_cache()
+    _store(cache, "How does login work?", "Via OAuth.", vector=[1.0, 0.0])
+    in_flight = cache.lookup("shop", "Where is the config?")
+
+    open_cache().invalidate("shop")
+
+    assert cache.lookup("shop", "How does login work?").answer is None
+    assert cache.lookup_similar(cache.lookup("shop", "Explain login"), [1.0, 0.0]) is None
+    # An answer generated from the old index isn't cached
+    cache.store(in_flight, {'answer': "In settings.py."})
+    assert cache.lookup("shop", "Where is the config?").answer is None
+    # Answers generated after the re-ingest are
+    _store(cache, "Where is the config?", "In config.py.")
+    assert cache.lookup("shop", "Where is the config?").answer == {'answer': "In config.py."}
+
+
+def test_least_recently_used_answer_is_evicted(open_cache):
+    cache = open_cache(max_entries=2)
+    _store(cache, "first", "1")
+    _store(cache, "second", "2")
+    assert cache.lookup("shop", "first").answer == {'answer': "1"}
+
+    _store(cache, "third", "3")
+    assert cache.lookup("shop", "second").answer is None
+    assert cache.lookup("shop", "first").answer == {'answer': "1"}
+    assert cache.lookup("shop", "third").answer == {'answer': "3"}
+
+
+def test_answers_expire(open_cache, clock):
+    cache = open_cache()
+    _store(cache, "How does login work?", "Via OAuth.", vector=[1.0, 0.0])
+    clock.now += 3600
+
+    assert cache.lookup("shop", "How does login work?").answer is None
+    assert cache.lookup_similar(cache.lookup("shop", "Explain login"), [1.0, 0.0]) is None
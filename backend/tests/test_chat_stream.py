@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1 import onboarding
+from app.main import app
+from app.models.schemas import ChatRequest
+from app.services import llm_service
+from app.services.answer_cache import AnswerCache
+from app.services.prompt_builder import pack_context
+
+CHUNK = {'file_path': 'app/main.py', 'chunk_id': 'c1', 'start_line': 1, 'end_line': 3, 'chunk_index': 0}
+
+
+def _parse_events(body: str) -> list:
+    """ Splits an SSE body into (event, data) pairs, checking each block's framing. """
+    assert body.endswith("\n\n")
+    events = []
+    for block in body[:-2].split("\n\n"):
+        event_line, data_line = block.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+class Generation:
+    """ Stands in for the model's token stream, recording how far it got and whether it was closed. """
+    def __init__(self, texts: list, error: Exception = None):
+        self.texts = texts
+        self.error = error
+        self.sent = 0
+        self.closed = False
+
+    async def __call__(self, query, documents, metadatas):
+        try:
+            for text in self.texts:
+                self.sent += 1
+                yield text
+            if self.error:
+                raise self.error
+        finally:
+            self.closed = True
+
+
+class Disconnecting:
+    """ The parts of a Starlette request the stream reads; disconnects after `polls` checks. """
+    def __init__(self, polls: int):
+        self.headers = {}
+        self.polls = polls
+
+    async def is_disconnected(self) -> bool:
+        self.polls -= 1
+        return self.polls < 0
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), max_entries=10, threshold=0.95, ttl_seconds=3600)
+    monkeypatch.setattr(onboarding, 'answer_cache', cache)
+    context = pack_context(["def main():\n    return 1\n"], [CHUNK], 1000)
+    monkeypatch.setattr(onboarding, '_retrieve_context', lambda collection_name, query: (context, None))
+    return cache
+
+
+def _generate(monkeypatch, generation: Generation) -> Generation:
+    monkeypatch.setattr(llm_service, 'stream_chat_response', generation)
+    return generation
+
+
+def test_stream_frames_provenance_tokens_and_done(cache, monkeypatch):
+    _generate(monkeypatch, Generation(["It returns ", "1."]))
+    client = TestClient(app)
+    response = client.post("/api/v1/chat/stream", json={'session_id': "shop", 'query': "What does main return?"})
+
+    assert response.headers['content-type'].startswith("text/event-stream")
+    assert response.headers['cache-control'] == "no-cache"
+    assert response.headers['x-accel-buffering'] == "no"
+    events = _parse_events(response.text)
+    assert [event for event, _ in events] == ["provenance", "token", "token", "done"]
+    assert events[0][1] == [{'file_path': 'app/main.py', 'chunk_id': 'c1', 'start_line': 1, 'end_line': 3}]
+    assert [data['text'] for event, data in events if event == "token"] == ["It returns ", "1."]
+    assert events[-1][1] == {'cached': False}
+
+    # The complete answer was cached, and a repeat is served from the cache in one go
+    repeat = _parse_events(client.post("/api/v1/chat/stream", json={'session_id': "shop", 'query': "What does main return"}).text)
+    assert repeat == [events[0], ("token", {'text': "It returns 1."}), ("done", {'cached': True})]
+
+
+def test_failed_generation_ends_with_an_error_event(cache, monkeypatch):
+    _generate(monkeypatch, Generation(["It returns "], error=RuntimeError("quota exceeded")))
+    events = _parse_events(TestClient(app).post("/api/v1/chat/stream", json={'session_id': "shop", 'query': "Why?"}).text)
+
+    assert [event for event, _ in events] == ["provenance", "token", "error"]
+    assert events[-1][1] == {'detail': "quota exceeded"}
+    assert cache.lookup("shop", "Why?").answer is None
+
+
+def test_disconnect_cancels_generation(cache, monkeypatch):
+    generation = _generate(monkeypatch, Generation(["one ", "two ", "three ", "four"]))
+
+    async def stream() -> str:
+        response = await onboarding.stream_chat_with_repo(
+            ChatRequest(session_id="shop", query="Count to four"), Disconnecting(polls=1)
+        )
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    events = _parse_events(asyncio.run(stream()))
+    # The client went away after the first token: the next is dropped, the model stream
+    # closed, and nothing cached
+    assert [event for event, _ in events] == ["provenance", "token"]
+    assert generation.sent == 2 and generation.closed
+    assert cache.lookup("shop", "Count to four").answer is None
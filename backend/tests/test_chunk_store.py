@@ -0,0 +1,138 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.core.config import settings
+from app.services import chunk_store as chunk_store_module
+from app.services import ingestion
+from app.services.chunk_store import CODEC_ZLIB, ChunkStore, chunk_id
+
+needs_zstd = pytest.mark.skipif(chunk_store_module.zstandard is None, reason="zstandard is not installed")
+
+
+def _function(name: str, lines: int = 40) -> str:
+    # Big enough that the chunker keeps each function in a chunk of its own
+    body = ''.join(f"    total += {name}_step_{i}(items)\n" for i in range(lines))
+    return f"def {name}(items):\n    total = 0\n{body}    return total\n"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "chunks.sqlite3")
+
+
+def test_put_and_get_round_trip(path):
+    ChunkStore(path).put(
+        "shop", ["a", "b"], ["def a(): pass", "def b(): pass"],
+        [{'file_path': 'a.py', 'start_line': 1, 'end_line': 1, 'symbols': 'a'}, {'file_path': 'b.py'}],
+    )
+
+    found = ChunkStore(path).get_many("shop", ["a", "b", "missing"])
+    assert found == {
+        'a': ("def a(): pass", {'file_path': 'a.py', 'start_line': 1, 'end_line': 1, 'symbols': 'a'}),
+        'b': ("def b(): pass", {'file_path': 'b.py'}),
+    }
+    # Collections are kept apart
+    assert ChunkStore(path).get_many("other", ["a"]) == {}
+
+
+def test_put_replaces_chunks_with_the_same_id(path):
+    store = ChunkStore(path)
+    store.put("shop", ["a"], ["old"], [{'file_path': 'a.py'}])
+    store.put("shop", ["a"], ["new"], [{'file_path': 'a.py'}])
+    assert store.get_many("shop", ["a"])['a'][0] == "new"
+
+
+def test_find_returns_chunks_overlapping_a_line_range(path):
+    store = ChunkStore(path)
+    store.put(
+        "shop", ["first", "second", "third"], ["one", "two", "three"],
+        [{'file_path': 'a.py', 'start_line': start, 'end_line': start + 9} for start in (1, 11, 21)],
+    )
+    assert [chunk for chunk, _, _ in store.find("shop", 'a.py', 8, 12)] == ["first", "second"]
+    assert [chunk for chunk, _, _ in store.find("shop", 'a.py', start_line=15)] == ["second", "third"]
+    assert store.find("shop", 'b.py') == []
+
+
+def test_shared_texts_are_stored_once_and_kept_while_referenced(path):
+    store = ChunkStore(path)
+    store.put("shop", ["a", "b"], ["same text", "same text"], [{'file_path': 'a.py'}, {'file_path': 'b.py'}])
+    store.put("fork", ["a"], ["same text"], [{'file_path': 'a.py'}])
+    blobs = lambda: store._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+    assert blobs() == 1
+
+    store.delete("shop", ["a", "b"])
+    assert store.get_many("shop", ["a", "b"]) == {}
+    assert store.get_many("fork", ["a"])['a'][0] == "same text"
+    assert blobs() == 1
+    store.delete("fork", ["a"])
+    assert blobs() == 0
+
+
+def test_zlib_store_round_trip(path, monkeypatch):
+    monkeypatch.setattr(chunk_store_module, 'zstandard', None)
+    store = ChunkStore(path)
+    assert store.codec == CODEC_ZLIB
+    store.put("shop", ["a"], ["def a(): pass"], [{'file_path': 'a.py'}])
+    assert store.get_many("shop", ["a"])['a'][0] == "def a(): pass"
+
+
+@needs_zstd
+def test_dictionary_is_trained_and_reloaded(path, monkeypatch):
+    monkeypatch.setattr(chunk_store_module, 'DICTIONARY_TRAIN_BLOBS', 200)
+    monkeypatch.setattr(chunk_store_module, 'DICTIONARY_BYTES', 8 * 1024)
+    texts = [_function(f"handler_{i}", lines=5 + i % 7) for i in range(250)]
+    ids = [f"chunk-{i}" for i in range(len(texts))]
+    store = ChunkStore(path)
+    # The first batch is stored without a dictionary, then recompressed once one is trained
+    store.put("shop", ids[:200], texts[:200], [{'file_path': 'handlers.py'}] * 200)
+    store.put("shop", ids[200:], texts[200:], [{'file_path': 'handlers.py'}] * 50)
+
+    assert store._conn.execute("SELECT COUNT(*) FROM dictionaries").fetchone()[0] == 1
+    assert store._conn.execute("SELECT COUNT(*) FROM blobs WHERE dictionary IS NULL").fetchone()[0] == 0
+    found = ChunkStore(path).get_many("shop", ids)
+    assert [found[chunk][0] for chunk in ids] == texts
+
+
+def test_chunk_ids_hash_file_text_and_occurrence():
+    assert chunk_id('a.py', "x = 1") == chunk_id('a.py', "x = 1", 0)
+    assert len({chunk_id('a.py', "x = 1"), chunk_id('b.py', "x = 1"), chunk_id('a.py', "x = 2"),
+                chunk_id('a.py', "x = 1", 1)}) == 4
+
+
+def test_chunk_ids_are_stable_across_processes():
+    # Unlike hash(), the ID must not depend on the interpreter's hash seed
+    script = "from app.services.chunk_store import chunk_id; print(chunk_id('a.py', 'x = 1'))"
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ids = {
+        subprocess.run(
+            [sys.executable, "-c", script], cwd=backend_dir, capture_output=True, text=True, check=True,
+            env={**os.environ, 'PYTHONHASHSEED': seed},
+        ).stdout.strip()
+        for seed in ("1", "2")
+    }
+    assert ids == {chunk_id('a.py', 'x = 1')}
+
+
+def _ingested_ids(repo_path: str) -> dict:
+    ids = {}
+    for documents, metadatas, batch_ids in ingestion.iter_document_batches(repo_path, ['app.py']):
+        ids.update(zip(batch_ids, documents))
+    return ids
+
+
+def test_chunk_ids_survive_edits_elsewhere_in_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'INGEST_WORKERS', 1)
+    source = tmp_path / "app.py"
+    source.write_text(_function("load") + "\n\n" + _function("save"))
+    before = _ingested_ids(str(tmp_path))
+    assert len(before) == 2
+    assert _ingested_ids(str(tmp_path)) == before
+
+    # An edit to `load` shifts `save` down a line but leaves its text as it was
+    source.write_text(_function("load", lines=41) + "\n\n" + _function("save"))
+    after = _ingested_ids(str(tmp_path))
+    assert len(set(before) & set(after)) == 1
+    assert before[next(iter(set(before) & set(after)))].startswith("def save")
@@ -0,0 +1,112 @@
+from app.services.chunking import CHUNK_SIZE, chunk_file
+
+
+def _assert_line_ranges(content: str, chunks: list):
+    """ Every chunk is exactly the lines its range names, in file order without overlaps. """
+    lines = content.split("\n")
+    previous_end = 0
+    for chunk in chunks:
+        assert chunk['text'] == "\n".join(lines[chunk['start_line'] - 1:chunk['end_line']])
+        assert previous_end < chunk['start_line'] <= chunk['end_line']
+        assert len(chunk['text']) <= CHUNK_SIZE
+        previous_end = chunk['end_line']
+
+
+def _covered_lines(chunks: list) -> set:
+    return {line for chunk in chunks for line in range(chunk['start_line'], chunk['end_line'] + 1)}
+
+
+def _python_module(functions: int, body_lines: int = 3) -> str:
+    parts = ['"""Module docstring."""', "import os", ""]
+    for i in range(functions):
+        parts += ["", f"# Helper number {i}", "@decorator", f"def function_{i}(value):"]
+        parts += [f"    value = value + {line}  # step {line}" for line in range(body_lines)]
+        parts += ["    return value"]
+    return "\n".join(parts) + "\n"
+
+
+def test_empty_file_has_no_chunks():
+    assert chunk_file('empty.py', "") == []
+    assert chunk_file('blank.md', "\n\n  \n") == []
+
+
+def test_small_python_file_is_one_chunk_with_its_symbols():
+    content = _python_module(3)
+    [chunk] = chunk_file('app/module.py', content)
+    _assert_line_ranges(content, [chunk])
+    assert chunk['start_line'] == 1
+    assert chunk['symbols'] == ['function_0', 'function_1', 'function_2']
+
+
+def test_large_python_file_splits_on_definitions():
+    content = _python_module(60)
+    lines = content.split("\n")
+    chunks = chunk_file('app/module.py', content)
+
+    assert len(chunks) > 1
+    _assert_line_ranges(content, chunks)
+    # Nothing but blank lines is left out
+    missing = set(range(1, len(lines) + 1)) - _covered_lines(chunks)
+    assert all(not lines[number - 1].strip() for number in missing)
+    for chunk in chunks[1:]:
+        # Each chunk starts with a definition's leading comment, not mid-function
+        assert chunk['text'].startswith("# Helper number")
+
+
+def test_oversized_class_is_split_into_its_methods():
+    methods = []
+    for i in range(40):
+        methods += [f"    def method_{i}(self):", f"        return self.compute({i}, 'padding padding padding')", ""]
+    content = "class Service:\n    \"\"\"Does things.\"\"\"\n\n" + "\n".join(methods)
+    chunks = chunk_file('service.py', content)
+
+    assert len(chunks) > 1
+    _assert_line_ranges(content, chunks)
+    assert chunks[0]['symbols'][0] == 'Service'
+    symbols = [symbol for chunk in chunks for symbol in chunk['symbols']]
+    assert 'Service.method_0' in symbols and 'Service.method_39' in symbols
+
+
+def test_regex_languages_attach_leading_comments():
+    declarations = []
+    for i in range(30):
+        declarations += [f"// Renders widget {i}", f"export function widget{i}(props) {{"]
+        declarations += [f"  const value = props.items.map((item) => item * {line});" for line in range(4)]
+        declarations += ["  return value;", "}", ""]
+    content = "import React from 'react';\n\n" + "\n".join(declarations)
+    chunks = chunk_file('src/widgets.jsx', content)
+
+    assert len(chunks) > 1
+    _assert_line_ranges(content, chunks)
+    assert chunks[0]['start_line'] == 1
+    for chunk in chunks[1:]:
+        assert chunk['text'].startswith("// Renders widget")
+    assert 'widget29' in chunks[-1]['symbols']
+
+
+def test_markdown_splits_on_headings():
+    sections = [f"## Section {i}\n\n" + ("Some prose about the section. " * 20 + "\n") * 3 for i in range(8)]
+    content = "# Title\n\n" + "\n".join(sections)
+    chunks = chunk_file('docs/README.md', content)
+
+    _assert_line_ranges(content, chunks)
+    assert 'Section 7' in chunks[-1]['symbols']
+
+
+def test_fallback_chunks_report_where_their_text_starts():
+    content = "\n".join(f'  "key_{i}": "value number {i} with some padding text",' for i in range(300))
+    chunks = chunk_file('data/config.json', content)
+    lines = content.split("\n")
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        first_line = chunk['text'].split("\n")[0]
+        assert first_line in lines[chunk['start_line'] - 1]
+        assert chunk['end_line'] == chunk['start_line'] + chunk['text'].count("\n")
+    assert chunks[-1]['end_line'] == len(lines)
+
+
+def test_python_that_does_not_parse_falls_back():
+    content = "def broken(:\n" + "    pass\n" * 10
+    chunks = chunk_file('broken.py', content)
+    assert chunks and chunks[0]['start_line'] == 1 and chunks[0]['symbols'] == []
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from app.services import embedding_cache as embedding_cache_module
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache, track_cache_stats
+
+
+class Clock:
+    """ Stands in for the time module: each reading is a second after the last. """
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        self.now += 1
+        return self.now
+
+
+class CountingEmbeddings:
+    """ Embeds each text as [len(text), 1, 2, 3], counting the texts it was sent. """
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 2.0, 3.0] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [float(len(text)), -1.0, -2.0, -3.0]
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "embeddings.sqlite3")
+
+
+def _key(text: str) -> bytes:
+    return EmbeddingCache.make_key("model", 'document', text)
+
+
+def test_vectors_round_trip_as_float32(path):
+    vector = [0.1, -2.5, 1e-8, 3.0]
+    EmbeddingCache(path, max_bytes=1 << 20).put_many({_key("a"): vector})
+
+    cache = EmbeddingCache(path, max_bytes=1 << 20)
+    assert cache.get_many([_key("a"), _key("missing")]) == {_key("a"): np.array(vector, dtype=np.float32).tolist()}
+    # Four bytes per dimension
+    assert cache._stored_bytes() == 4 * len(vector)
+
+
+def test_least_recently_used_vectors_are_evicted(path):
+    # Room for four 4-dimensional vectors
+    cache = EmbeddingCache(path, max_bytes=4 * 16)
+    for text in "abcd":
+        cache.put_many({_key(text): [1.0, 2.0, 3.0, 4.0]})
+    cache.get_many([_key("a")])
+
+    # Over budget: evicted down to 90% of it, least recently used first
+    cache.put_many({_key("e"): [1.0, 2.0, 3.0, 4.0]})
+    assert set(cache.get_many([_key(text) for text in "abcde"])) == {_key("a"), _key("d"), _key("e")}
+    assert cache._bytes == cache._stored_bytes() == 3 * 16
+
+
+def test_cached_embeddings_embed_each_text_once(path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, "model", EmbeddingCache(path, max_bytes=1 << 20))
+
+    with track_cache_stats() as stats:
+        first = embeddings.embed_documents(["one", "three", "one"])
+        second = embeddings.embed_documents(["three", "five"])
+    assert model.embedded == ["one", "three", "five"]
+    assert first == [[3.0, 1.0, 2.0, 3.0], [5.0, 1.0, 2.0, 3.0], [3.0, 1.0, 2.0, 3.0]]
+    assert second[0] == first[1]
+    assert (stats.hits, stats.misses) == (2, 3)
+
+
+def test_queries_and_documents_are_cached_apart(path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, "model", EmbeddingCache(path, max_bytes=1 << 20))
+    embeddings.embed_documents(["login"])
+
+    assert embeddings.embed_query("login") == [5.0, -1.0, -2.0, -3.0]
+    assert embeddings.embed_query("login") == [5.0, -1.0, -2.0, -3.0]
+    assert model.embedded == ["login", "login"]
+    # Another model's vectors are never reused
+    other = CachedEmbeddings(model, "other-model", embeddings.cache)
+    other.embed_documents(["login"])
+    assert model.embedded == ["login", "login", "login"]
@@ -0,0 +1,174 @@
+import threading
+import time
+
+import pytest
+
+from app.services.embedding_writer import BatchCheckpoint, EmbeddingWriter, TokenBucket
+
+
+class FakeEmbeddings:
+    """ Deterministic embedding model that counts the texts it embeds. """
+    def __init__(self):
+        self.embedded = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: list) -> list:
+        with self._lock:
+            self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class InMemoryStore:
+    """
+    Upserts embedded chunks into a dict. `fail(n, when)` makes the next n writes
+    whose ids satisfy `when` raise, as a flaky API would.
+    """
+    def __init__(self, embeddings: FakeEmbeddings):
+        self.embeddings = embeddings
+        self.rows = {}
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._failures = 0
+        self._fails_when = None
+        self._lock = threading.Lock()
+
+    def fail(self, times: int, when=lambda ids: True):
+        self._failures, self._fails_when = times, when
+
+    def add_texts(self, documents: list, metadatas: list, ids: list):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            failing = self._failures and self._fails_when(ids)
+            if failing:
+                self._failures -= 1
+        try:
+            if failing:
+                raise ConnectionError("429 Resource exhausted")
+            time.sleep(0.005)
+            vectors = self.embeddings.embed_documents(documents)
+            with self._lock:
+                self.rows.update(zip(ids, zip(documents, metadatas, vectors)))
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _batches(count: int, size: int = 10):
+    chunks = [(f"chunk {i}", {'file_path': f"f{i // 10}.py"}, f"id{i}") for i in range(count)]
+    for start in range(0, count, size):
+        group = chunks[start:start + size]
+        yield [c[0] for c in group], [c[1] for c in group], [c[2] for c in group]
+
+
+def _writer(store: InMemoryStore, **options) -> EmbeddingWriter:
+    options = {'batch_size': 10, 'concurrency': 2, 'backoff_seconds': 0.0, **options}
+    return EmbeddingWriter(store.add_texts, **options)
+
+
+@pytest.fixture
+def store():
+    return InMemoryStore(FakeEmbeddings())
+
+
+def test_token_bucket_without_rate_never_waits():
+    bucket = TokenBucket(0)
+    started = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire(100)
+    assert time.monotonic() - started < 0.1
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(100, capacity=10)
+    bucket.acquire(10)
+    started = time.monotonic()
+    # The bucket is empty: 5 more tokens take 50 ms to refill
+    bucket.acquire(5)
+    assert time.monotonic() - started >= 0.04
+
+
+def test_token_bucket_caps_oversized_requests():
+    bucket = TokenBucket(1000, capacity=5)
+    started = time.monotonic()
+    bucket.acquire(50)
+    assert time.monotonic() - started < 0.1
+
+
+def test_writes_every_chunk_in_batches(store):
+    stats = _writer(store, batch_size=4).write(_batches(25))
+
+    assert len(store.rows) == 25
+    assert store.rows['id7'][0] == "chunk 7"
+    # Producer batches of 10, 10 and 5 are re-split into batches of at most 4
+    assert stats.batches_written == store.calls == 8
+    assert stats.chunks_written == 25
+    assert stats.retries == 0
+
+
+def test_concurrency_is_bounded(store):
+    _writer(store, batch_size=2, concurrency=3).write(_batches(40))
+    assert 1 < store.max_active <= 3
+
+
+def test_rate_limiter_counts_chunks(store):
+    limiter = TokenBucket(400, capacity=10)
+    started = time.monotonic()
+    _writer(store, rate_limiter=limiter).write(_batches(30))
+    # 10 chunks come from the full bucket; the other 20 refill at 400 chunks/s
+    assert time.monotonic() - started >= 0.045
+
+
+def test_retries_transient_failures(store):
+    store.fail(2)
+    stats = _writer(store, max_retries=3).write(_batches(20))
+
+    assert stats.retries == 2
+    assert stats.batches_written == 2
+    assert len(store.rows) == 20
+
+
+def test_raises_when_retries_are_exhausted(store):
+    store.fail(10, when=lambda ids: 'id10' in ids)
+    with pytest.raises(ConnectionError):
+        _writer(store, concurrency=1, max_retries=2).write(_batches(30))
+    # The first attempt and two retries
+    assert store.calls >= 3
+    assert 'id10' not in store.rows
+
+
+def test_resume_skips_batches_already_written(store, tmp_path):
+    path = str(tmp_path / "checkpoint.txt")
+    # The third batch fails for good, ending the first run
+    store.fail(1, when=lambda ids: 'id20' in ids)
+    with pytest.raises(ConnectionError):
+        _writer(store, concurrency=1, max_retries=0).write(_batches(50), checkpoint=BatchCheckpoint(path))
+    written = set(store.rows)
+    assert {'id0', 'id19'} <= written and 'id20' not in written
+
+    store.embeddings.embedded.clear()
+    checkpoint = BatchCheckpoint(path)
+    assert len(checkpoint) == len(written) // 10
+    stats = _writer(store, concurrency=1).write(_batches(50), checkpoint=checkpoint)
+
+    assert stats.batches_skipped == len(written) // 10
+    assert stats.chunks_skipped == len(written)
+    assert stats.chunks_written == 50 - len(written)
+    assert len(store.rows) == 50
+    # Skipped batches are not embedded again
+    assert not written & {f"id{text.split()[1]}" for text in store.embeddings.embedded}
+
+
+def test_checkpoint_keys_depend_on_content(tmp_path):
+    documents, metadatas, ids = next(_batches(10))
+    key = BatchCheckpoint.batch_key(documents, metadatas, ids)
+    assert key == BatchCheckpoint.batch_key(list(documents), list(metadatas), list(ids))
+    assert key != BatchCheckpoint.batch_key(["changed"] + documents[1:], metadatas, ids)
+
+    checkpoint = BatchCheckpoint(str(tmp_path / "checkpoint.txt"))
+    checkpoint.mark(key)
+    assert BatchCheckpoint(checkpoint.path).contains(key)
+    checkpoint.clear()
+    assert not BatchCheckpoint(checkpoint.path).contains(key)
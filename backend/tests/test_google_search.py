@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app.tools.google_search import FixtureBackend, SearchError, SearchService, normalize_query
+
+FIXTURE = {
+    "FastAPI dependency injection": [
+        {"title": "Dependencies - FastAPI", "link": "https://fastapi.tiangolo.com/tutorial/dependencies/", "snippet": "..."},
+        {"title": "Advanced Dependencies", "link": "https://fastapi.tiangolo.com/advanced/", "snippet": "...", "extra": 1},
+    ],
+}
+
+
+class FailingBackend(FixtureBackend):
+    """ Fails the first `failures` searches. """
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def search(self, query: str, num_results: int) -> list:
+        if self.failures:
+            self.failures -= 1
+            self.calls += 1
+            raise ConnectionError("upstream unavailable")
+        return await super().search(query, num_results)
+
+
+@pytest.fixture
+def fixture_path(tmp_path):
+    path = tmp_path / "search_fixture.json"
+    path.write_text(json.dumps(FIXTURE))
+    return str(path)
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def make(backend, max_entries: int = 100, ttl_seconds: float = 60, timeout: float = 5, max_concurrency: int = 8):
+        service = SearchService(backend, max_entries, ttl_seconds, timeout, max_concurrency)
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        if service.enabled:
+            service.close()
+
+
+def test_normalize_query():
+    assert normalize_query('  "FastAPI"   Dependency\tinjection ') == "fastapi dependency injection"
+
+
+def test_fixture_lookup_ignores_case_quotes_and_spacing(fixture_path, make_service):
+    service = make_service(FixtureBackend(fixture_path))
+    results = service.search_sync('fastapi  "dependency" injection')
+
+    assert [result["title"] for result in results] == ["Dependencies - FastAPI", "Advanced Dependencies"]
+    # Only title, link and snippet are passed on
+    assert set(results[1]) == {"title", "link", "snippet"}
+    assert len(service.search_sync("FastAPI dependency injection", num_results=1)) == 1
+
+
+def test_fixture_makes_up_a_result_for_unknown_queries(fixture_path, make_service):
+    [result] = make_service(FixtureBackend(fixture_path)).search_sync("rust borrow checker")
+    assert result["link"] == "https://www.google.com/search?q=rust+borrow+checker"
+
+
+def test_results_are_memoized_by_normalized_query(make_service):
+    backend = FixtureBackend()
+    service = make_service(backend)
+    first = service.search_sync("Python asyncio")
+    assert service.search_sync("  python ASYNCIO ") == first
+
+    assert backend.calls == 1
+    assert service.stats()["hits"] == 1
+
+
+def test_memoized_results_expire(make_service):
+    backend = FixtureBackend()
+    service = make_service(backend, ttl_seconds=0.05)
+    service.search_sync("python asyncio")
+    time.sleep(0.1)
+    service.search_sync("python asyncio")
+    assert backend.calls == 2
+
+
+def test_cache_evicts_least_recently_used(make_service):
+    backend = FixtureBackend()
+    service = make_service(backend, max_entries=2)
+    for query in ("a", "b", "a", "c"):
+        service.search_sync(query)
+    assert backend.calls == 3
+
+    service.search_sync("a")  # still cached: used more recently than "b"
+    assert backend.calls == 3
+    service.search_sync("b")
+    assert backend.calls == 4
+
+
+def test_search_many_fans_out_concurrently(make_service):
+    backend = FixtureBackend(latency=0.2)
+    service = make_service(backend)
+    queries = [f"query {i}" for i in range(5)]
+
+    started = time.monotonic()
+    results = service.search_many_sync(queries + ["query 0"])
+    elapsed = time.monotonic() - started
+
+    assert list(results) == queries
+    assert backend.calls == 5
+    # Five searches of 0.2s each, run at the same time
+    assert elapsed < 0.6
+
+
+def test_search_many_respects_max_concurrency(make_service):
+    backend = FixtureBackend(latency=0.1)
+    service = make_service(backend, max_concurrency=2)
+    started = time.monotonic()
+    service.search_many_sync([f"query {i}" for i in range(4)])
+    assert time.monotonic() - started >= 0.2
+
+
+def test_concurrent_identical_searches_share_one_call(make_service):
+    backend = FixtureBackend(latency=0.1)
+    service = make_service(backend)
+    threads = [threading.Thread(target=service.search_sync, args=("same query",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend.calls == 1
+    assert service.stats()["coalesced"] == 3
+
+
+def test_failures_are_reported_and_not_cached(make_service):
+    backend = FailingBackend(failures=1)
+    service = make_service(backend)
+
+    # Searches start in order, so the first one gets the failure
+    results = service.search_many_sync(["broken", "fine"])
+    assert isinstance(results["broken"], SearchError)
+    assert isinstance(results["fine"], list)
+    # The failed query is searched again rather than served from the cache
+    assert all(not isinstance(value, SearchError) for value in service.search_many_sync(["broken", "fine"]).values())
+    assert service.stats()["errors"] == 1
+
+
+def test_slow_searches_time_out(make_service):
+    service = make_service(FixtureBackend(latency=1.0), timeout=0.05)
+    with pytest.raises(SearchError, match="timed out"):
+        service.search_sync("slow query")
+
+
+def test_search_without_backend_raises(make_service):
+    service = make_service(None)
+    assert not service.enabled
+    with pytest.raises(SearchError):
+        service.search_sync("anything")
@@ -0,0 +1,121 @@
+import gc
+import threading
+import time
+import weakref
+
+import pytest
+
+from app.services import handle_pool as handle_pool_module
+from app.services.handle_pool import HandlePool
+
+
+class Clock:
+    """ Stands in for the time module in handle_pool; advanced by hand. """
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+class Handle:
+    """ A pooled handle that records when it is closed, as a client's connections would be. """
+    closed = []
+
+    def __init__(self, key: str):
+        self.key = key
+        weakref.finalize(self, Handle.closed.append, key)
+
+
+class Factory:
+    def __init__(self, delay: float = 0.0):
+        self.built = []
+        self.delay = delay
+
+    def __call__(self, key: str) -> Handle:
+        self.built.append(key)
+        time.sleep(self.delay)
+        return Handle(key)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(handle_pool_module, 'time', clock)
+    Handle.closed.clear()
+    return clock
+
+
+def _closed() -> list:
+    gc.collect()
+    return Handle.closed
+
+
+def test_least_recently_used_handle_is_evicted(clock):
+    factory = Factory()
+    pool = HandlePool(factory, max_size=2, ttl_seconds=60)
+    pool.get("a")
+    pool.get("b")
+    pool.get("a")
+    pool.get("c")
+
+    assert factory.built == ["a", "b", "c"]
+    pool.get("a")
+    pool.get("b")
+    assert factory.built == ["a", "b", "c", "b"]
+    assert pool.stats()['evictions'] == 2
+    assert pool.stats()['size'] == 2
+
+
+def test_expired_handle_is_rebuilt(clock):
+    factory = Factory()
+    pool = HandlePool(factory, max_size=2, ttl_seconds=60)
+    first = pool.get("a")
+    clock.now += 59
+    assert pool.get("a") is first
+
+    # The TTL counts from construction, not from last use
+    clock.now += 1
+    assert pool.get("a") is not first
+    assert factory.built == ["a", "a"]
+    assert (pool.stats()['hits'], pool.stats()['misses'], pool.stats()['evictions']) == (1, 2, 1)
+
+
+def test_evicted_handles_close_once_released(clock):
+    pool = HandlePool(Factory(), max_size=1, ttl_seconds=60)
+    pool.get("a")
+    pool.get("b")
+    assert _closed() == ["a"]
+
+    clock.now += 60
+    pool.get("c")
+    pool.invalidate("c")
+    assert _closed() == ["a", "b", "c"]
+
+
+def test_evicted_handle_in_use_is_not_closed(clock):
+    pool = HandlePool(Factory(), max_size=1, ttl_seconds=60)
+    in_use = pool.get("a")
+    pool.get("b")
+    assert _closed() == []
+    assert in_use.key == "a"
+
+    del in_use
+    assert _closed() == ["a"]
+
+
+def test_concurrent_misses_build_once():
+    factory = Factory(delay=0.05)
+    pool = HandlePool(factory, max_size=2, ttl_seconds=60)
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(pool.get("a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert factory.built == ["a"]
+    assert all(handle is handles[0] for handle in handles)
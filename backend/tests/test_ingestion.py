@@ -0,0 +1,95 @@
+import os
+
+import git
+import pytest
+
+from app.core.config import settings
+from app.services import ingestion
+
+
+def _write(root, files: dict):
+    for path, content in files.items():
+        full_path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+
+
+@pytest.fixture(autouse=True)
+def split_in_thread(monkeypatch):
+    # Split in the calling thread rather than in a spawned process pool
+    monkeypatch.setattr(settings, 'INGEST_WORKERS', 1)
+
+
+def test_progress_counts_only_files_that_are_split(tmp_path):
+    _write(tmp_path, {
+        'app/main.py': "def main():\n    return 1\n",
+        'README.md': "# Project\n",
+        'logo.png': b"\x89PNG\r\n",
+        'notes.txt': "not a supported type\n",
+    })
+    progress = []
+    batches = list(ingestion.iter_document_batches(
+        str(tmp_path), ['app/main.py', 'README.md', 'logo.png', 'notes.txt'],
+        progress_callback=lambda done, total: progress.append((done, total)),
+    ))
+
+    assert {meta['file_path'] for _, metadatas, _ in batches for meta in metadatas} == {'app/main.py', 'README.md'}
+    assert progress[-1] == (2, 2)
+
+
+# A checkout with everything the file pickers should leave out
+REPO_FILES = {
+    '.gitignore': "build/\n*.log.py\n",
+    'app/main.py': "print('main')\n",
+    'app/debug.log.py': "print('ignored by pattern')\n",
+    'build/bundle.js': "console.log('build output');\n",
+    'node_modules/lib/index.js': "module.exports = 1;\n",
+    'web/.gitignore': "*.generated.ts\n",
+    'web/app.ts': "export const app = 1;\n",
+    'web/api.generated.ts': "export const api = 1;\n",
+    # The nested rule only applies under web/
+    'types.generated.ts': "export type T = number;\n",
+    'docs/guide.md': "# Guide\n",
+    'LICENSE': "MIT\n",
+}
+PICKED = ['app/main.py', 'docs/guide.md', 'types.generated.ts', 'web/app.ts']
+
+
+def test_iter_repo_files_prunes_ignored_paths(tmp_path):
+    _write(tmp_path, REPO_FILES)
+    assert sorted(ingestion.iter_repo_files(str(tmp_path))) == PICKED
+
+
+def test_iter_repo_files_skips_files_over_the_size_limit(tmp_path):
+    _write(tmp_path, {'small.py': "x = 1\n", 'large.py': "x = 1\n" * 100})
+    assert list(ingestion.iter_repo_files(str(tmp_path), max_file_bytes=50)) == ['small.py']
+
+
+def test_get_file_hashes_applies_the_same_rules_to_committed_files(tmp_path):
+    _write(tmp_path, REPO_FILES)
+    repo = git.Repo.init(tmp_path)
+    repo.git.config('user.email', 'dev@example.com')
+    repo.git.config('user.name', 'Dev')
+    # Force-add what .gitignore matches, as when build output was committed anyway
+    repo.git.add('--force', '--all')
+    repo.git.commit('-m', 'initial')
+
+    hashes = ingestion.get_file_hashes(str(tmp_path))
+    assert sorted(hashes) == PICKED
+    assert hashes['app/main.py'] == repo.head.commit.tree['app/main.py'].hexsha
+
+
+def test_split_skips_binary_and_oversized_files(tmp_path):
+    _write(tmp_path, {
+        'text.py': "def f():\n    return 1\n",
+        'binary.py': b"\x00\x01\x02 compiled",
+        'latin1.py': "name = 'café'\n".encode('latin-1'),
+        'large.py': "x = 1\n" * 100,
+    })
+    results, bytes_read, _ = ingestion._split_files(
+        str(tmp_path), ['text.py', 'binary.py', 'latin1.py', 'large.py', 'missing.py'], max_file_bytes=100
+    )
+
+    assert [path for path, _ in results] == ['text.py']
+    assert bytes_read == len("def f():\n    return 1\n")
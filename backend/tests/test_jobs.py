@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from app.services import jobs, pipeline
+from app.services.jobs import JobManager
+
+
+class Pipeline:
+    """ Stands in for run_onboarding: each run reports a stage, then waits to be released. """
+    def __init__(self):
+        self.runs = []
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+        self.failures = {}
+
+    def __call__(self, repo_url, incremental=True, progress=None):
+        self.runs.append(repo_url)
+        progress("cloning")
+        self.started.release()
+        assert self.release.wait(5)
+        if repo_url in self.failures:
+            raise self.failures[repo_url]
+        progress("planning", 1, 1, {'files': 3})
+        return {'repo_url': repo_url}
+
+
+@pytest.fixture
+def run(monkeypatch):
+    run = Pipeline()
+    monkeypatch.setattr(pipeline, 'run_onboarding', run)
+    return run
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1, max_history=10)
+    yield manager
+    manager.shutdown()
+
+
+def _wait_done(manager: JobManager, job_id: str) -> dict:
+    """ Waits until the job has finished and its repo can be submitted again. """
+    deadline = time.monotonic() + 5
+    while manager.get(job_id)['status'] not in (jobs.COMPLETED, jobs.FAILED) or manager._active:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+
+def test_job_goes_from_queued_to_running_to_completed(manager, run):
+    first = manager.submit("https://github.com/acme/shop")
+    assert run.started.acquire(timeout=5)
+    # The one worker is busy, so a second repo waits its turn
+    second = manager.submit("https://github.com/acme/blog")
+    assert manager.get(second.job_id)['status'] == jobs.QUEUED
+
+    running = manager.get(first.job_id)
+    assert (running['status'], running['stage']) == (jobs.RUNNING, "cloning")
+    run.release.set()
+
+    done = _wait_done(manager, first.job_id)
+    assert (done['status'], done['stage']) == (jobs.COMPLETED, jobs.COMPLETED)
+    assert done['result'] == {'repo_url': "https://github.com/acme/shop"}
+    assert done['metrics'] == {'files': 3}
+    assert done['version'] > running['version']
+    assert _wait_done(manager, second.job_id)['status'] == jobs.COMPLETED
+
+
+def test_duplicate_submissions_coalesce_while_in_flight(manager, run):
+    job = manager.submit("https://github.com/acme/shop")
+    assert manager.submit("https://github.com/acme/shop").job_id == job.job_id
+    assert run.started.acquire(timeout=5)
+    assert manager.submit("https://github.com/acme/shop").job_id == job.job_id
+    run.release.set()
+    _wait_done(manager, job.job_id)
+
+    # Once finished, the repo can be onboarded again
+    again = manager.submit("https://github.com/acme/shop")
+    assert again.job_id != job.job_id
+    _wait_done(manager, again.job_id)
+    assert run.runs == ["https://github.com/acme/shop"] * 2
+
+
+def test_failure_is_captured(manager, run):
+    run.failures["https://github.com/acme/broken"] = ValueError("No supported files found in the repository.")
+    run.release.set()
+    job = manager.submit("https://github.com/acme/broken")
+
+    failed = _wait_done(manager, job.job_id)
+    assert (failed['status'], failed['stage']) == (jobs.FAILED, jobs.FAILED)
+    assert failed['error'] == "No supported files found in the repository."
+    assert failed['result'] is None
+    # A failed job doesn't block a retry
+    assert manager.submit("https://github.com/acme/broken").job_id != job.job_id
+
+
+def test_unknown_job_is_none(manager):
+    assert manager.get("missing") is None
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from app.services.lazy import Lazy, resolve
+
+
+class Service:
+    def __init__(self):
+        self.name = "service"
+
+    def ping(self) -> str:
+        return "pong"
+
+
+class CountingFactory:
+    """ Builds Services, counting the builds; the first `failures` builds raise. """
+    def __init__(self, delay: float = 0.0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.builds = 0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> Service:
+        with self._lock:
+            self.builds += 1
+            failing = self.failures > 0
+            self.failures -= 1
+        time.sleep(self.delay)
+        if failing:
+            raise ConnectionError("backend unavailable")
+        return Service()
+
+
+def test_nothing_is_built_until_first_attribute_access():
+    factory = CountingFactory()
+    proxy = Lazy("service", factory)
+    assert factory.builds == 0
+    assert not proxy.resolved
+    assert "not built" in repr(proxy)
+
+    assert proxy.ping() == "pong"
+    assert factory.builds == 1
+    assert proxy.resolved
+    proxy.ping()
+    assert proxy.name == "service"
+    assert factory.builds == 1
+
+
+def test_attribute_writes_go_to_the_built_object():
+    proxy = Lazy("service", CountingFactory())
+    proxy.name = "renamed"
+    assert proxy.resolve().name == "renamed"
+
+
+def test_concurrent_first_uses_build_once():
+    factory = CountingFactory(delay=0.05)
+    proxy = Lazy("service", factory)
+    built = []
+    threads = [threading.Thread(target=lambda: built.append(proxy.resolve())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert factory.builds == 1
+    assert len(built) == 8 and all(service is built[0] for service in built)
+
+
+def test_failed_build_is_retried_on_next_use():
+    factory = CountingFactory(failures=1)
+    proxy = Lazy("service", factory)
+    with pytest.raises(ConnectionError):
+        proxy.ping()
+    assert not proxy.resolved
+
+    assert proxy.ping() == "pong"
+    assert factory.builds == 2
+
+
+def test_resolve_passes_plain_objects_through():
+    service = Service()
+    assert resolve(service) is service
+    assert isinstance(resolve(Lazy("service", Service)), Service)
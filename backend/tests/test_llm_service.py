@@ -0,0 +1,63 @@
+import logging
+
+import google.generativeai as genai
+import pytest
+
+from app.services import llm_service
+from app.tools.google_search import FixtureBackend, SearchService
+
+
+class Response:
+    """ The parts of a Gemini response llm_service reads. """
+    def __init__(self, part, prompt_tokens: int, response_tokens: int):
+        self.candidates = [genai.protos.Candidate(content=genai.protos.Content(parts=[part], role="model"))]
+        self.text = part.text
+        self.usage_metadata = genai.protos.GenerateContentResponse.UsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=response_tokens,
+        )
+
+
+class SearchingModel:
+    """ Asks for a web search on its first call and answers on the next, recording what it was sent. """
+    def __init__(self):
+        self.contents = []
+
+    def generate_content(self, contents, **kwargs):
+        self.contents.append(list(contents))
+        if len(self.contents) == 1:
+            call = genai.protos.FunctionCall(name="google_search", args={"query": "fastapi lifespan"})
+            return Response(genai.protos.Part(function_call=call), 900, 10)
+        return Response(genai.protos.Part(text="Use a lifespan handler."), 1500, 40)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = SearchingModel()
+    monkeypatch.setattr(llm_service, 'model', model)
+    service = SearchService(FixtureBackend(), 100, 60, 5, 4)
+    monkeypatch.setattr(llm_service, 'search_service', service)
+    yield model
+    service.close()
+
+
+def test_search_results_are_fed_back_to_the_model(model):
+    answer = llm_service.generate_chat_response("How do I run code at startup?", ["code"], [{'file_path': 'main.py'}])
+
+    assert answer == "Use a lifespan handler."
+    first, second = model.contents
+    # The second call continues the conversation with the call and its results
+    assert len(second) == len(first) + 2
+    response = second[-1]['parts'][0].function_response
+    assert response.name == "google_search"
+    assert "fastapi+lifespan" in str(type(response).to_dict(response)["response"])
+
+
+def test_prompt_estimate_is_logged_once_across_tool_rounds(model, caplog):
+    with caplog.at_level(logging.INFO, logger=llm_service.__name__):
+        llm_service.generate_chat_response("How do I run code at startup?", ["code"], [{'file_path': 'main.py'}])
+
+    usage = [record.getMessage() for record in caplog.records if record.getMessage().startswith("Chat prompt")]
+    assert len(usage) == 2
+    assert "tokens estimated" in usage[0] and "900 prompt + 10 response tokens billed" in usage[0]
+    # The second round's prompt also holds the search results: only the billed count is logged
+    assert usage[1] == "Chat prompt: 1500 prompt + 40 response tokens billed."
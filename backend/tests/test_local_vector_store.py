@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from app.services.local_vector_store import LocalVectorStore
+
+
+class TableEmbeddings:
+    """ Embeds each text as the vector it was registered with. """
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+EMBEDDINGS = TableEmbeddings({
+    'alpha': [1.0, 0.0, 0.0],
+    'beta': [0.0, 1.0, 0.0],
+    'gamma': [0.0, 0.0, 1.0],
+    'alpha-ish': [0.9, 0.1, 0.0],
+})
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    """ Opens the collection in a temp dir; each call is a fresh instance, as in another process. """
+    return lambda: LocalVectorStore("shop", EMBEDDINGS, str(tmp_path))
+
+
+def _ids(store, query: str, k: int = 4) -> list:
+    return [doc.id for doc in store.similarity_search(query, k)]
+
+
+def test_round_trip_through_disk(open_store):
+    open_store().add_texts(['alpha', 'beta'], [{'file_path': 'a.py'}, {'file_path': 'b.py'}], ids=['a', 'b'])
+
+    doc, score = open_store().similarity_search_with_score('alpha', 1)[0]
+    assert (doc.id, doc.page_content, doc.metadata) == ('a', 'alpha', {'file_path': 'a.py'})
+    assert score == pytest.approx(1.0)
+
+
+def test_upsert_overwrites_an_existing_id_in_place(open_store):
+    store = open_store()
+    store.add_texts(['alpha', 'beta'], ids=['a', 'b'])
+    store.add_texts(['gamma'], ids=['a'])
+
+    assert _ids(store, 'gamma', 1) == ['a']
+    assert store.similarity_search('gamma', 1)[0].page_content == 'gamma'
+    # The overwritten vector no longer matches, and no row was added
+    assert 'alpha' not in [doc.page_content for doc in store.similarity_search('alpha')]
+    assert store._meta('next_row') == 2
+
+
+def test_deleted_ids_are_not_found_and_their_rows_are_reused(open_store):
+    store = open_store()
+    store.add_texts(['alpha', 'beta', 'gamma'], ids=['a', 'b', 'c'])
+    store.delete(['b'])
+
+    assert 'b' not in _ids(store, 'beta')
+    assert 'b' not in _ids(open_store(), 'beta')
+    store.add_texts(['alpha-ish'], ids=['d'])
+    assert store._meta('next_row') == 3
+
+
+def test_writes_are_seen_by_other_instances(open_store):
+    reader = open_store()
+    assert reader.similarity_search('alpha') == []
+
+    open_store().add_texts(['alpha'], ids=['a'])
+    assert _ids(reader, 'alpha') == ['a']
+
+
+def test_repeated_id_in_a_batch_keeps_its_last_text(open_store):
+    store = open_store()
+    store.add_texts(['alpha', 'beta', 'gamma'], ids=['x', 'y', 'x'])
+
+    assert store._meta('next_row') == 2
+    assert sorted(_ids(store, 'gamma')) == ['x', 'y']
+    assert store.similarity_search('gamma', 1)[0].page_content == 'gamma'
+
+
+def test_ivf_recall_against_brute_force(tmp_path):
+    rng = np.random.default_rng(7)
+    dim, clusters, per_cluster = 32, 40, 50
+    centers = rng.normal(size=(clusters, dim))
+    vectors = np.repeat(centers, per_cluster, axis=0) + rng.normal(scale=0.3, size=(clusters * per_cluster, dim))
+    texts = [f"chunk-{i}" for i in range(len(vectors))]
+    queries = [f"query-{i}" for i in range(50)]
+    query_vectors = vectors[rng.choice(len(vectors), len(queries), replace=False)] + rng.normal(scale=0.1, size=(len(queries), dim))
+    embeddings = TableEmbeddings({
+        **dict(zip(texts, vectors.tolist())), **dict(zip(queries, query_vectors.tolist())),
+    })
+    store = LocalVectorStore("large", embeddings, str(tmp_path), ivf_min_rows=1000, nprobe=8)
+    store.add_texts(texts, ids=texts)
+    assert store._centroids is not None
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    k, found = 10, 0
+    for query, query_vector in zip(queries, query_vectors):
+        exact = {texts[i] for i in np.argsort(-(unit @ query_vector))[:k]}
+        found += len(exact & set(_ids(store, query, k)))
+    assert found / (k * len(queries)) >= 0.9
@@ -0,0 +1,43 @@
+from app.services.manifest import ManifestStore, diff_manifest
+
+
+def test_diff_manifest_classifies_paths():
+    previous = {
+        'same.py': {'sha': 'a', 'ids': ['1']},
+        'changed.py': {'sha': 'b', 'ids': ['2']},
+        'gone.py': {'sha': 'c', 'ids': ['3']},
+    }
+    current = {'same.py': 'a', 'changed.py': 'b2', 'new.py': 'd'}
+
+    added, modified, removed = diff_manifest(previous, current)
+
+    assert added == ['new.py']
+    assert modified == ['changed.py']
+    assert removed == ['gone.py']
+
+
+def test_diff_manifest_from_empty_adds_everything():
+    assert diff_manifest({}, {'a.py': '1', 'b.py': '2'}) == (['a.py', 'b.py'], [], [])
+
+
+def test_diff_manifest_unchanged_is_empty():
+    previous = {'a.py': {'sha': '1', 'ids': []}}
+    assert diff_manifest(previous, {'a.py': '1'}) == ([], [], [])
+
+
+def test_manifest_store_round_trip(tmp_path):
+    store = ManifestStore(str(tmp_path))
+    assert store.load('repo') == {'files': {}}
+
+    manifest = {'files': {'a.py': {'sha': '1', 'ids': ['x']}}}
+    store.save('repo', manifest)
+    assert store.load('repo') == manifest
+
+    store.delete('repo')
+    assert store.load('repo') == {'files': {}}
+
+
+def test_manifest_store_ignores_corrupt_manifest(tmp_path):
+    store = ManifestStore(str(tmp_path))
+    (tmp_path / 'repo.json').write_text('{not json')
+    assert store.load('repo') == {'files': {}}
@@ -0,0 +1,113 @@
+import pytest
+
+from app.core.config import settings
+from app.services import ingestion, pipeline, planner
+from app.services.chunk_store import CHUNK_ID_VERSION
+from app.services.chunking import CHUNKER_VERSION
+from app.services.plan_store import PlanStore
+from app.services.vector_store import vector_store_manager
+
+REPO_URL = "https://github.com/acme/shop"
+COLLECTION = pipeline.generate_collection_name(REPO_URL)
+HEAD = "b" * 40
+CURRENT_MANIFEST = {'files': {'main.py': "1" * 40}, 'chunker': CHUNKER_VERSION, 'chunk_ids': CHUNK_ID_VERSION}
+
+
+def _plan(commit_sha: str) -> dict:
+    return {'learning_path': [], 'starter_tasks': [], 'message': "Onboarded.", 'commit_sha': commit_sha}
+
+
+class FakeLexicalIndex:
+    def __init__(self, chunks: int):
+        self.chunks = chunks
+
+    def count(self) -> int:
+        return self.chunks
+
+
+class Cloned(Exception):
+    """ Raised in place of cloning, to tell that a run went past the stored plan. """
+
+
+def test_plans_survive_reopening_the_store(tmp_path):
+    path = str(tmp_path / "plans.sqlite3")
+    PlanStore(path).put(COLLECTION, HEAD, "v1", REPO_URL, _plan(HEAD))
+
+    store = PlanStore(path)
+    stored = store.get(COLLECTION, HEAD, "v1")
+    assert stored['plan'] == _plan(HEAD)
+    assert stored['repo_url'] == REPO_URL
+    # The commit and the prompt version must both match
+    assert store.get(COLLECTION, "c" * 40, "v1") is None
+    assert store.get(COLLECTION, HEAD, "v2") is None
+
+
+def test_latest_plan_and_history_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'PLAN_STORE_HISTORY', 2)
+    store = PlanStore(str(tmp_path / "plans.sqlite3"))
+    for commit_sha in ("1" * 40, "2" * 40, "3" * 40):
+        store.put(COLLECTION, commit_sha, "v1", REPO_URL, _plan(commit_sha))
+
+    assert store.latest(COLLECTION, "v1")['commit_sha'] == "3" * 40
+    assert store.latest(COLLECTION, "v2") is None
+    # Only the newest two are kept
+    assert store.get(COLLECTION, "1" * 40, "v1") is None
+    assert store.get(COLLECTION, "2" * 40, "v1") is not None
+
+
+@pytest.mark.parametrize("manifest, chunks, reason", [
+    ({'files': {}}, 0, None),
+    (CURRENT_MANIFEST, 10, None),
+    (CURRENT_MANIFEST, None, None),  # Vector-only retrieval has no keyword index to fill
+    (CURRENT_MANIFEST, 0, "has no keyword index yet"),
+    ({**CURRENT_MANIFEST, 'chunker': "1"}, 10, "was chunked differently"),
+    ({key: value for key, value in CURRENT_MANIFEST.items() if key != 'chunk_ids'}, 10, "uses an older chunk ID scheme"),
+])
+def test_reingest_reason(manifest, chunks, reason):
+    lexical_index = FakeLexicalIndex(chunks) if chunks is not None else None
+    assert pipeline._reingest_reason(manifest, lexical_index) == reason
+
+
+@pytest.fixture
+def indexed(monkeypatch, tmp_path):
+    """ A collection with a plan stored at the remote's HEAD; returns a setter for its index state. """
+    store = PlanStore(str(tmp_path / "plans.sqlite3"))
+    store.put(COLLECTION, HEAD, planner.PLAN_PROMPT_VERSION, REPO_URL, _plan(HEAD))
+    monkeypatch.setattr(pipeline, 'plan_store', store)
+    monkeypatch.setattr(ingestion, 'get_remote_head', lambda repo_url: HEAD)
+    monkeypatch.setattr(vector_store_manager, 'get_or_create_collection', lambda name: name)
+
+    def clone_repo(repo_url):
+        raise Cloned()
+
+    monkeypatch.setattr(ingestion, 'clone_repo', clone_repo)
+
+    def index(manifest: dict, chunks: int):
+        monkeypatch.setattr(pipeline.manifest_store, 'load', lambda name: manifest)
+        monkeypatch.setattr(vector_store_manager, 'lexical_index_for', lambda collection: FakeLexicalIndex(chunks))
+
+    return index
+
+
+def test_stored_plan_is_reused_when_the_index_is_current(indexed):
+    indexed(CURRENT_MANIFEST, 10)
+    assert pipeline.run_onboarding(REPO_URL) == _plan(HEAD)
+
+
+def test_stored_plan_is_not_reused_when_the_index_is_outdated(indexed):
+    indexed({**CURRENT_MANIFEST, 'chunker': "1"}, 10)
+    with pytest.raises(Cloned):
+        pipeline.run_onboarding(REPO_URL)
+
+
+def test_stored_plan_is_not_reused_for_a_full_onboarding(indexed):
+    indexed(CURRENT_MANIFEST, 10)
+    with pytest.raises(Cloned):
+        pipeline.run_onboarding(REPO_URL, incremental=False)
+
+
+def test_stored_plan_is_not_reused_once_the_remote_moves(indexed, monkeypatch):
+    indexed(CURRENT_MANIFEST, 10)
+    monkeypatch.setattr(ingestion, 'get_remote_head', lambda repo_url: "c" * 40)
+    with pytest.raises(Cloned):
+        pipeline.run_onboarding(REPO_URL)
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from app.services import planner
+from app.services.planner import OTHER_MODULE, ROOT_MODULE, SummaryStore, module_hash, split_modules
+
+PATHS = (
+    ['README.md', 'setup.py']
+    + [f'src/api/routes_{i}.py' for i in range(6)]
+    + [f'src/models/model_{i}.py' for i in range(4)]
+    + [f'src/utils/util_{i}.py' for i in range(2)]
+    + ['docs/index.md', 'docs/guide.md', 'docs/api.md', 'tests/test_api.py']
+)
+
+
+def _modules(modules: dict) -> dict:
+    return {module: sorted(paths) for module, paths in modules.items()}
+
+
+def test_split_modules_splits_a_dominant_directory():
+    assert _modules(split_modules(PATHS, 10)) == {
+        ROOT_MODULE: ['README.md', 'setup.py'],
+        'src/api': [f'src/api/routes_{i}.py' for i in range(6)],
+        'src/models': [f'src/models/model_{i}.py' for i in range(4)],
+        'src/utils': ['src/utils/util_0.py', 'src/utils/util_1.py'],
+        'docs': ['docs/api.md', 'docs/guide.md', 'docs/index.md'],
+        'tests': ['tests/test_api.py'],
+    }
+
+
+def test_split_modules_groups_the_smallest_modules_past_the_limit():
+    modules = _modules(split_modules(PATHS, 3))
+    # Splitting src/ would only add modules, so it stays whole
+    assert set(modules) == {'src', 'docs', OTHER_MODULE}
+    assert modules[OTHER_MODULE] == ['README.md', 'setup.py', 'tests/test_api.py']
+
+
+@pytest.mark.parametrize("max_modules", [3, 10])
+def test_split_modules_does_not_depend_on_path_order(max_modules):
+    expected = _modules(split_modules(PATHS, max_modules))
+    for seed in range(5):
+        shuffled = list(PATHS)
+        random.Random(seed).shuffle(shuffled)
+        assert _modules(split_modules(shuffled, max_modules)) == expected
+
+
+def test_module_hash_covers_the_name_files_and_prompt_version(monkeypatch):
+    files = {'src/api/a.py': "1" * 40, 'src/api/b.py': "2" * 40}
+    key = module_hash('src/api', files)
+
+    assert module_hash('src/api', dict(reversed(list(files.items())))) == key
+    assert module_hash('src/web', files) != key
+    assert module_hash('src/api', {**files, 'src/api/b.py': "3" * 40}) != key
+    assert module_hash('src/api', {**files, 'src/api/c.py': "4" * 40}) != key
+    monkeypatch.setattr(planner, 'SUMMARY_PROMPT_VERSION', "next")
+    assert module_hash('src/api', files) != key
+
+
+class Summarizer:
+    """ Stands in for the LLM map step, recording which modules it was asked for. """
+    def __init__(self):
+        self.modules = []
+        self.failing = set()
+
+    def __call__(self, module, paths, repo_path, lexical_index):
+        self.modules.append(module)
+        if module in self.failing:
+            raise RuntimeError("quota exceeded")
+        return {'module': module, 'summary': f"{module}: {len(paths)} files"}
+
+
+@pytest.fixture
+def summarizer(monkeypatch, tmp_path):
+    summarizer = Summarizer()
+    monkeypatch.setattr(planner, '_summarize_module', summarizer)
+    monkeypatch.setattr(planner, 'summary_store', SummaryStore(str(tmp_path / "summaries")))
+    return summarizer
+
+
+def test_changed_file_invalidates_only_its_module_summary(summarizer):
+    file_hashes = {path: "0" * 40 for path in PATHS}
+    modules = split_modules(sorted(file_hashes), 10)
+    progress = []
+    first = planner.summarize_modules(modules, file_hashes, "/repo", progress=lambda *args: progress.append(args))
+    assert sorted(summarizer.modules) == sorted(modules)
+    assert [summary['module'] for summary in first] == sorted(modules)
+    assert progress[-1] == ("planning", len(modules), len(modules))
+
+    summarizer.modules.clear()
+    changed = {**file_hashes, 'src/models/model_2.py': "1" * 40}
+    second = planner.summarize_modules(split_modules(sorted(changed), 10), changed, "/repo")
+    assert summarizer.modules == ['src/models']
+    assert second == first
+
+
+def test_failed_summary_is_left_out_and_retried(summarizer):
+    file_hashes = {path: "0" * 40 for path in PATHS}
+    modules = split_modules(sorted(file_hashes), 10)
+    summarizer.failing.add('docs')
+    summaries = planner.summarize_modules(modules, file_hashes, "/repo")
+    assert 'docs' not in [summary['module'] for summary in summaries]
+
+    summarizer.modules.clear()
+    summarizer.failing.clear()
+    planner.summarize_modules(modules, file_hashes, "/repo")
+    assert summarizer.modules == ['docs']
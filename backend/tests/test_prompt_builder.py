@@ -0,0 +1,85 @@
+from app.services.prompt_builder import MIN_PASSAGE_TOKENS, TRUNCATION_MARKER, count_tokens, merge_chunks, pack_context
+
+
+def _lines(first: int, last: int, prefix: str = "line") -> str:
+    return "\n".join(f"{prefix}_{number} = compute({number})" for number in range(first, last + 1))
+
+
+def _chunk(file_path: str, first: int, last: int) -> tuple:
+    return _lines(first, last), {'file_path': file_path, 'start_line': first, 'end_line': last}
+
+
+def test_count_tokens_errs_high_for_symbol_dense_text():
+    assert count_tokens("") == 0
+    assert count_tokens("a" * 40) == 10
+    # Punctuation-heavy code counts more than its length alone suggests
+    assert count_tokens("a(b[c]);" * 10) > len("a(b[c]);" * 10) / 4
+
+
+def test_merge_chunks_joins_adjacent_chunks_of_a_file():
+    first, second = _chunk('a.py', 1, 10), _chunk('a.py', 11, 20)
+    other = _chunk('b.py', 1, 5)
+    # Relevance order: b.py first, then a.py's chunks out of file order
+    merged = merge_chunks([other[0], second[0], first[0]], [other[1], second[1], first[1]])
+
+    assert [metadata for _, metadata, _ in merged] == [
+        {'file_path': 'b.py', 'start_line': 1, 'end_line': 5},
+        {'file_path': 'a.py', 'start_line': 1, 'end_line': 20},
+    ]
+    assert merged[1][0] == _lines(1, 20)
+    assert len(merged[1][2]) == 2
+
+
+def test_merge_chunks_removes_overlapping_text():
+    first, second = _chunk('a.py', 1, 10), _chunk('a.py', 8, 15)
+    [(text, metadata, _)] = merge_chunks([first[0], second[0]], [first[1], second[1]])
+    assert text == _lines(1, 15)
+    assert metadata['end_line'] == 15
+
+
+def test_merge_chunks_keeps_distant_chunks_apart():
+    first, second = _chunk('a.py', 1, 5), _chunk('a.py', 40, 45)
+    assert len(merge_chunks([first[0], second[0]], [first[1], second[1]])) == 2
+
+
+def test_pack_context_fits_everything_under_budget():
+    chunks = [_chunk('a.py', 1, 5), _chunk('b.py', 1, 5)]
+    context = pack_context([c[0] for c in chunks], [c[1] for c in chunks], token_budget=10_000)
+
+    assert context.documents == [chunks[0][0], chunks[1][0]]
+    assert context.tokens == sum(count_tokens(text) for text, _ in chunks)
+    assert context.dropped == 0
+    assert len(context.sources) == 2
+
+
+def test_pack_context_never_exceeds_budget():
+    chunks = [_chunk(f"f{i}.py", 1, 60) for i in range(10)]
+    for budget in (150, 500, 1234, 3000):
+        context = pack_context([c[0] for c in chunks], [c[1] for c in chunks], token_budget=budget)
+        assert context.tokens <= budget
+        assert sum(count_tokens(text) for text in context.documents) == context.tokens
+
+
+def test_pack_context_truncates_the_passage_that_does_not_fit():
+    big = _chunk('big.py', 1, 200)
+    budget = count_tokens(big[0]) // 2
+    context = pack_context([big[0]], [big[1]], token_budget=budget)
+
+    [text] = context.documents
+    assert text.endswith(TRUNCATION_MARKER)
+    assert big[0].startswith(text[:-len(TRUNCATION_MARKER)])
+    # The cited line range shrinks with the text
+    [metadata] = context.metadatas
+    assert metadata['start_line'] == 1 and metadata['end_line'] < 200
+    assert context.tokens <= budget
+
+
+def test_pack_context_drops_passages_when_too_little_budget_is_left():
+    first, second = _chunk('a.py', 1, 30), _chunk('b.py', 1, 30)
+    budget = count_tokens(first[0]) + MIN_PASSAGE_TOKENS // 2
+    context = pack_context([first[0], second[0]], [first[1], second[1]], token_budget=budget)
+
+    assert context.documents == [first[0]]
+    assert context.dropped == 1
+    # Only what made it in is cited
+    assert [metadata['file_path'] for _, metadata in context.sources] == ['a.py']
@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import llm_service, warmup
+from app.services.lazy import Lazy
+from app.services.vector_store import vector_store_manager
+from benchmarks.fakes import FakeEmbeddings, FakeGeminiModel
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    """ A fresh readiness tracker, as in a worker that just started. """
+    readiness = warmup.Readiness()
+    monkeypatch.setattr(warmup, 'readiness', readiness)
+    return readiness
+
+
+@pytest.fixture
+def client():
+    # Without a `with` block the lifespan doesn't run, so no background warm-up starts
+    return TestClient(app)
+
+
+@pytest.fixture
+def offline_services(monkeypatch):
+    """ Unbuilt proxies over fakes in place of the Google clients, which need credentials. """
+    monkeypatch.setattr(vector_store_manager, 'embedding_client', Lazy("fake embeddings", FakeEmbeddings))
+    monkeypatch.setattr(
+        vector_store_manager, 'embedding_model', Lazy("embedding model", vector_store_manager._create_embedding_model)
+    )
+    monkeypatch.setattr(llm_service, 'model', Lazy("fake model", FakeGeminiModel))
+
+
+def test_not_ready_before_warm_up(readiness, client):
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()['status'] == warmup.WARMING
+    # The worker is up all the same
+    assert client.get("/").status_code == 200
+
+
+def test_expected_components_read_as_warming(readiness, client):
+    readiness.expect(["llm", "plan_store"])
+    readiness.run("llm", lambda: None)
+
+    body = client.get("/ready").json()
+    assert body['status'] == warmup.WARMING
+    assert body['components']['llm']['status'] == warmup.WARM
+    assert body['components']['plan_store'] == {'status': warmup.WARMING}
+
+
+def test_ready_after_warm_up(readiness, client, offline_services):
+    warmup.warm_up()
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body['status'] == warmup.WARM
+    assert {'embeddings', 'llm', 'chunker', 'collections'} <= set(body['components'])
+    assert all(state['status'] == warmup.WARM for state in body['components'].values())
+    # Warm-up built the proxies requests would otherwise build on first use
+    assert vector_store_manager.embedding_client.resolved
+    assert llm_service.model.resolved
+
+
+def test_failed_component_is_reported(readiness, client):
+    def broken():
+        raise ValueError("GOOGLE_API_KEY is not set")
+
+    readiness.run("llm", broken)
+    readiness.run("plan_store", lambda: None)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    body = response.json()
+    assert body['status'] == warmup.FAILED
+    assert body['components']['llm'] == {'status': warmup.FAILED, 'error': "GOOGLE_API_KEY is not set"}
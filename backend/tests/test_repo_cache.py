@@ -0,0 +1,147 @@
+import os
+
+import git
+import pytest
+
+from app.services.repo_cache import LAST_USED_MARKER, RepoCache, _dir_size
+
+
+class Origin:
+    """ A bare repository served over file://, with a working clone to push commits from. """
+    def __init__(self, root, name: str):
+        self.bare = root / f"{name}.git"
+        git.Repo.init(self.bare, bare=True, initial_branch="main")
+        # Let blobless clones filter, as a real host does
+        git.Git(self.bare).config('uploadpack.allowFilter', 'true')
+        self.url = self.bare.as_uri()
+        self.work = git.Repo.init(root / f"{name}-work", initial_branch="main")
+        self.work.git.config('user.email', 'dev@example.com')
+        self.work.git.config('user.name', 'Dev')
+        self.work.create_remote('origin', self.url)
+
+    def commit(self, files: dict, message: str = "update") -> str:
+        for path, content in files.items():
+            full_path = os.path.join(self.work.working_dir, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w') as f:
+                f.write(content)
+        self.work.git.add(A=True)
+        self.work.git.commit('-m', message)
+        self.work.git.push('origin', 'main')
+        return self.work.head.commit.hexsha
+
+
+@pytest.fixture
+def origin(tmp_path):
+    origin = Origin(tmp_path, "project")
+    origin.commit({'app/main.py': "print('v1')\n", 'README.txt': "not a supported file\n"})
+    return origin
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "cache"
+
+
+def _cache(cache_dir, max_bytes: int = 10 ** 9) -> RepoCache:
+    return RepoCache(str(cache_dir), max_bytes, depth=1, clone_filter="blob:none", sparse_extensions={'.py'})
+
+
+def _read(checkout_dir: str, path: str) -> str:
+    with open(os.path.join(checkout_dir, path)) as f:
+        return f.read()
+
+
+def _mirrors(cache_dir) -> list:
+    return sorted(path.name for path in cache_dir.iterdir() if path.is_dir())
+
+
+def test_checkout_clones_sparse_worktree_into_mirror(origin, cache_dir):
+    cache = _cache(cache_dir)
+    checkout_dir = cache.checkout(origin.url)
+    try:
+        assert _read(checkout_dir, 'app/main.py') == "print('v1')\n"
+        # Sparse checkout leaves unsupported files out
+        assert not os.path.exists(os.path.join(checkout_dir, 'README.txt'))
+        assert git.Repo(checkout_dir).head.commit.hexsha == origin.work.head.commit.hexsha
+        assert len(_mirrors(cache_dir)) == 1
+    finally:
+        cache.release(checkout_dir)
+
+
+def test_release_removes_worktree_and_keeps_mirror(origin, cache_dir):
+    cache = _cache(cache_dir)
+    checkout_dir = cache.checkout(origin.url)
+    cache.release(checkout_dir)
+
+    assert not os.path.exists(checkout_dir)
+    [mirror] = _mirrors(cache_dir)
+    worktrees = git.Git(str(cache_dir / mirror)).worktree('list', '--porcelain')
+    assert checkout_dir not in worktrees
+
+
+def test_reuse_fetches_new_commits(origin, cache_dir):
+    cache = _cache(cache_dir)
+    cache.release(cache.checkout(origin.url))
+
+    head = origin.commit({'app/main.py': "print('v2')\n"})
+    checkout_dir = cache.checkout(origin.url)
+    try:
+        assert _read(checkout_dir, 'app/main.py') == "print('v2')\n"
+        assert git.Repo(checkout_dir).head.commit.hexsha == head
+        # Served from the same mirror
+        assert len(_mirrors(cache_dir)) == 1
+    finally:
+        cache.release(checkout_dir)
+
+
+def test_concurrent_checkouts_are_independent(origin, cache_dir):
+    cache = _cache(cache_dir)
+    first = cache.checkout(origin.url)
+    second = cache.checkout(origin.url)
+    try:
+        assert first != second
+        cache.release(first)
+        assert _read(second, 'app/main.py') == "print('v1')\n"
+    finally:
+        cache.release(second)
+
+
+def test_evicts_least_recently_used_idle_mirror(tmp_path, cache_dir):
+    old, recent = Origin(tmp_path, "old"), Origin(tmp_path, "recent")
+    for origin in (old, recent):
+        origin.commit({'main.py': f"name = '{origin.url}'\n"})
+    cache = _cache(cache_dir)
+    cache.release(cache.checkout(old.url))
+    cache.release(cache.checkout(recent.url))
+    old_mirror, recent_mirror = cache._mirror_dir(old.url), cache._mirror_dir(recent.url)
+    os.utime(os.path.join(old_mirror, LAST_USED_MARKER), (0, 0))
+
+    # Room for one mirror only
+    cache.max_bytes = _dir_size(recent_mirror)
+    cache.evict()
+
+    assert not os.path.exists(old_mirror)
+    assert os.path.isdir(recent_mirror)
+
+
+def test_mirror_in_use_is_not_evicted(origin, cache_dir):
+    cache = _cache(cache_dir, max_bytes=1)
+    checkout_dir = cache.checkout(origin.url)
+    mirror_dir = cache._mirror_dir(origin.url)
+    cache.evict()
+    assert os.path.isdir(mirror_dir)
+
+    # Once released it is over the limit and goes
+    cache.release(checkout_dir)
+    assert not os.path.exists(mirror_dir)
+
+
+def test_uncached_checkout_is_deleted_on_release(origin, cache_dir):
+    cache = _cache(cache_dir, max_bytes=0)
+    checkout_dir = cache.checkout(origin.url)
+    assert _read(checkout_dir, 'app/main.py') == "print('v1')\n"
+    assert not cache_dir.exists()
+
+    cache.release(checkout_dir)
+    assert not os.path.exists(checkout_dir)
@@ -0,0 +1,127 @@
+import pytest
+from langchain_core.documents import Document
+
+from app.services.chunk_store import ChunkStore
+from app.services.lexical_index import LexicalIndex
+from app.services.retrieval import HybridRetriever, dedup_chunks, is_identifier_query, reciprocal_rank_fusion
+
+CHUNKS = {
+    'config': ("EMBED_BATCH_SIZE = 64\nEMBED_CONCURRENCY = 4\n", {'file_path': 'app/core/config.py', 'start_line': 1, 'end_line': 2}),
+    'store': ("def get_or_create_collection(name):\n    return stores[name]\n", {'file_path': 'app/services/vector_store.py', 'start_line': 10, 'end_line': 11}),
+    'writer': ("def write_batches(batches):\n    for batch in batches:\n        store.add(batch)\n", {'file_path': 'app/services/writer.py', 'start_line': 1, 'end_line': 3}),
+    'readme': ("Run the app with uvicorn and set the embed batch size.\n", {'file_path': 'README.md', 'start_line': 1, 'end_line': 1}),
+    # Unrelated chunks, so that BM25 gives the words above some weight
+    'auth': ("def login(user, password):\n    return check_password(user, password)\n", {'file_path': 'app/auth.py', 'start_line': 1, 'end_line': 2}),
+    'routes': ("@router.get('/health')\ndef health():\n    return {'ok': True}\n", {'file_path': 'app/routes.py', 'start_line': 1, 'end_line': 3}),
+    'models': ("class User(Base):\n    email = Column(String)\n", {'file_path': 'app/models.py', 'start_line': 1, 'end_line': 2}),
+    'docker': ("FROM python:3.11-slim\nCOPY . /app\n", {'file_path': 'Dockerfile', 'start_line': 1, 'end_line': 2}),
+}
+
+
+def _doc(chunk_id: str, text: str = None, **metadata) -> Document:
+    return Document(id=chunk_id, page_content=text or f"text of {chunk_id}", metadata={'file_path': f"{chunk_id}.py", **metadata})
+
+
+def _stored(chunk_id: str) -> Document:
+    text, metadata = CHUNKS[chunk_id]
+    return Document(id=chunk_id, page_content=text, metadata=metadata)
+
+
+def _ranked(*chunk_ids) -> list:
+    return [(_doc(chunk_id), 1.0 / rank) for rank, chunk_id in enumerate(chunk_ids, start=1)]
+
+
+@pytest.fixture
+def lexical_index(tmp_path):
+    chunk_store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    ids = list(CHUNKS)
+    texts = [CHUNKS[chunk_id][0] for chunk_id in ids]
+    metadatas = [CHUNKS[chunk_id][1] for chunk_id in ids]
+    # Texts go to the chunk store first, as ingestion writes them
+    chunk_store.put("shop", ids, texts, metadatas)
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite3"), "shop", chunk_store)
+    index.add(texts, metadatas, ids)
+    return index
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = reciprocal_rank_fusion([_ranked('a', 'b', 'c'), _ranked('c', 'a', 'd')], rrf_k=60)
+
+    assert [document.id for document, _ in fused] == ['a', 'c', 'b', 'd']
+    scores = dict((document.id, score) for document, score in fused)
+    assert scores['a'] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores['c'] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores['d'] == pytest.approx(1 / 63)
+
+
+def test_rrf_ignores_the_retrievers_scores():
+    # A huge BM25 score doesn't outweigh rank
+    vector = [(_doc('a'), 0.9), (_doc('b'), 0.8)]
+    lexical = [(_doc('b'), 45.0), (_doc('a'), 44.0)]
+    fused = reciprocal_rank_fusion([vector, lexical])
+    assert fused[0][1] == pytest.approx(fused[1][1])
+
+
+def test_dedup_drops_repeated_text_covered_lines_and_extra_chunks_per_file():
+    results = [
+        (_doc('a', "shared", file_path='x.py'), 1.0),
+        (_doc('b', "shared", file_path='vendor/x.py'), 0.9),
+        (_doc('c', "outer", file_path='y.py', start_line=1, end_line=20), 0.8),
+        (_doc('d', "inner", file_path='y.py', start_line=5, end_line=9), 0.7),
+        (_doc('e', "next", file_path='y.py', start_line=21, end_line=30), 0.6),
+        (_doc('f', "third", file_path='y.py', start_line=31, end_line=40), 0.5),
+    ]
+    assert [document.id for document, _ in dedup_chunks(results, max_per_file=2)] == ['a', 'c', 'e']
+
+
+def test_bm25_search_reads_texts_from_the_chunk_store(lexical_index):
+    results = lexical_index.search("get_or_create_collection", 3)
+
+    document, score = results[0]
+    assert document.id == 'store'
+    assert (document.page_content, document.metadata) == CHUNKS['store']
+    assert score > 0
+    # The FTS5 table keeps no copy of the texts
+    assert lexical_index._conn.execute("SELECT text FROM chunks").fetchall() == [(None,)] * len(CHUNKS)
+
+
+def test_bm25_ranks_chunks_matching_more_query_words_first(lexical_index):
+    ranked = [document.id for document, _ in lexical_index.search("embed batch size", 4)]
+    # README has all three words, config.py two (as parts of EMBED_BATCH_SIZE), writer.py one
+    assert ranked == ['readme', 'config', 'writer']
+    assert [document.id for document, _ in lexical_index.search("embed", 4, path_prefix="app/")] == ['config']
+
+
+def test_bm25_index_add_is_idempotent_and_delete_unindexes(lexical_index):
+    text, metadata = CHUNKS['writer']
+    lexical_index.add([text], [metadata], ['writer'])
+    assert lexical_index.count() == len(CHUNKS)
+    assert [document.id for document, _ in lexical_index.search("write_batches", 4)] == ['writer']
+
+    lexical_index.delete(['writer'])
+    assert lexical_index.search("write_batches", 4) == []
+    assert lexical_index.count() == len(CHUNKS) - 1
+
+
+def test_hybrid_search_fuses_and_dedups_both_retrievers(lexical_index):
+    def vector_search(query, n):
+        return [(_stored('readme'), 0.9), (_stored('writer'), 0.8), (_stored('store'), 0.7)]
+
+    retriever = HybridRetriever(candidates=4, max_chunks_per_file=2, use_rerank=False)
+    results = retriever.search("embed batch size", 3, vector_search, lexical_index)
+
+    # Keyword ranks are readme, config, writer: chunks both found come first, once each,
+    # and config (keyword rank 2) edges out store (vector rank 3)
+    assert [document.id for document, _ in results] == ['readme', 'writer', 'config']
+    assert results[0][1] == pytest.approx(2 / 61)
+
+
+def test_identifier_query_skips_the_embedding_call(lexical_index):
+    def vector_search(query, n):
+        raise AssertionError("embedded an identifier query")
+
+    retriever = HybridRetriever(candidates=4)
+    results = retriever.search("EMBED_BATCH_SIZE", 1, vector_search, lexical_index)
+    assert [document.id for document, _ in results] == ['config']
+    assert is_identifier_query("app/main.py") and not is_identifier_query("how does login work")
+
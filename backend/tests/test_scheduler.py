@@ -0,0 +1,150 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from app.services.scheduler import FairQueue, StageLane, StageScheduler, tenant_for
+
+
+def _drain(queue: FairQueue) -> list:
+    return [queue.pop() for _ in range(len(queue))]
+
+
+def test_tenant_for_uses_host_and_owner():
+    assert tenant_for("https://github.com/tiangolo/fastapi") == "github.com/tiangolo"
+    assert tenant_for("https://github.com/tiangolo/fastapi/") == "github.com/tiangolo"
+    assert tenant_for("file:///srv/git/project.git").startswith("srv/")
+    assert tenant_for("") == "default"
+
+
+def test_pop_from_empty_queue_raises():
+    with pytest.raises(IndexError):
+        FairQueue().pop()
+
+
+def test_flow_is_first_in_first_out():
+    queue = FairQueue()
+    for item in range(3):
+        queue.push("acme", "job", item)
+    assert _drain(queue) == [0, 1, 2]
+
+
+def test_tenants_take_turns_whatever_their_backlog():
+    queue = FairQueue()
+    for item in range(6):
+        queue.push("big", f"repo-{item}", f"big-{item}")
+    queue.push("small", "repo", "small-0")
+    queue.push("small", "repo", "small-1")
+
+    order = _drain(queue)
+    assert order[:4] == ["big-0", "small-0", "big-1", "small-1"]
+    assert order[4:] == ["big-2", "big-3", "big-4", "big-5"]
+
+
+def test_flows_of_a_tenant_take_turns():
+    queue = FairQueue()
+    for item in range(3):
+        queue.push("acme", "first", f"first-{item}")
+    queue.push("acme", "second", "second-0")
+    assert _drain(queue) == ["first-0", "second-0", "first-1", "first-2"]
+
+
+def test_returning_tenant_gets_no_credit_for_idle_time():
+    queue = FairQueue()
+    for item in range(4):
+        queue.push("busy", "job", f"busy-{item}")
+    assert queue.pop() == "busy-0"
+    assert queue.pop() == "busy-1"
+
+    # A newcomer goes next, then alternates, rather than being owed two turns
+    queue.push("late", "job", "late-0")
+    queue.push("late", "job", "late-1")
+    assert _drain(queue) == ["late-0", "busy-2", "late-1", "busy-3"]
+
+
+def test_depths_count_items_per_tenant():
+    queue = FairQueue()
+    queue.push("a", "x", 1)
+    queue.push("a", "y", 2)
+    queue.push("b", "x", 3)
+    assert queue.depths() == {'a': 2, 'b': 1}
+    assert len(queue) == 3
+
+
+def _hold(scheduler: StageScheduler, stage: str, tenant: str, flow: str, seconds: float, log: list):
+    with scheduler.flow(tenant, flow), scheduler.slot(stage):
+        log.append(flow)
+        time.sleep(seconds)
+
+
+def test_lane_never_exceeds_its_slots():
+    lane = StageLane("embed", 2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work():
+        with lane.slot():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = lane.stats()
+    assert peak[0] == 2
+    assert stats['in_use'] == 0 and stats['waiting'] == {}
+    assert stats['granted'] == 8 and stats['queued'] >= 6
+
+
+def test_lane_hands_free_slots_to_tenants_in_turn():
+    scheduler = StageScheduler({"clone": 1})
+    lane = scheduler.lane("clone")
+    log = []
+    holder = threading.Thread(target=_hold, args=(scheduler, "clone", "first", "holder", 0.1, log))
+    holder.start()
+    time.sleep(0.02)
+
+    # Three waiters from one tenant queue up before a single one from another
+    waiters = [("big", f"big-{i}") for i in range(3)] + [("small", "small-0")]
+    threads = []
+    for tenant, flow in waiters:
+        thread = threading.Thread(target=_hold, args=(scheduler, "clone", tenant, flow, 0.01, log))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)
+    assert lane.stats()['waiting'] == {'big': 3, 'small': 1}
+
+    holder.join()
+    for thread in threads:
+        thread.join()
+    assert log == ["holder", "big-0", "small-0", "big-1", "big-2"]
+    assert lane.stats()['wait_seconds'] > 0
+
+
+def test_work_outside_a_flow_queues_as_the_default_tenant():
+    scheduler = StageScheduler({"plan": 1})
+    lane = scheduler.lane("plan")
+    with scheduler.flow("acme", "job"):
+        pass
+    lane.acquire()
+    # The waiter runs in a copy of this context, as executor work does
+    context = contextvars.copy_context()
+    waiter = threading.Thread(target=context.run, args=(lane.acquire,))
+    waiter.start()
+    time.sleep(0.02)
+
+    # The flow set above no longer applies
+    assert lane.stats()['waiting'] == {'default': 1}
+    lane.release()
+    waiter.join()
+    assert lane.stats()['in_use'] == 1
+    lane.release()
+    assert lane.stats()['in_use'] == 0
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1 import onboarding
+from app.main import app
+from app.services import ingestion, pipeline, planner
+from app.services.jobs import JobManager
+from app.services.plan_store import PlanStore
+
+SESSION = "github_com_acme_shop"
+REPO_URL = "https://github.com/acme/shop"
+PLAN = {
+    'learning_path': [],
+    'starter_tasks': [],
+    'message': f"Successfully onboarded {REPO_URL}. You can now start asking questions.",
+    'commit_sha': "a" * 40,
+}
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = PlanStore(str(tmp_path / "plans.sqlite3"))
+    store.put(SESSION, PLAN['commit_sha'], planner.PLAN_PROMPT_VERSION, REPO_URL, PLAN)
+    monkeypatch.setattr(onboarding, 'plan_store', store)
+    return store
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """ The onboarding runs jobs start, in place of the real pipeline. """
+    runs = []
+
+    def run_onboarding(repo_url, incremental=True, progress=None):
+        runs.append((repo_url, incremental))
+        return PLAN
+
+    monkeypatch.setattr(pipeline, 'run_onboarding', run_onboarding)
+    manager = JobManager(1, 10)
+    monkeypatch.setattr(onboarding, 'job_manager', manager)
+    yield runs
+    manager.shutdown()
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    def get_remote_head(repo_url):
+        raise AssertionError("contacted the remote")
+
+    monkeypatch.setattr(ingestion, 'get_remote_head', get_remote_head)
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def test_get_session_returns_the_stored_plan_without_side_effects(store, runs, offline, client):
+    response = client.get(f"/api/v1/onboard/sessions/{SESSION}")
+
+    assert response.status_code == 200
+    assert response.json()['commit_sha'] == PLAN['commit_sha']
+    assert response.headers['ETag'] == f'"{PLAN["commit_sha"]}-{planner.PLAN_PROMPT_VERSION}"'
+    assert runs == []
+
+
+def test_get_session_revalidates_with_the_etag(store, runs, offline, client):
+    etag = client.get(f"/api/v1/onboard/sessions/{SESSION}").headers['ETag']
+
+    response = client.get(f"/api/v1/onboard/sessions/{SESSION}", headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert client.get(f"/api/v1/onboard/sessions/{SESSION}", headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_unknown_session_is_not_found(store, client):
+    assert client.get("/api/v1/onboard/sessions/github_com_acme_unknown").status_code == 404
+    assert client.post("/api/v1/onboard/sessions/github_com_acme_unknown/refresh").status_code == 404
+
+
+def test_refresh_runs_an_incremental_job_for_the_stored_repo(store, runs, offline, client):
+    response = client.post(f"/api/v1/onboard/sessions/{SESSION}/refresh")
+    assert response.status_code == 202
+    job_id = response.json()['job_id']
+
+    # The handler only queues the job; the remote check is the job's first step
+    deadline = time.monotonic() + 5
+    while client.get(f"/api/v1/onboard/{job_id}").json()['status'] != "completed":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert runs == [(REPO_URL, True)]
+    assert client.get(f"/api/v1/onboard/{job_id}").json()['result'] == PLAN
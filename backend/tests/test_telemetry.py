@@ -0,0 +1,124 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import telemetry
+from app.services.telemetry import Histogram, MetricsRegistry
+
+# One line of the Prometheus text exposition format (version 0.0.4)
+METRIC_NAME = r"[a-zA-Z_:][a-zA-Z0-9_:]*"
+LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"'
+VALUE = r"(?:[+-]?(?:\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)|[+-]Inf|NaN)"
+SAMPLE_LINE = re.compile(rf"^({METRIC_NAME})(?:\{{{LABEL}(?:,{LABEL})*\}})? {VALUE}$")
+HELP_LINE = re.compile(rf"^# HELP ({METRIC_NAME}) .*$")
+TYPE_LINE = re.compile(rf"^# TYPE ({METRIC_NAME}) (counter|gauge|histogram|summary|untyped)$")
+
+
+def _parse(text: str) -> dict:
+    """ Checks the exposition text line by line; returns {sample line without value: value}. """
+    assert text.endswith("\n")
+    samples, types = {}, {}
+    for line in text.rstrip("\n").split("\n"):
+        if line.startswith("# HELP"):
+            assert HELP_LINE.match(line), line
+        elif line.startswith("# TYPE"):
+            name, kind = TYPE_LINE.match(line).groups()
+            assert name not in types, f"{name} declared twice"
+            types[name] = kind
+        else:
+            match = SAMPLE_LINE.match(line)
+            assert match, line
+            name = match.group(1)
+            family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+            assert family in types, f"{name} has no TYPE line before it"
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    return samples
+
+
+class Clock:
+    """ Stands in for the time module in telemetry; advanced by hand. """
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def time_ns(self) -> int:
+        return int(self.now * 1e9)
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """ A fresh stage histogram, timed by a clock the test advances. """
+    clock = Clock()
+    monkeypatch.setattr(telemetry, 'time', clock)
+    histogram = Histogram("ccoa_stage_duration_seconds", "Time spent in each traced pipeline stage.", ("stage",))
+    monkeypatch.setattr(telemetry, 'STAGE_SECONDS', histogram)
+    return clock, histogram
+
+
+def test_counters_and_histograms_render_as_prometheus_text():
+    registry = MetricsRegistry()
+    chunks = registry.counter("ccoa_chunks_total", "Chunks written.", ("operation",))
+    latency = registry.histogram("ccoa_latency_seconds", "Latency.", ("route",), buckets=(1, 0.1))
+    chunks.inc(3, operation="split")
+    chunks.inc(operation="split")
+    chunks.inc(0.5, operation='quote"back\\slash\nnewline')
+    for seconds in (0.05, 0.5, 5):
+        latency.observe(seconds, route="/chat")
+
+    samples = _parse(registry.render())
+    assert samples == {
+        'ccoa_chunks_total{operation="quote\\"back\\\\slash\\nnewline"}': 0.5,
+        'ccoa_chunks_total{operation="split"}': 4,
+        'ccoa_latency_seconds_bucket{route="/chat",le="0.1"}': 1,
+        'ccoa_latency_seconds_bucket{route="/chat",le="1"}': 2,
+        'ccoa_latency_seconds_bucket{route="/chat",le="+Inf"}': 3,
+        'ccoa_latency_seconds_sum{route="/chat"}': 5.55,
+        'ccoa_latency_seconds_count{route="/chat"}': 3,
+    }
+
+
+def test_unlabelled_metric_without_samples_renders_only_its_header():
+    registry = MetricsRegistry()
+    registry.counter("ccoa_file_bytes_read_total", "Bytes read.")
+    assert registry.render() == (
+        "# HELP ccoa_file_bytes_read_total Bytes read.\n"
+        "# TYPE ccoa_file_bytes_read_total counter\n"
+    )
+
+
+def test_span_timings_land_in_their_stage_histogram(stages):
+    clock, histogram = stages
+    with telemetry.trace() as current:
+        with telemetry.span("embed", texts=3):
+            clock.now += 0.3
+            with telemetry.span("upsert"):
+                clock.now += 0.02
+        # Work timed in a split worker process
+        telemetry.record_span("split", 2.0, files=4)
+
+    buckets = {
+        (labels['stage'], labels['le']): value
+        for name, labels, value in histogram.samples() if name.endswith("_bucket")
+    }
+    assert (buckets[("embed", "0.25")], buckets[("embed", "0.5")]) == (0, 1)
+    assert (buckets[("upsert", "0.01")], buckets[("upsert", "0.025")]) == (0, 1)
+    assert (buckets[("split", "1")], buckets[("split", "2.5")]) == (0, 1)
+    assert current.totals() == {'upsert': pytest.approx(0.02), 'embed': pytest.approx(0.32), 'split': 2.0}
+    embed, upsert, _ = current.to_list()
+    assert upsert['parent'] == embed['id']
+
+
+def test_metrics_endpoint_serves_the_registry():
+    client = TestClient(app)
+    client.get("/")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/plain; version=0.0.4")
+    samples = _parse(response.text)
+    assert samples['ccoa_http_request_duration_seconds_count{method="GET",route="/",status="200"}'] >= 1
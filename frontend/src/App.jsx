@@ -1,16 +1,31 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import toast, { Toaster } from 'react-hot-toast';
-import { onboardRepository, generateSessionId } from './api/ccoaApi';
+import { onboardRepository, getOnboardingSession, refreshOnboardingSession, waitForOnboardingJob, generateSessionId } from './api/ccoaApi';
 import { useRepoHistory } from './hooks/useRepoHistory';
 import Header from './components/layout/Header';
 import HomePage from './pages/HomePage';
 import DashboardPage from './pages/DashboardPage';
 import LoadingSpinner from './components/common/LoadingSpinner';
 
+const STAGE_LABELS = {
+  queued: 'Waiting in queue',
+  checking: 'Checking for changes',
+  cloning: 'Cloning repository',
+  splitting: 'Splitting files',
+  embedding: 'Embedding chunks',
+  planning: 'Generating learning plan',
+};
+
+const formatJobProgress = (job) => {
+  const label = STAGE_LABELS[job.stage] || 'Onboarding';
+  return job.total ? `${label} (${job.current}/${job.total})...` : `${label}...`;
+};
+
 function App() {
   const [currentView, setCurrentView] = useState('home'); // 'home' | 'loading' | 'dashboard'
   const [onboardingData, setOnboardingData] = useState(null);
   const [sessionId, setSessionId] = useState('');
+  const sessionIdRef = useRef(''); // The session shown now, for updates that arrive late
   const { addRepoToHistory } = useRepoHistory();
 
   const handleAnalyze = async (repoUrl) => {
@@ -19,9 +34,12 @@ function App() {
     const loadingToast = toast.loading(`Onboarding ${repoUrl.split('/').slice(-2).join('/')}...`);
 
     try {
-      const response = await onboardRepository(repoUrl);
+      const response = await onboardRepository(repoUrl, (job) => {
+        toast.loading(formatJobProgress(job), { id: loadingToast });
+      });
       setOnboardingData(response.data);
       setSessionId(generateSessionId(repoUrl));
+      sessionIdRef.current = generateSessionId(repoUrl);
       addRepoToHistory(repoUrl);
       setCurrentView('dashboard');
       toast.success('Repository onboarded successfully!', { id: loadingToast });
@@ -32,16 +50,48 @@ function App() {
     }
   };
 
-  const handleSelectHistory = (repoUrl) => {
-    // For now, re-analyzing is the simplest flow.
-    // A future improvement could be to cache results.
-    handleAnalyze(repoUrl);
+  const handleSelectHistory = async (repoUrl) => {
+    // Show the stored plan straight away; only onboard from scratch if there is none
+    const id = generateSessionId(repoUrl);
+    let response;
+    try {
+      response = await getOnboardingSession(id);
+    } catch (err) {
+      if (err.response?.status !== 404) {
+        console.warn('Could not load the stored plan; onboarding again.', err);
+      }
+      handleAnalyze(repoUrl);
+      return;
+    }
+    setOnboardingData(response.data);
+    setSessionId(id);
+    sessionIdRef.current = id;
+    addRepoToHistory(repoUrl);
+    setCurrentView('dashboard');
+
+    // Check the remote in the background; the job only rebuilds the plan if the repository moved
+    let refreshToast;
+    try {
+      const { data: job } = await refreshOnboardingSession(id);
+      const { data } = await waitForOnboardingJob(job, (progress) => {
+        if (progress.stage === 'queued' || progress.stage === 'checking') return;
+        refreshToast = toast.loading(formatJobProgress(progress), { id: refreshToast });
+      });
+      if (!refreshToast && data.commit_sha === response.data.commit_sha) return;
+      if (sessionIdRef.current === id) setOnboardingData(data);
+      toast.success('Plan updated to the latest commit.', { id: refreshToast });
+    } catch (err) {
+      const errorMessage = err.response?.data?.detail || "Could not update the plan.";
+      if (refreshToast) toast.error(errorMessage, { id: refreshToast });
+      else console.warn('Could not check the repository for upstream changes.', err);
+    }
   };
   
   const goToHome = () => {
     setCurrentView('home');
     setOnboardingData(null);
     setSessionId('');
+    sessionIdRef.current = '';
   };
 
   const renderContent = () => {
@@ -19,21 +19,153 @@ export const generateSessionId = (repoUrl) => {
   return repoUrl.replace("https://", "").replace(/\//g, "_").replace(/\./g, "_");
 };
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
 /**
- * Onboards a new repository.
+ * Starts a background onboarding job for a repository.
  * @param {string} repoUrl - The URL of the GitHub repository.
- * @returns {Promise<object>} The onboarding data (learning path, starter tasks).
+ * @returns {Promise<object>} The job status, including its job_id.
  */
-export const onboardRepository = (repoUrl) => {
+export const startOnboardingJob = (repoUrl) => {
   return apiClient.post('/api/v1/onboard', { repo_url: repoUrl });
 };
 
 /**
- * Sends a chat message to the backend.
+ * Fetches the current status of an onboarding job.
+ * @param {string} jobId - The ID returned when the job was started.
+ * @returns {Promise<object>} The job status (stage, progress, result or error).
+ */
+export const getOnboardingJob = (jobId) => {
+  return apiClient.get(`/api/v1/onboard/${jobId}`);
+};
+
+/**
+ * Fetches the stored onboarding plan of a previously onboarded repository.
+ * Rejects with a 404 if the repository has never been onboarded.
+ * @param {string} sessionId - The session ID for the repository.
+ * @returns {Promise<object>} The onboarding data (learning path, starter tasks).
+ */
+export const getOnboardingSession = (sessionId) => {
+  return apiClient.get(`/api/v1/onboard/sessions/${sessionId}`);
+};
+
+/**
+ * Starts a background job that brings a stored plan up to date with the repository's
+ * remote. If the remote hasn't moved, the job finishes with the stored plan.
+ * @param {string} sessionId - The session ID for the repository.
+ * @returns {Promise<object>} The job status, including its job_id.
+ */
+export const refreshOnboardingSession = (sessionId) => {
+  return apiClient.post(`/api/v1/onboard/sessions/${sessionId}/refresh`);
+};
+
+/**
+ * Fetches the text of a chunk cited in a chat answer's provenance. The server marks
+ * it immutable, so the browser serves repeat requests from its HTTP cache.
+ * @param {string} sessionId - The session ID for the repository.
+ * @param {string} chunkId - The `chunk_id` of a provenance entry.
+ * @returns {Promise<object>} The chunk (chunk_id, file_path, text).
+ */
+export const getChunk = (sessionId, chunkId) => {
+  return apiClient.get(`/api/v1/onboard/sessions/${sessionId}/chunks/${chunkId}`);
+};
+
+/**
+ * Waits for an onboarding job to finish.
+ * @param {object} job - The job status, as returned when the job was started.
+ * @param {function} [onProgress] - Called with each job status while it runs.
+ * @returns {Promise<object>} The onboarding data (learning path, starter tasks).
+ */
+export const waitForOnboardingJob = async (job, onProgress) => {
+  while (job.status !== 'completed') {
+    if (job.status === 'failed') {
+      const error = new Error(job.error);
+      error.response = { data: { detail: job.error } };
+      throw error;
+    }
+    onProgress?.(job);
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    ({ data: job } = await getOnboardingJob(job.job_id));
+  }
+  return { data: job.result };
+};
+
+/**
+ * Onboards a repository and waits for the background job to finish.
+ * @param {string} repoUrl - The URL of the GitHub repository.
+ * @param {function} [onProgress] - Called with each job status while it runs.
+ * @returns {Promise<object>} The onboarding data (learning path, starter tasks).
+ */
+export const onboardRepository = async (repoUrl, onProgress) => {
+  const { data: job } = await startOnboardingJob(repoUrl);
+  return waitForOnboardingJob(job, onProgress);
+};
+
+/**
+ * Parses one Server-Sent Events block into its event name and JSON data.
+ * @param {string} block - The text between two blank lines.
+ * @returns {{event: string, data: any}|null} The event, or null for comments/keep-alives.
+ */
+const parseSseEvent = (block) => {
+  let event = 'message';
+  const dataLines = [];
+  for (const line of block.split('\n')) {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+  }
+  if (dataLines.length === 0) return null;
+  return { event, data: JSON.parse(dataLines.join('\n')) };
+};
+
+/**
+ * Sends a chat message to the backend and streams the answer as it is generated.
  * @param {string} sessionId - The session ID for the repository.
  * @param {string} query - The user's question.
- * @returns {Promise<object>} The chat response including the answer and provenance.
+ * @param {object} [handlers] - Streaming callbacks.
+ * @param {function} [handlers.onProvenance] - Called once with the source chunks, before any text.
+ * @param {function} [handlers.onToken] - Called with each piece of answer text as it arrives.
+ * @param {AbortSignal} [handlers.signal] - Aborting it stops the stream (and the generation on the server).
+ * @returns {Promise<object>} The complete chat response including the answer and provenance.
  */
-export const sendChatMessage = (sessionId, query) => {
-  return apiClient.post('/api/v1/chat', { session_id: sessionId, query });
-};
\ No newline at end of file
+export const sendChatMessage = async (sessionId, query, { onProvenance, onToken, signal } = {}) => {
+  const response = await fetch(`${API_BASE_URL}/api/v1/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ session_id: sessionId, query }),
+    signal,
+  });
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    const error = new Error(body.detail || response.statusText);
+    error.response = { data: { detail: body.detail } };
+    throw error;
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  let answer = '';
+  let provenance = [];
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = parseSseEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+      if (!message) continue;
+      if (message.event === 'provenance') {
+        provenance = message.data;
+        onProvenance?.(provenance);
+      } else if (message.event === 'token') {
+        answer += message.data.text;
+        onToken?.(message.data.text);
+      } else if (message.event === 'error') {
+        const error = new Error(message.data.detail);
+        error.response = { data: { detail: message.data.detail } };
+        throw error;
+      }
+    }
+  }
+  return { data: { answer, provenance } };
+};
@@ -2,11 +2,36 @@ import { useState, useRef, useEffect } from 'react';
 import { Send, Bot, User, FileText } from 'lucide-react';
 import ReactMarkdown from 'react-markdown';
 import rehypeHighlight from 'rehype-highlight';
-import { sendChatMessage } from '../../api/ccoaApi';
+import { sendChatMessage, getChunk } from '../../api/ccoaApi';
 import LoadingSpinner from '../common/LoadingSpinner';
 import clsx from 'clsx';
 import toast from 'react-hot-toast';
 
+// A cited chunk; its text is only fetched (and kept) once the source is expanded
+const SourceChunk = ({ sessionId, source }) => {
+  const [text, setText] = useState(null);
+  const [failed, setFailed] = useState(false);
+
+  const handleToggle = async (event) => {
+    if (!event.currentTarget.open || text !== null || !source.chunk_id) return;
+    try {
+      const { data } = await getChunk(sessionId, source.chunk_id);
+      setText(data.text);
+    } catch {
+      setFailed(true);
+    }
+  };
+
+  let body = text;
+  if (body === null) body = failed || !source.chunk_id ? 'Source text is no longer available.' : 'Loading...';
+  return (
+    <details className="mt-1 cursor-pointer" onToggle={handleToggle}>
+      <summary className="text-xs text-brand-accent hover:underline flex items-center gap-1"><FileText size={12}/>{source.file_path}{source.start_line ? `:${source.start_line}-${source.end_line}` : ''}</summary>
+      <pre className="mt-2 rounded bg-black p-2 text-xs text-gray-400 overflow-x-auto"><code>{body}</code></pre>
+    </details>
+  );
+};
+
 const ChatWindow = ({ sessionId }) => {
   // ... All the state and functions from the previous version remain the same ...
   const [messages, setMessages] = useState([
@@ -14,8 +39,10 @@ const ChatWindow = ({ sessionId }) => {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
+  const abortRef = useRef(null);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -23,33 +50,59 @@ const ChatWindow = ({ sessionId }) => {
 
   useEffect(() => {
     inputRef.current?.focus();
+    // Stop any in-flight answer (and its generation on the server) when the chat closes
+    return () => abortRef.current?.abort();
   }, []);
 
+  // Applies an update to the bot message that is currently streaming (always the last one)
+  const updateLastMessage = (update) => {
+    setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], ...update(prev[prev.length - 1]) }]);
+  };
+
   const handleSend = async () => {
-    if (!input.trim() || !sessionId || isLoading) return;
+    if (!input.trim() || !sessionId || isLoading || isStreaming) return;
 
     const userMessage = { sender: 'user', text: input };
     setMessages(prev => [...prev, userMessage]);
     setInput('');
     setIsLoading(true);
 
+    const controller = new AbortController();
+    abortRef.current = controller;
+    let started = false;
+    // The bot message appears as soon as retrieval finishes and fills in token by token
+    const startBotMessage = (fields) => {
+      started = true;
+      setIsLoading(false);
+      setIsStreaming(true);
+      setMessages(prev => [...prev, { sender: 'bot', text: '', ...fields }]);
+    };
+
     try {
-      const response = await sendChatMessage(sessionId, input);
-      const botMessage = {
-        sender: 'bot',
-        text: response.data.answer,
-        provenance: response.data.provenance,
-      };
-      setMessages(prev => [...prev, botMessage]);
+      await sendChatMessage(sessionId, input, {
+        signal: controller.signal,
+        onProvenance: (provenance) => startBotMessage({ provenance }),
+        onToken: (text) => {
+          if (!started) startBotMessage({});
+          updateLastMessage(msg => ({ text: msg.text + text }));
+        },
+      });
     } catch (error) {
+      if (error.name === 'AbortError') return;
       toast.error(error.response?.data?.detail || "Failed to get a response.");
       const errorMessage = {
         sender: 'bot',
         text: 'Sorry, I encountered an error. Please try again.',
       };
-      setMessages(prev => [...prev, errorMessage]);
+      if (started) {
+        updateLastMessage(msg => ({ text: msg.text ? `${msg.text}\n\n_${errorMessage.text}_` : errorMessage.text }));
+      } else {
+        setMessages(prev => [...prev, errorMessage]);
+      }
     } finally {
+      abortRef.current = null;
       setIsLoading(false);
+      setIsStreaming(false);
       inputRef.current?.focus();
     }
   };
@@ -73,10 +126,7 @@ const ChatWindow = ({ sessionId }) => {
                 <div className="mt-3 border-t border-brand-light-gray/50 pt-2">
                   <h4 className="text-xs font-bold text-gray-400">Sources:</h4>
                   {msg.provenance.map((p, i) => (
-                    <details key={i} className="mt-1 cursor-pointer">
-                      <summary className="text-xs text-brand-accent hover:underline flex items-center gap-1"><FileText size={12}/>{p.file_path}</summary>
-                      <pre className="mt-2 rounded bg-black p-2 text-xs text-gray-400 overflow-x-auto"><code>{p.content_chunk}</code></pre>
-                    </details>
+                    <SourceChunk key={p.chunk_id || i} sessionId={sessionId} source={p} />
                   ))}
                 </div>
               )}
@@ -113,12 +163,12 @@ const ChatWindow = ({ sessionId }) => {
             placeholder="Ask to generate code or find a tutorial..."
             className="w-full resize-none rounded-lg bg-brand-dark border border-brand-light-gray p-3 pr-20 text-sm focus:outline-none focus:ring-2 focus:ring-brand-accent"
             rows={1}
-            disabled={isLoading}
+            disabled={isLoading || isStreaming}
           />
           <button
             onClick={handleSend}
             className="absolute bottom-2 right-2 flex items-center gap-1 rounded-md bg-brand-accent p-2 text-sm font-semibold text-white transition-colors hover:bg-blue-600 disabled:bg-gray-600 disabled:cursor-not-allowed"
-            disabled={isLoading || !input.trim()}
+            disabled={isLoading || isStreaming || !input.trim()}
           >
             <Send size={16} />
           </button>
@@ -55,7 +55,13 @@ const LearningPlan = ({ data }) => {
                   {step.external_resources.map((res, index) => (
                     <li key={index} className="flex items-start gap-3">
                       <ResourceIcon type={res.type} />
-                      <span>{res.suggestion}</span>
+                      {res.link ? (
+                        <a href={res.link} target="_blank" rel="noopener noreferrer" title={res.title || res.link} className="hover:text-brand-accent hover:underline">
+                          {res.suggestion}
+                        </a>
+                      ) : (
+                        <span>{res.suggestion}</span>
+                      )}
                     </li>
                   ))}
                 </ul>